@@ -0,0 +1,199 @@
+"""
+Headless entry point, ``python -m options_tracker``: P/L reports for cron
+jobs and scripts without starting the Streamlit app.
+
+Only `storage` and `pl` are imported at startup. Marks, the process pool
+and the import path are loaded by the commands that need them.
+
+    python -m options_tracker report realized                 # the configured store
+    python -m options_tracker report groups --journal a.csv b.parquet --format json
+    python -m options_tracker report unrealized --marks marks.csv -o unrealized.csv
+    python -m options_tracker import broker.csv
+
+Several ``--journal`` files are matched in parallel on a process pool, and
+their rows are concatenated with a leading ``journal`` column. Journals are
+read as they are (any backend's file format by extension). A journal with
+several accounts is matched per account (see accounts.py) and its rows carry
+an ``account`` column.
+
+Each journal's matching result is pickled to CLI_CACHE_DIR (override with
+OPTIONS_CLI_CACHE) with the journal's change stamp, so repeated runs on an
+unchanged journal (cron) skip parsing and matching; ``--no-cache`` bypasses it.
+"""
+import argparse
+import hashlib
+import os
+import pickle
+import sys
+from typing import List, Optional, Tuple
+
+# The tracker's modules import each other flat, as when app.py is run directly
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import pandas as pd  # noqa: E402
+
+import storage  # noqa: E402
+from pl import MARK_KEY_COLUMNS, PLResult, compute_pl_result, mark_to_market, summarize_by_group  # noqa: E402
+
+REPORTS = ("realized", "open", "unrealized", "groups", "summary")
+FORMATS = ("csv", "json")
+NO_MARKS = pd.DataFrame(columns=MARK_KEY_COLUMNS + ["mark"])
+CLI_CACHE_DIR = os.environ.get("OPTIONS_CLI_CACHE", os.path.join(os.path.expanduser("~"), ".cache", "options_tracker"))
+
+
+def load_marks(path: Optional[str]) -> Optional[pd.DataFrame]:
+    """Marks from a snapshot file, else the latest stored marks, else None (value at cost)."""
+    from marks import MARKS_PATH, mark_store, read_snapshot, validate_marks
+
+    if path is not None:
+        return validate_marks(read_snapshot(path), pd.Timestamp.fromtimestamp(os.path.getmtime(path)))[0]
+    if os.path.exists(MARKS_PATH):
+        return mark_store().latest()
+    return None
+
+
+def report_frame(result: PLResult, report: str, marks: Optional[pd.DataFrame] = None, trades: int = 0) -> pd.DataFrame:
+    """One report of a matching pass; `trades` is the journal's row count for ``summary``."""
+    if report == "realized":
+        return result.realized
+    if report == "open":
+        return result.open_positions
+    if report == "groups":
+        return summarize_by_group(result, marks)
+    # Without marks every leg is valued at cost
+    per_leg, unrealized = mark_to_market(result.open_positions, marks if marks is not None else NO_MARKS)
+    if report == "unrealized":
+        return per_leg
+    open_positions = result.open_positions
+    return pd.DataFrame([{
+        "trades": trades,
+        "realized_pl": result.total_realized,
+        "open_legs": len(open_positions),
+        "open_contracts": int(open_positions["open_quantity"].sum()) if not open_positions.empty else 0,
+        "unrealized_pl": unrealized,
+    }])
+
+
+def _cache_path(path: str) -> str:
+    return os.path.join(CLI_CACHE_DIR, hashlib.sha1(os.path.realpath(path).encode()).hexdigest()[:16] + ".pkl")
+
+
+def journal_result(path: Optional[str], cache: bool = True) -> Tuple[PLResult, int]:
+    """
+    Matching result and trade count of a journal file, or of the configured
+    store when `path` is None; served from the cache while the journal's
+    stamp is unchanged.
+    """
+    if path is None:
+        stamp, cache_file = storage.trades_version(), _cache_path(storage.TRADES_STORE_PATH)
+    else:
+        stamp, cache_file = storage.journal_version(path), _cache_path(path)
+    if cache:
+        try:
+            with open(cache_file, "rb") as fh:
+                cached = pickle.load(fh)
+            if cached["stamp"] == stamp:
+                return cached["result"], cached["trades"]
+        except (OSError, EOFError, pickle.UnpicklingError, KeyError, AttributeError):
+            pass
+    trades = storage.read_journal(path) if path is not None else storage.load_trades()
+    if trades["account"].nunique() > 1:
+        # Accounts are matched separately; the store's per-account results are cached across runs
+        from accounts import account_book, match_accounts
+
+        result = (account_book(trades) if path is None else match_accounts(trades)).firm()
+    else:
+        result = compute_pl_result(trades)
+    if cache:
+        try:
+            os.makedirs(CLI_CACHE_DIR, exist_ok=True)
+            tmp_path = f"{cache_file}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as fh:
+                pickle.dump({"stamp": stamp, "result": result, "trades": len(trades)}, fh, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, cache_file)
+        except OSError:
+            # A report must not fail because the cache is not writable
+            pass
+    return result, len(trades)
+
+
+def journal_report(path: Optional[str], report: str, marks: Optional[pd.DataFrame] = None,
+                   cache: bool = True) -> pd.DataFrame:
+    """`report` for a journal file, or for the configured store when `path` is None."""
+    result, trades = journal_result(path, cache)
+    return report_frame(result, report, marks, trades)
+
+
+def run_reports(journals: List[Optional[str]], report: str, marks: Optional[pd.DataFrame], workers: int,
+                cache: bool = True) -> pd.DataFrame:
+    n = len(journals)
+    if n == 1 or workers <= 1:
+        frames = [journal_report(path, report, marks, cache) for path in journals]
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(max_workers=min(workers, n)) as pool:
+            frames = list(pool.map(journal_report, journals, [report] * n, [marks] * n, [cache] * n))
+    if len(journals) == 1:
+        return frames[0]
+    names = [os.path.basename(path) for path in journals]
+    return pd.concat([frame.assign(journal=name)[["journal"] + list(frame.columns)] for name, frame in zip(names, frames)],
+                     ignore_index=True)
+
+
+def write_frame(frame: pd.DataFrame, fmt: str, output: Optional[str]) -> None:
+    out = sys.stdout if output in (None, "-") else output
+    if fmt == "json":
+        frame.to_json(out, orient="records", date_format="iso", date_unit="s", indent=None)
+        if out is sys.stdout:
+            sys.stdout.write("\n")
+    else:
+        frame.to_csv(out, index=False)
+
+
+def import_files(paths: List[str]) -> int:
+    """Stream broker CSVs into the configured store; returns the exit status."""
+    status = 0
+    for path in paths:
+        result = storage.import_trades_stream(path)
+        print(f"{path}: imported {result.imported} of {result.read} rows, rejected {result.rejected}")
+        if result.rejected:
+            status = 1
+            for row in result.rejected_rows.head(10).itertuples(index=False):
+                print(f"  rejected: {row.reason}: {row.symbol} {row.action} {row.trade_datetime}", file=sys.stderr)
+    return status
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    cli = argparse.ArgumentParser(prog="python -m options_tracker", description="Options tracker reports without the UI")
+    commands = cli.add_subparsers(dest="command", required=True)
+    rep = commands.add_parser("report", help="realized, open, unrealized, group or summary P/L")
+    rep.add_argument("report", choices=REPORTS)
+    rep.add_argument("--journal", nargs="+", help="journal files (.csv, .parquet, .arrow, .sqlite); default: the configured store")
+    rep.add_argument("--marks", help="marks snapshot (CSV/JSON) for unrealized P/L; default: the marks store, else cost")
+    rep.add_argument("--format", choices=FORMATS, default="csv")
+    rep.add_argument("-o", "--output", help="file to write (default: stdout)")
+    rep.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="processes for several journals")
+    rep.add_argument("--no-cache", action="store_true", help="re-match every journal, ignoring and not writing the cache")
+    imp = commands.add_parser("import", help="append broker CSVs to the configured store")
+    imp.add_argument("paths", nargs="+")
+    args = cli.parse_args(argv)
+
+    if args.command == "import":
+        return import_files(args.paths)
+    journals = args.journal or [None]
+    missing = [path for path in journals if path is not None and not os.path.exists(path)]
+    if missing:
+        cli.error(f"journal not found: {', '.join(missing)}")
+    marks = load_marks(args.marks) if args.report in ("unrealized", "groups", "summary") else None
+    frame = run_reports(journals, args.report, marks, args.workers, cache=not args.no_cache)
+    try:
+        write_frame(frame, args.format, args.output)
+    except BrokenPipeError:
+        # Output piped into e.g. `head`; stop quietly like other command-line tools
+        sys.stderr.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
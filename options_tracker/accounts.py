@@ -0,0 +1,227 @@
+"""
+Firm-wide P/L over many accounts.
+
+Every account is FIFO-matched on its own (lots never match across accounts)
+and the per-account results are merged into firm views with a leading
+``account`` column. Results are cached per account with a fingerprint of
+that account's trades, so a trade in one account re-matches only that
+account. The cache is kept in memory and in ACCOUNT_RESULTS_PATH (override
+with OPTIONS_ACCOUNT_RESULTS).
+
+Stale accounts are matched on a process pool when there are several of them
+and enough trades to pay for starting the workers.
+"""
+import os
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from functools import cached_property
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+import instrument
+import storage
+from pl import (
+    GROUP_SUMMARY_COLUMNS,
+    OPEN_COLUMNS,
+    OPEN_LOT_COLUMNS,
+    REALIZED_COLUMNS,
+    PLResult,
+    compute_pl_result,
+    mark_to_market,
+    summarize_by_group,
+)
+
+ACCOUNT_RESULTS_PATH = os.environ.get(
+    "OPTIONS_ACCOUNT_RESULTS", os.path.splitext(storage.TRADES_STORE_PATH)[0] + ".accounts.pkl"
+)
+# Below this many trades to re-match, the pool's startup costs more than it saves
+POOL_MIN_TRADES = 20_000
+# Bump when the pickled layout changes so stale cache files get ignored
+CACHE_FORMAT = 1
+
+ACCOUNT_SUMMARY_COLUMNS = ["account", "trades", "realized_pl", "open_legs", "open_contracts", "unrealized_pl"]
+
+
+def split_accounts(trades: pd.DataFrame) -> Dict[str, Tuple[np.ndarray, Tuple[int, int]]]:
+    """
+    Row positions of each account's trades and a fingerprint of them: the
+    row count and the sum of the row hashes (as in timeline's digests, so
+    the load order of the rows doesn't matter).
+    """
+    if trades.empty:
+        return {}
+    columns = [c for c in storage.TRADE_COLUMNS if c in trades.columns and c != "account"]
+    hashes = pd.util.hash_pandas_object(trades[columns], index=False).to_numpy()
+    codes, names = pd.factorize(trades["account"], sort=True)
+    out = {}
+    for code, name in enumerate(names):
+        positions = np.flatnonzero(codes == code)
+        out[str(name)] = (positions, (len(positions), int(hashes[positions].sum())))
+    return out
+
+
+def _with_account(frame: pd.DataFrame, account: str) -> pd.DataFrame:
+    # Results matched from journal rows already lead with their account
+    return frame.assign(account=account)[["account"] + [c for c in frame.columns if c != "account"]]
+
+
+def _merged(frames: List[pd.DataFrame], columns: List[str]) -> pd.DataFrame:
+    frames = [frame for frame in frames if not frame.empty]
+    if not frames:
+        return pd.DataFrame(columns=["account"] + columns)
+    return pd.concat(frames, ignore_index=True)
+
+
+@dataclass
+class AccountBook:
+    """Per-account matching results and their firm-wide merge."""
+    results: Dict[str, PLResult]
+    trades: Dict[str, int] = field(default_factory=dict)
+
+    @property
+    def accounts(self) -> List[str]:
+        return sorted(self.results)
+
+    @cached_property
+    def realized(self) -> pd.DataFrame:
+        return _merged([_with_account(self.results[a].realized, a) for a in self.accounts], REALIZED_COLUMNS)
+
+    @cached_property
+    def open_positions(self) -> pd.DataFrame:
+        return _merged([_with_account(self.results[a].open_positions, a) for a in self.accounts], OPEN_COLUMNS)
+
+    @cached_property
+    def open_lots(self) -> pd.DataFrame:
+        return _merged([_with_account(self.results[a].open_lots, a) for a in self.accounts], OPEN_LOT_COLUMNS)
+
+    @property
+    def total_realized(self) -> float:
+        return float(sum(result.total_realized for result in self.results.values()))
+
+    def firm(self) -> PLResult:
+        """All accounts as one result; every row carries its ``account``."""
+        return PLResult(self.realized, self.open_positions, self.total_realized, self.open_lots)
+
+    def result(self, account: Optional[str] = None) -> PLResult:
+        """One account's result, or the firm's when `account` is None."""
+        return self.firm() if account is None else self.results[account]
+
+    def unrealized(self, marks: pd.DataFrame) -> Tuple[pd.DataFrame, float]:
+        """Per-leg unrealized P/L of every account (marks are shared) and the firm total."""
+        return mark_to_market(self.open_positions, marks)
+
+    def groups(self, marks: Optional[pd.DataFrame] = None) -> pd.DataFrame:
+        """`summarize_by_group` per account; group ids are only unique within an account."""
+        frames = [_with_account(summarize_by_group(self.results[a], marks), a) for a in self.accounts]
+        return _merged(frames, GROUP_SUMMARY_COLUMNS + (["unrealized_pl"] if marks is not None else []))
+
+    def summary(self, marks: Optional[pd.DataFrame] = None) -> pd.DataFrame:
+        """One row per account: trades, realized P/L, open legs and contracts, unrealized P/L."""
+        rows = []
+        per_leg = mark_to_market(self.open_positions, marks)[0] if marks is not None else None
+        for account in self.accounts:
+            result = self.results[account]
+            open_positions = result.open_positions
+            rows.append({
+                "account": account,
+                "trades": self.trades.get(account, 0),
+                "realized_pl": result.total_realized,
+                "open_legs": len(open_positions),
+                "open_contracts": int(open_positions["open_quantity"].sum()) if not open_positions.empty else 0,
+                "unrealized_pl": float(per_leg.loc[per_leg["account"] == account, "unrealized_pl"].sum())
+                if per_leg is not None else np.nan,
+            })
+        return pd.DataFrame(rows, columns=ACCOUNT_SUMMARY_COLUMNS)
+
+
+def _match(frames: List[pd.DataFrame], workers: Optional[int]) -> List[PLResult]:
+    rows = sum(len(frame) for frame in frames)
+    n = workers if workers is not None else min(len(frames), os.cpu_count() or 1)
+    with instrument.span("accounts.match", rows=rows):
+        if len(frames) == 1 or n <= 1 or rows < POOL_MIN_TRADES:
+            return [compute_pl_result(frame) for frame in frames]
+        with ProcessPoolExecutor(max_workers=n) as pool:
+            return list(pool.map(compute_pl_result, frames))
+
+
+def match_accounts(trades: pd.DataFrame, workers: Optional[int] = None) -> AccountBook:
+    """Per-account FIFO results for `trades` without the cache (e.g. a journal file)."""
+    split = split_accounts(trades)
+    names = list(split)
+    matched = _match([trades.iloc[split[name][0]].reset_index(drop=True) for name in names], workers)
+    return AccountBook(dict(zip(names, matched)), {name: split[name][1][0] for name in names})
+
+
+# account -> (fingerprint, result); the fingerprint starts with the trade count
+_results: Dict[str, Tuple[Tuple[int, int], PLResult]] = {}
+_loaded: Dict[str, Any] = {"from_file": False}
+
+
+def _load_cache() -> None:
+    if _loaded["from_file"]:
+        return
+    _loaded["from_file"] = True
+    try:
+        with open(ACCOUNT_RESULTS_PATH, "rb") as fh:
+            cached = pickle.load(fh)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+        return
+    if isinstance(cached, dict) and cached.get("format") == CACHE_FORMAT:
+        _results.update(cached["results"])
+
+
+def _save_cache() -> None:
+    tmp_path = f"{ACCOUNT_RESULTS_PATH}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "wb") as fh:
+            pickle.dump({"format": CACHE_FORMAT, "results": _results}, fh, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, ACCOUNT_RESULTS_PATH)
+    except OSError:
+        # The cache only saves work; a read-only directory must not break reports
+        pass
+
+
+def account_book(trades: pd.DataFrame, workers: Optional[int] = None) -> AccountBook:
+    """
+    Per-account FIFO results for `trades` (typed, with an ``account``
+    column). Accounts whose trades are unchanged since the last call (or
+    the saved cache) are reused; the rest are matched, on a process pool of
+    `workers` when there are several and at least POOL_MIN_TRADES trades.
+    """
+    _load_cache()
+    with instrument.span("accounts.split", rows=len(trades)):
+        split = split_accounts(trades)
+    stale = [name for name, (_, fingerprint) in split.items()
+             if name not in _results or _results[name][0] != fingerprint]
+    instrument.count("accounts.cache_hit", len(split) - len(stale))
+    instrument.count("accounts.cache_miss", len(stale))
+    if stale:
+        matched = _match([trades.iloc[split[name][0]].reset_index(drop=True) for name in stale], workers)
+        for name, result in zip(stale, matched):
+            _results[name] = (split[name][1], result)
+    gone = [name for name in _results if name not in split]
+    for name in gone:
+        del _results[name]
+    if stale or gone:
+        _save_cache()
+    return AccountBook({name: _results[name][1] for name in split},
+                       {name: _results[name][0][0] for name in split})
+
+
+_book: Dict[str, Any] = {"version": None, "book": None}
+
+
+def load_account_book(workers: Optional[int] = None) -> AccountBook:
+    """`account_book` of the stored trades, kept in memory per store version."""
+    version = storage.trades_version()
+    if _book["version"] == version:
+        instrument.count("account_book.cache_hit")
+        return _book["book"]
+    instrument.count("account_book.cache_miss")
+    book = account_book(storage.load_trades(), workers)
+    _book["version"] = version
+    _book["book"] = book
+    return book
@@ -1,13 +1,19 @@
-import os
-import io
 import datetime as dt
 from typing import List
 
+import altair as alt
 import pandas as pd
 import streamlit as st
 
-from storage import load_trades, save_trades, upsert_trade, delete_trade, import_trades_csv, export_trades_csv, TRADE_COLUMNS
-from pl import compute_pl, compute_unrealized, OPTIONS_MULTIPLIER
+import instrument
+from storage import load_trades, save_trade, remove_trade, get_trade, import_trades_stream, trades_version, DEFAULT_ACCOUNT
+from derived import load_pl_state, load_equity_curve
+from accounts import load_account_book
+from marks import MarkStore, mark_store, with_overrides
+from paging import PAGE_SIZES, Page, TableQuery, distinct, format_rows, realized_page, trades_filtered, trades_page
+from pl import compute_unrealized, mark_to_market, summarize_by_group
+from scenarios import ScenarioCube, scenario_grid
+from timeline import equity_stats
 
 APP_TITLE = "Options Profit Tracker"
 
@@ -34,10 +40,11 @@ def trade_input_form():
         price = cols2[2].number_input("Price (per option)", min_value=0.0, value=float(st.session_state.get("price", 0.0)), step=0.01, format="%.2f")
         fees = cols2[3].number_input("Fees", min_value=0.0, value=float(st.session_state.get("fees", 0.0)), step=0.01, format="%.2f")
 
-        cols3 = st.columns(3)
+        cols3 = st.columns(4)
         group_id = cols3[0].text_input("Group ID (strategy)", value=st.session_state.get("group_id", ""))
-        trade_dt = cols3[1].datetime_input("Trade time", value=st.session_state.get("trade_datetime", _default_trade_datetime()))
-        note = cols3[2].text_input("Note", value=st.session_state.get("note", ""))
+        account = cols3[1].text_input("Account", value=st.session_state.get("account", DEFAULT_ACCOUNT))
+        trade_dt = cols3[2].datetime_input("Trade time", value=st.session_state.get("trade_datetime", _default_trade_datetime()))
+        note = cols3[3].text_input("Note", value=st.session_state.get("note", ""))
 
         edit_id = st.session_state.get("edit_id")
         submit_label = "Update Trade" if edit_id else "Add Trade"
@@ -56,15 +63,60 @@ def trade_input_form():
                 "fees": float(fees),
                 "trade_datetime": trade_dt,
                 "note": note,
+                "account": account.strip(),
             }
-            df = upsert_trade(row)
+            trade_id = save_trade(row)
             st.session_state["edit_id"] = None
-            st.success(f"Saved trade ID {int(row['id'])}")
+            st.success(f"Saved trade ID {trade_id}")
+
+
+def table_query(key: str, frame: pd.DataFrame, version, group_column: str, actions: List[str],
+                default_sort: str) -> TableQuery:
+    """Filter / sort controls of a paginated table; the page comes from its page input."""
+    with st.expander("Filter and sort", expanded=False):
+        cols = st.columns(4)
+        symbol = cols[0].selectbox("Symbol", ["All"] + distinct(key, frame, "symbol", version), key=f"{key}_symbol")
+        dates = cols[1].date_input("Date range", value=(), key=f"{key}_dates")
+        group = cols[2].selectbox("Group", ["All"] + distinct(key, frame, group_column, version), key=f"{key}_group")
+        picked = cols[3].multiselect("Action", actions, key=f"{key}_actions")
+        cols = st.columns(4)
+        columns = list(frame.columns) + (["closed_at"] if key == "realized" else [])
+        sort_by = cols[0].selectbox("Sort by", columns, index=columns.index(default_sort), key=f"{key}_sort")
+        ascending = cols[1].checkbox("Ascending", value=False, key=f"{key}_ascending")
+        page_size = cols[2].selectbox("Rows per page", PAGE_SIZES, index=1, key=f"{key}_page_size")
+        accounts = distinct(key, frame, "account", version) if "account" in frame.columns else []
+        account = cols[3].selectbox("Account", ["All"] + accounts, key=f"{key}_account") if len(accounts) > 1 else "All"
+    dates = tuple(dates) if isinstance(dates, (tuple, list)) else (dates,)
+    return TableQuery(
+        symbol=None if symbol == "All" else symbol,
+        start=dates[0] if dates else None,
+        end=dates[1] if len(dates) > 1 else None,
+        group_id=None if group == "All" else int(group),
+        account=None if account == "All" else account,
+        actions=tuple(picked),
+        sort_by=sort_by,
+        ascending=ascending,
+        page=int(st.session_state.get(f"{key}_page", 1)) - 1,
+        page_size=int(page_size),
+    )
+
+
+def show_page(key: str, page: Page):
+    """The formatted page plus its position and page selector."""
+    with instrument.span(f"app.{key}.render", rows=len(page.rows)):
+        st.dataframe(page.rows, use_container_width=True, hide_index=True)
+    cols = st.columns([1, 3])
+    # Keep the selector in range when filters shrink the result
+    st.session_state[f"{key}_page"] = page.page + 1
+    cols[0].number_input(f"Page (of {page.pages})", min_value=1, max_value=page.pages, step=1, key=f"{key}_page")
+    shown = f"{page.first_row + 1:,}-{page.last_row:,}" if page.total else "0"
+    cols[1].caption(f"Rows {shown} of {page.total:,}")
 
 
 def trades_table():
     st.subheader("Trades")
     df = load_trades()
+    version = trades_version()
 
     if df.empty:
         st.info("No trades yet.")
@@ -83,131 +135,308 @@ def trades_table():
             "fees": float(row["fees"]),
             "trade_datetime": row["trade_datetime"],
             "note": row["note"],
+            "account": row["account"],
         })
 
     def on_delete(row):
-        delete_trade(int(row["id"]))
+        remove_trade(int(row["id"]))
         st.experimental_rerun()
 
-    # Display
-    styled = df.copy()
-    styled["expiry"] = pd.to_datetime(styled["expiry"]).dt.strftime("%Y-%m-%d")
-    styled["trade_datetime"] = pd.to_datetime(styled["trade_datetime"]).dt.strftime("%Y-%m-%d %H:%M:%S")
-
-    st.dataframe(styled, use_container_width=True, hide_index=True)
+    # Only the visible page is formatted and sent to the browser
+    query = table_query("trades", df, version, "group_id", ["BTO", "STO", "STC", "BTC"], "trade_datetime")
+    show_page("trades", trades_page(df, query, version))
 
     cols = st.columns(3)
     with cols[0]:
         trade_id_to_edit = st.number_input("Trade ID to edit", min_value=0, value=0, step=1)
         if st.button("Load for edit") and trade_id_to_edit:
-            row = df[df["id"] == int(trade_id_to_edit)]
-            if not row.empty:
-                on_edit(row.iloc[0])
+            row = get_trade(int(trade_id_to_edit))
+            if row is not None:
+                on_edit(row)
                 st.experimental_rerun()
             else:
                 st.warning("Trade ID not found")
     with cols[1]:
         trade_id_to_delete = st.number_input("Trade ID to delete", min_value=0, value=0, step=1, key="del")
         if st.button("Delete") and trade_id_to_delete:
-            on_delete(df[df["id"] == int(trade_id_to_delete)].iloc[0]) if not df[df["id"] == int(trade_id_to_delete)].empty else st.warning("Trade ID not found")
+            row = get_trade(int(trade_id_to_delete))
+            on_delete(row) if row is not None else st.warning("Trade ID not found")
     with cols[2]:
         # Export
         if st.button("Export CSV"):
-            csv = styled.to_csv(index=False).encode("utf-8")
+            # The filtered rows in the current sort, all pages
+            csv = format_rows(trades_filtered(df, query, version)).to_csv(index=False).encode("utf-8")
             st.download_button("Download trades.csv", csv, file_name="trades.csv", mime="text/csv")
 
         uploaded = st.file_uploader("Import CSV", type=["csv"], accept_multiple_files=False)
-        if uploaded is not None:
+        # The uploader keeps its file across reruns; import each upload once
+        if uploaded is not None and st.session_state.get("imported_upload") != uploaded.file_id:
+            st.session_state["imported_upload"] = uploaded.file_id
             try:
-                df_imported = pd.read_csv(uploaded)
-                # Save by merging with existing
-                existing = load_trades()
-                start_id = 1 if existing.empty else int(existing["id"].max()) + 1
-                df_imported = df_imported.copy()
-                if "id" in df_imported.columns:
-                    df_imported = df_imported.drop(columns=["id"])  # reassign ids
-                df_imported["id"] = list(range(start_id, start_id + len(df_imported)))
-                merged = pd.concat([existing, df_imported], ignore_index=True)
-                save_trades(merged)
-                st.success(f"Imported {len(df_imported)} rows")
-                st.experimental_rerun()
+                bar = st.progress(0.0, text="Importing...")
+
+                def on_progress(result):
+                    bar.progress(min(1.0, uploaded.tell() / max(uploaded.size, 1)), text=f"Imported {result.imported:,} of {result.read:,} rows")
+
+                result = import_trades_stream(uploaded, progress=on_progress)
+                st.success(f"Imported {result.imported} rows")
+                if result.rejected:
+                    st.warning(f"Rejected {result.rejected} rows")
+                    st.dataframe(result.rejected_rows, use_container_width=True, hide_index=True)
+                else:
+                    st.experimental_rerun()
             except Exception as e:
                 st.error(f"Failed to import: {e}")
 
 
+def marks_loader(store: MarkStore):
+    """Bulk-load a marks snapshot file into the store."""
+    with st.expander("Load marks"):
+        st.caption("CSV or JSON rows with symbol, expiry, strike, option_type, mark and optionally as_of")
+        upload = st.file_uploader("Marks snapshot", type=["csv", "json", "jsonl"], key="marks_upload")
+        if upload is not None and st.button("Load snapshot", key="marks_load"):
+            with instrument.span("app.marks.load"):
+                result = store.load_snapshot(upload)
+            st.success(f"Loaded {result.imported} marks, skipped {result.rejected} of {result.read} rows.")
+            if result.rejected:
+                st.dataframe(result.rejected_rows, use_container_width=True, hide_index=True)
+
+
+def _leg_labels(legs: pd.DataFrame) -> pd.Series:
+    expiry = pd.to_datetime(legs["expiry"]).dt.strftime("%Y-%m-%d")
+    return legs["symbol"].astype(str) + " " + expiry + " " + legs["strike"].map("{:g}".format) + legs["option_type"] + " " + legs["side"]
+
+
+def marks_overrides(open_df: pd.DataFrame, marks: pd.DataFrame):
+    """Hand-entered marks for the selected legs only, starting from their current marks."""
+    stored = len(marks)
+    latest = marks["as_of"].max() if stored else None
+    st.caption(f"{stored} stored marks" + (f", latest as of {latest:%Y-%m-%d %H:%M}" if stored else " (legs are valued at cost)"))
+    labels = _leg_labels(open_df)
+    picked = st.multiselect("Override marks for", options=labels.tolist(), key="marks_override_legs")
+    if not picked:
+        return None
+    legs = compute_unrealized(open_df[labels.isin(picked).to_numpy()], marks)
+    legs = legs[["symbol", "expiry", "strike", "option_type", "side", "open_quantity", "average_cost", "mark"]].copy()
+    legs["expiry"] = pd.to_datetime(legs["expiry"]).dt.strftime("%Y-%m-%d")
+    return st.data_editor(
+        legs,
+        key="marks_editor",
+        use_container_width=True,
+        hide_index=True,
+        disabled=["symbol", "expiry", "strike", "option_type", "side", "open_quantity", "average_cost"],
+        column_config={"mark": st.column_config.NumberColumn("Mark", min_value=0.0, step=0.01, format="%.2f")},
+    )
+
+
 def portfolio_view():
     st.subheader("P/L and Positions")
-    trades = load_trades()
-    realized_df, open_df, total_realized = compute_pl(trades)
+    version = trades_version()
+    accounts = distinct("trades", load_trades(), "account", version)
+    book, account = None, None
+    if len(accounts) > 1:
+        # Each account is matched on its own; only accounts with new trades are re-matched
+        picked = st.selectbox("Account", ["All accounts"] + accounts, key="portfolio_account")
+        account = None if picked == "All accounts" else picked
+        book = load_account_book()
+        result = book.result(account)
+        trade_count = book.trades[account] if account is not None else sum(book.trades.values())
+    else:
+        # Matcher state is kept current by the storage writers; no full re-match here
+        state = load_pl_state()
+        result = state.result()
+        trade_count = len(state)
+    realized_df, open_df, total_realized = result.as_tuple()
+    # Views derived from the result (realized pages, scenarios) are keyed on the store version and account
+    result_version = (version, account)
 
     cols = st.columns(3)
     cols[0].metric("Total realized P/L", f"${total_realized:,.2f}")
     open_contracts = int(open_df["open_quantity"].sum()) if not open_df.empty else 0
     cols[1].metric("Open contracts", f"{open_contracts}")
-    cols[2].metric("Trades count", f"{len(trades)}")
+    cols[2].metric("Trades count", f"{trade_count}")
 
     st.markdown("Realized events")
     if realized_df.empty:
         st.info("No realized P/L yet.")
     else:
-        display = realized_df.copy()
-        display["expiry"] = pd.to_datetime(display["expiry"]).dt.strftime("%Y-%m-%d")
-        st.dataframe(display, use_container_width=True, hide_index=True)
+        query = table_query("realized", realized_df, result_version, "open_group_id", ["STC", "BTC"], "closed_at")
+        show_page("realized", realized_page(realized_df, load_trades(), query, result_version))
 
     st.markdown("Open positions")
     if open_df.empty:
         st.info("No open positions.")
     else:
-        display_open = open_df.copy()
-        display_open["expiry"] = pd.to_datetime(display_open["expiry"]).dt.strftime("%Y-%m-%d")
-        st.dataframe(display_open, use_container_width=True, hide_index=True)
+        with instrument.span("app.open.render", rows=len(open_df)):
+            display_open = open_df.copy()
+            display_open["expiry"] = pd.to_datetime(display_open["expiry"]).dt.strftime("%Y-%m-%d")
+            st.dataframe(display_open, use_container_width=True, hide_index=True)
 
-    st.markdown("Unrealized P/L (enter marks)")
+    st.markdown("Unrealized P/L")
+    marks = None
     if not open_df.empty:
-        # Build marks input grid
-        mark_rows = []
-        for idx, row in open_df.iterrows():
-            cols = st.columns(6)
-            cols[0].write(f"{row['symbol']}")
-            cols[1].write(pd.to_datetime(row["expiry"]).strftime("%Y-%m-%d"))
-            cols[2].write(f"{row['strike']:.2f}{row['option_type']}")
-            cols[3].write(row["side"]) 
-            default_mark = float(row["average_cost"])  # default to cost basis
-            mark_val = cols[4].number_input(
-                "Mark",
-                min_value=0.0,
-                value=default_mark,
-                step=0.01,
-                key=f"mark_{idx}",
-                format="%.2f",
-            )
-            cols[5].write(f"Qty {int(row['open_quantity'])}")
-            mark_rows.append({
-                "symbol": row["symbol"],
-                "expiry": row["expiry"],
-                "strike": row["strike"],
-                "option_type": row["option_type"],
-                "side": row["side"],
-                "mark": mark_val,
-            })
-        marks_df = pd.DataFrame(mark_rows)
-        unrealized = compute_unrealized(open_df, marks_df)
-        st.dataframe(unrealized[["symbol", "expiry", "strike", "option_type", "side", "open_quantity", "average_cost", "mark", "unrealized_pl"]], use_container_width=True, hide_index=True)
-        total_unreal = float(unrealized["unrealized_pl"].sum()) if not unrealized.empty else 0.0
+        store = mark_store()
+        marks_loader(store)
+        # Stored marks feed the valuation directly; legs without one are valued at cost
+        marks = store.latest()
+        overrides = marks_overrides(open_df, marks)
+        if overrides is not None and st.button("Save overrides as marks", key="marks_save_overrides"):
+            store.ingest(overrides, source="manual")
+        marks = with_overrides(marks, overrides)
+        unrealized, total_unreal = mark_to_market(open_df, marks)
+        leg_columns = ["account"] if "account" in unrealized.columns else []
+        st.dataframe(unrealized[leg_columns + ["symbol", "expiry", "strike", "option_type", "side", "open_quantity", "average_cost", "mark", "unrealized_pl"]], use_container_width=True, hide_index=True)
         st.metric("Total unrealized P/L", f"${total_unreal:,.2f}")
+        with instrument.span("app.scenarios", rows=len(open_df)):
+            scenario_view(open_df, result.open_lots, result_version)
+
+    with instrument.span("app.equity"):
+        equity_view()
+
+    if book is not None and account is None:
+        st.markdown("By account")
+        with instrument.span("app.accounts.render", rows=len(book.results)):
+            st.dataframe(book.summary(marks), use_container_width=True, hide_index=True)
+
+    st.markdown("By strategy group")
+    # Same matcher pass as above; lots and realized events carry their opening group
+    by_group = book.groups(marks) if book is not None and account is None else summarize_by_group(result, marks)
+    if by_group.empty:
+        st.info("No trades yet.")
+    else:
+        with instrument.span("app.groups.render", rows=len(by_group)):
+            st.dataframe(by_group, use_container_width=True, hide_index=True)
+
+
+def equity_view():
+    st.markdown("Daily equity")
+    curve = load_equity_curve()
+    if curve.groups.empty:
+        st.info("No trades yet.")
+        return
+    # Group ids repeat across accounts, so a group is picked as (account, group_id)
+    keys = curve.groups[["account", "group_id"]].dropna(subset=["group_id"]).drop_duplicates()
+    keys = list(keys.sort_values(["account", "group_id"]).itertuples(index=False, name=None))
+    several = len({account for account, _ in keys}) > 1
+
+    def label(key) -> str:
+        if key == "All":
+            return key
+        return f"{key[0]} / {key[1]}" if several else str(key[1])
+
+    group = st.selectbox("Group", options=["All"] + keys, format_func=label, key="equity_group")
+    if group == "All":
+        daily = curve.account
+    else:
+        daily = curve.group(group[1], group[0])
+    st.line_chart(daily[["realized_pl", "unrealized_pl", "equity"]])
+    stats = equity_stats(daily)
+    cols = st.columns(3)
+    cols[0].metric("P/L", f"${stats['total_pl']:,.2f}")
+    cols[1].metric("Max drawdown", f"${stats['max_drawdown']:,.2f}")
+    cols[2].metric("Sharpe (daily)", f"{stats['sharpe']:.2f}")
+
+
+@st.cache_data(max_entries=16, show_spinner="Revaluing scenarios...")
+def _scenario_cube(_positions: pd.DataFrame, version, valuation_date: dt.date, inputs: tuple, rate: float,
+                   by: str) -> ScenarioCube:
+    """
+    `scenario_grid` of the positions, cached on the store version (and account)
+    they came from, the day and the grid inputs; `_positions` itself is not hashed.
+    """
+    instrument.count("app.scenarios.cache_miss")
+    symbols, spot, vol = zip(*inputs)
+    return scenario_grid(
+        _positions,
+        spot=pd.Series(spot, index=symbols),
+        vol=pd.Series(vol, index=symbols),
+        rate=rate,
+        by=by,
+        valuation_date=valuation_date,
+    )
+
+
+def _scenario_groups(open_lots: pd.DataFrame) -> pd.DataFrame:
+    """Open lots with a ``group`` label; group ids repeat across accounts, so those are qualified."""
+    label = open_lots["group_id"].astype("string").fillna("none")
+    if "account" in open_lots.columns:
+        label = open_lots["account"].astype(str) + " / " + label
+    return open_lots.assign(group=label)
+
+
+def scenario_view(open_df: pd.DataFrame, open_lots: pd.DataFrame, version):
+    st.markdown("Scenario P/L (spot move x vol shift)")
+    # Spot defaults to the mean strike per symbol; there is no price feed
+    inputs = open_df.groupby("symbol", as_index=False)["strike"].mean().rename(columns={"strike": "spot"})
+    inputs["vol"] = 0.30
+    inputs = st.data_editor(
+        inputs,
+        key="scenario_inputs",
+        hide_index=True,
+        disabled=["symbol"],
+        column_config={
+            "spot": st.column_config.NumberColumn("Spot", min_value=0.01, format="%.2f"),
+            "vol": st.column_config.NumberColumn("Vol", min_value=0.01, step=0.01, format="%.2f"),
+        },
+    )
+    cols = st.columns(4)
+    rate = cols[0].number_input("Rate", value=0.04, step=0.005, format="%.3f")
+    days = cols[1].slider("Days forward", min_value=0, max_value=9, value=0)
+    by = cols[2].selectbox("By", options=["symbol", "group"], key="scenario_by")
+
+    # Lots carry their opening group; P/L is linear in quantity, so lots sum to their legs
+    positions = open_df if by == "symbol" else _scenario_groups(open_lots)
+    grid_inputs = tuple(inputs[["symbol", "spot", "vol"]].itertuples(index=False, name=None))
+    cube = _scenario_cube(positions, version, dt.date.today(), grid_inputs, float(rate), by)
+    picked = cols[3].selectbox(by.capitalize(), options=["All"] + cube.groups.tolist())
+    grid = cube.heatmap(days=days, group=None if picked == "All" else picked)
+    cells = grid.stack().rename("pnl").reset_index()
+    chart = alt.Chart(cells).mark_rect().encode(
+        x=alt.X("vol_shift:O", title="Vol shift", axis=alt.Axis(format="+.2f")),
+        y=alt.Y("spot_move:O", title="Spot move", sort="descending", axis=alt.Axis(format="+.0%")),
+        color=alt.Color("pnl:Q", title="P/L", scale=alt.Scale(scheme="redyellowgreen", domainMid=0)),
+        tooltip=["spot_move", "vol_shift", alt.Tooltip("pnl:Q", format=",.0f")],
+    )
+    st.altair_chart(chart, use_container_width=True)
+
+
+def diagnostics_panel(run: instrument.Run):
+    """Timings of this rerun and latency of the recent ones (OPTIONS_INSTRUMENT=1)."""
+    with st.expander(f"Diagnostics: rerun took {run.seconds * 1000:,.0f} ms", expanded=False):
+        spans = pd.DataFrame([
+            {"step": "  " * span.depth + span.name, "ms": span.seconds * 1000, "rows": span.rows}
+            for span in run.ordered()
+        ])
+        if not spans.empty:
+            st.dataframe(spans, use_container_width=True, hide_index=True,
+                         column_config={"ms": st.column_config.NumberColumn("ms", format="%.1f")})
+        if run.counters:
+            st.dataframe(pd.DataFrame(sorted(run.counters.items()), columns=["counter", "count"]),
+                         use_container_width=True, hide_index=True)
+        latency = pd.DataFrame({"rerun ms": [r.seconds * 1000 for r in instrument.recent_runs()]})
+        st.line_chart(latency)
+        st.caption(f"Metrics log: {instrument.METRICS_LOG_PATH}")
 
 
 def main():
+    instrument.begin_run("rerun")
     st.title(APP_TITLE)
 
     tabs = st.tabs(["Add Trade", "Portfolio", "Trades"])
 
     with tabs[0]:
-        trade_input_form()
+        with instrument.span("app.add_trade"):
+            trade_input_form()
     with tabs[1]:
-        portfolio_view()
+        with instrument.span("app.portfolio"):
+            portfolio_view()
     with tabs[2]:
-        trades_table()
+        with instrument.span("app.trades"):
+            trades_table()
+
+    run = instrument.end_run()
+    if run is not None:
+        diagnostics_panel(run)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,39 @@
+"""
+Vectorized backtesting of the day-2-backtesting.ipynb strategies.
+
+Prices are wide frames (dates x symbols); strategies, the simulators and the
+metrics in ``metrics.py`` run on every symbol at once::
+
+    from backtest import MACrossover, backtest
+    sim = backtest(MACrossover(20, 50), closes)
+    sim.summary()
+"""
+import pandas as pd
+
+from backtest.data import FrameSource, PriceCache, PriceSource, YahooSource
+from backtest.events import Book, Costs, backtest_events, run_book
+from backtest.portfolio import Accumulation, Simulation, accumulate, dca, entry_units, schedule, simulate
+from backtest.strategy import EMAWick, MACrossover, Strategy
+from backtest.sweep import ema_wick_sweep, ma_sweep, rank
+from backtest.walkforward import WalkForward, walk_forward
+
+
+def backtest(strategy: Strategy, prices: pd.DataFrame, cost: float = 0.0, fee: float = 0.0, amount=None):
+    """
+    Run `strategy` over `prices`. Exposure strategies give a `Simulation`;
+    accumulating strategies such as `EMAWick` give an `Accumulation` (one unit, or
+    `amount` dollars, per entry).
+    """
+    signals = strategy.signals(prices)
+    traded = strategy.prices(prices, signals)
+    if strategy.accumulates:
+        return accumulate(traded, entry_units(traded, signals, amount), fee)
+    return simulate(traded, strategy.positions(signals), cost, start=strategy.warmup())
+
+
+__all__ = [
+    "Accumulation", "Book", "Costs", "EMAWick", "FrameSource", "MACrossover", "PriceCache", "PriceSource", "Simulation",
+    "Strategy", "WalkForward", "YahooSource",
+    "accumulate", "backtest", "backtest_events", "dca", "ema_wick_sweep", "entry_units", "ma_sweep", "rank",
+    "run_book", "schedule", "simulate", "walk_forward",
+]
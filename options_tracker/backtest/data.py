@@ -0,0 +1,226 @@
+"""
+Local price cache for the daily bars the notebooks download from Yahoo.
+
+Each symbol is one Arrow IPC (or Parquet) file of daily OHLCV rows. The file
+records the date range that has been fetched, not only the dates that have
+rows, so weekends and holidays inside the range are not refetched. A request
+fetches only the part of its range that the file does not cover yet, merges
+it in and rewrites the file. In offline mode nothing is fetched.
+
+Arrow files are read through a memory map, and loaded frames are kept per
+process (keyed on the file's mtime and size), so repeated backtest runs
+share one copy per symbol.
+
+Where missing history comes from is pluggable: `YahooSource` (needs
+yfinance) by default, or any `PriceSource`, e.g. `FrameSource` for fixtures.
+"""
+import os
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+import pandas as pd
+
+# pyarrow and yfinance are optional and only imported when first needed
+pa = None
+pq = None
+
+PRICE_CACHE_DIR = os.environ.get("OPTIONS_PRICE_CACHE", "/workspace/options_tracker/price_cache")
+PRICES_OFFLINE = os.environ.get("OPTIONS_PRICES_OFFLINE", "") not in ("", "0")
+
+PRICE_FIELDS = ["Open", "High", "Low", "Close", "Adj Close", "Volume"]
+FORMATS = {"arrow": ".arrow", "parquet": ".parquet"}
+# Threads for fetching several symbols; downloads are network-bound
+FETCH_WORKERS = 8
+
+DateLike = Union[str, pd.Timestamp, Any]
+
+
+def _import_pyarrow() -> None:
+    global pa, pq
+    if pa is not None:
+        return
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError as exc:
+        raise ImportError("The price cache requires pyarrow (pip install pyarrow)") from exc
+    pa, pq = pyarrow, pyarrow.parquet
+
+
+def _day(value: Optional[DateLike]) -> pd.Timestamp:
+    """Normalized date; no value means today (exclusive, so today's partial bar is not cached)."""
+    return pd.Timestamp(value).normalize() if value is not None else pd.Timestamp.today().normalize()
+
+
+class PriceSource(ABC):
+    """Fetches daily bars for one symbol over [start, end)."""
+
+    @abstractmethod
+    def fetch(self, symbol: str, start: pd.Timestamp, end: pd.Timestamp) -> pd.DataFrame:
+        """Daily bars with the PRICE_FIELDS columns, indexed by date."""
+
+
+class YahooSource(PriceSource):
+    """`yf.download` with unadjusted OHLC plus ``Adj Close``, as in the notebooks."""
+
+    def fetch(self, symbol: str, start: pd.Timestamp, end: pd.Timestamp) -> pd.DataFrame:
+        try:
+            import yfinance as yf
+        except ImportError as exc:
+            raise ImportError("Fetching prices requires yfinance (pip install yfinance)") from exc
+        frame = yf.download(symbol, start=start, end=end, progress=False, auto_adjust=False)
+        if isinstance(frame.columns, pd.MultiIndex):
+            frame.columns = frame.columns.get_level_values(0)
+        return frame
+
+
+class FrameSource(PriceSource):
+    """Serves fixed frames per symbol (tests, fixtures) and records every fetch."""
+
+    def __init__(self, frames: Dict[str, pd.DataFrame]) -> None:
+        self.frames = frames
+        self.calls: List[Tuple[str, pd.Timestamp, pd.Timestamp]] = []
+
+    def fetch(self, symbol: str, start: pd.Timestamp, end: pd.Timestamp) -> pd.DataFrame:
+        self.calls.append((symbol, start, end))
+        frame = self.frames.get(symbol)
+        if frame is None:
+            return pd.DataFrame(columns=PRICE_FIELDS, index=pd.DatetimeIndex([], name="Date"))
+        return frame[(frame.index >= start) & (frame.index < end)]
+
+
+def _normalize(frame: pd.DataFrame) -> pd.DataFrame:
+    """Float price fields on a sorted, tz-naive DatetimeIndex named Date."""
+    frame = frame.reindex(columns=PRICE_FIELDS).astype("float64")
+    index = pd.DatetimeIndex(frame.index)
+    if index.tz is not None:
+        index = index.tz_localize(None)
+    frame.index = index.normalize().rename("Date")
+    return frame[~frame.index.duplicated(keep="last")].sort_index()
+
+
+class PriceCache:
+    def __init__(
+        self,
+        root: Optional[str] = None,
+        source: Optional[PriceSource] = None,
+        offline: Optional[bool] = None,
+        fmt: str = "arrow",
+    ) -> None:
+        if fmt not in FORMATS:
+            raise ValueError(f"Invalid price cache format {fmt}")
+        _import_pyarrow()
+        self.root = root or PRICE_CACHE_DIR
+        self.source = source if source is not None else YahooSource()
+        self.offline = PRICES_OFFLINE if offline is None else offline
+        self.fmt = fmt
+        self._frames: Dict[str, Tuple[Tuple[int, int], pd.DataFrame, Tuple[pd.Timestamp, pd.Timestamp]]] = {}
+
+    def path(self, symbol: str) -> str:
+        safe = symbol.replace(os.sep, "_")
+        return os.path.join(self.root, safe + FORMATS[self.fmt])
+
+    def _read(self, path: str) -> Tuple[pd.DataFrame, Tuple[pd.Timestamp, pd.Timestamp]]:
+        if self.fmt == "arrow":
+            table = pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+        else:
+            table = pq.read_table(path, memory_map=True)
+        meta = table.schema.metadata or {}
+        coverage = (pd.Timestamp(meta[b"start"].decode()), pd.Timestamp(meta[b"end"].decode()))
+        return table.to_pandas().set_index("Date"), coverage
+
+    def load(self, symbol: str) -> Optional[Tuple[pd.DataFrame, Tuple[pd.Timestamp, pd.Timestamp]]]:
+        """The cached bars and the [start, end) range they cover, or None if not cached."""
+        path = self.path(symbol)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        memo = self._frames.get(path)
+        if memo is None or memo[0] != stamp:
+            memo = (stamp, *self._read(path))
+            self._frames[path] = memo
+        return memo[1], memo[2]
+
+    def _write(self, symbol: str, frame: pd.DataFrame, coverage: Tuple[pd.Timestamp, pd.Timestamp]) -> None:
+        os.makedirs(self.root, exist_ok=True)
+        table = pa.Table.from_pandas(frame.reset_index(), preserve_index=False)
+        table = table.replace_schema_metadata({"start": coverage[0].isoformat(), "end": coverage[1].isoformat()})
+        path = self.path(symbol)
+        tmp_path = f"{path}.tmp"
+        if self.fmt == "parquet":
+            pq.write_table(table, tmp_path)
+        else:
+            with pa.OSFile(tmp_path, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        os.replace(tmp_path, path)
+
+    def _missing(self, coverage: Optional[Tuple[pd.Timestamp, pd.Timestamp]],
+                 start: pd.Timestamp, end: pd.Timestamp) -> List[Tuple[pd.Timestamp, pd.Timestamp]]:
+        if coverage is None:
+            return [(start, end)] if start < end else []
+        # Gaps run up to the cached range (never leave a hole next to it), so
+        # the covered range stays one interval
+        gaps = []
+        if start < coverage[0]:
+            gaps.append((start, coverage[0]))
+        if end > coverage[1]:
+            gaps.append((coverage[1], end))
+        return gaps
+
+    def history(self, symbol: str, start: DateLike, end: Optional[DateLike] = None) -> pd.DataFrame:
+        """Daily bars over [start, end), fetching only the days the cache does not cover."""
+        start, end = _day(start), _day(end)
+        cached = self.load(symbol)
+        frame, coverage = cached if cached is not None else (None, None)
+        gaps = self._missing(coverage, start, end)
+        if gaps and not self.offline:
+            fetched = [_normalize(self.source.fetch(symbol, lo, hi)) for lo, hi in gaps]
+            parts = ([frame] if frame is not None else []) + [part for part in fetched if not part.empty]
+            frame = _normalize(pd.concat(parts)) if parts else _normalize(pd.DataFrame())
+            coverage = (min(start, coverage[0]) if coverage else start, max(end, coverage[1]) if coverage else end)
+            self._write(symbol, frame, coverage)
+        elif frame is None:
+            raise LookupError(f"{symbol} is not in the price cache at {self.root}")
+        return frame[(frame.index >= start) & (frame.index < end)]
+
+    def histories(self, symbols: Iterable[str], start: DateLike, end: Optional[DateLike] = None) -> Dict[str, pd.DataFrame]:
+        """`history` for several symbols, fetched on a thread pool."""
+        symbols = list(dict.fromkeys(symbols))
+        with ThreadPoolExecutor(max_workers=min(FETCH_WORKERS, max(1, len(symbols)))) as pool:
+            return dict(zip(symbols, pool.map(lambda symbol: self.history(symbol, start, end), symbols)))
+
+    def prices(self, symbols: Iterable[str], start: DateLike, end: Optional[DateLike] = None,
+               field: str = "Adj Close") -> pd.DataFrame:
+        """One `field` column per symbol (dates x symbols), as the backtests take."""
+        frames = self.histories(symbols, start, end)
+        return pd.DataFrame({symbol: frame[field] for symbol, frame in frames.items()})
+
+    def download(self, tickers: Union[str, Iterable[str]], start: DateLike, end: Optional[DateLike] = None) -> pd.DataFrame:
+        """
+        Drop-in for ``yf.download(tickers, start=..., end=..., auto_adjust=False)``:
+        fields as columns for one ticker, (field, ticker) columns for a list.
+        """
+        if isinstance(tickers, str):
+            return self.history(tickers, start, end)
+        frames = self.histories(tickers, start, end)
+        wide = pd.concat(frames, axis=1, names=["Ticker", "Price"])
+        return wide.swaplevel(axis=1).reindex(columns=pd.MultiIndex.from_product(
+            [PRICE_FIELDS, list(frames)], names=["Price", "Ticker"]))
+
+
+_default_cache: Optional[PriceCache] = None
+
+
+def default_cache() -> PriceCache:
+    """Process-wide cache at PRICE_CACHE_DIR with the Yahoo source."""
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = PriceCache()
+    return _default_cache
+
+
+def download(tickers: Union[str, Iterable[str]], start: DateLike, end: Optional[DateLike] = None) -> pd.DataFrame:
+    return default_cache().download(tickers, start, end)
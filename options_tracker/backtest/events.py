@@ -0,0 +1,233 @@
+"""
+Event-driven portfolio simulation: orders, fills, cash and costs.
+
+Unlike ``portfolio.simulate`` (costless returns at the close), the book here
+holds whole lots and one cash balance across every symbol. Each bar it
+turns the strategy's positions into orders, sells first, then buys what the
+remaining cash pays for (scaling every buy down alike when it falls short),
+and charges commission and slippage on each fill.
+
+Bars are processed in date order, since cash carries from one bar to the
+next, but each bar is one set of array operations over all symbols; there
+is no per-symbol or per-order Python code.
+
+Fills are recorded as rows of ``storage.TRADE_COLUMNS``, so a backtest can go
+straight into the tracker (``storage.save_trades``, ``compute_pl``,
+``summarize_by_group``). Shares have no expiry, strike or type there; each
+symbol is booked as a zero-strike call expiring on the last bar, one
+contract per lot of ``OPTIONS_MULTIPLIER`` shares, which keeps the tracker's
+P/L in dollars. Every round trip (flat to flat) of a symbol is one group.
+"""
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+
+from backtest.strategy import Strategy
+from metrics import cagr, max_drawdown, periods_per_year, sharpe_ratio, total_return
+from pl import OPTIONS_MULTIPLIER
+from storage import DEFAULT_ACCOUNT, TRADE_COLUMNS
+
+SIZING_MODES = ("equal", "amount", "units")
+BOOK_COLUMNS = ["total_return", "cagr", "max_drawdown", "sharpe", "fills", "fees", "slippage"]
+
+
+@dataclass
+class Costs:
+    """Per-order `commission`, `per_share` commission, and `slippage` as a fraction of price."""
+    commission: float = 0.0
+    per_share: float = 0.0
+    slippage: float = 0.0
+
+    def fees(self, shares: np.ndarray) -> np.ndarray:
+        return np.where(shares != 0, self.commission + self.per_share * np.abs(shares), 0.0)
+
+
+@dataclass
+class Book:
+    """Cash, lots held and equity per bar, plus every fill as tracker trades."""
+    index: pd.DatetimeIndex
+    symbols: pd.Index
+    cash: np.ndarray
+    lots: np.ndarray
+    equity: np.ndarray
+    trades: pd.DataFrame = field(repr=False)
+    capital: float = 0.0
+    slippage: float = 0.0
+
+    def frame(self, name: str = "lots") -> pd.DataFrame:
+        return pd.DataFrame(getattr(self, name), index=self.index, columns=self.symbols)
+
+    @property
+    def returns(self) -> pd.Series:
+        return pd.Series(self.equity, index=self.index).pct_change()
+
+    def summary(self, periods: Optional[float] = None) -> pd.Series:
+        """
+        Portfolio statistics after all costs (`slippage` is its cost in
+        dollars), annualized with `periods` bars a year, inferred by default.
+        """
+        periods = periods or periods_per_year(self.index)
+        equity = pd.Series(self.equity / self.capital, index=self.index)
+        return pd.Series({
+            "total_return": total_return(equity),
+            "cagr": cagr(equity, periods=periods),
+            "max_drawdown": max_drawdown(equity),
+            "sharpe": sharpe_ratio(self.returns, periods),
+            "fills": len(self.trades),
+            "fees": float(self.trades["fees"].sum()),
+            "slippage": self.slippage,
+        })[BOOK_COLUMNS]
+
+
+def _lots(value: np.ndarray, price: np.ndarray, lot: float) -> np.ndarray:
+    """Whole lots that `value` dollars buy at `price` (0 where unpriced)."""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.nan_to_num(np.floor(value / (price * lot)), nan=0.0, posinf=0.0, neginf=0.0)
+
+
+def run_book(
+    prices: pd.DataFrame,
+    positions: pd.DataFrame,
+    capital: float = 100_000.0,
+    costs: Optional[Costs] = None,
+    sizing: str = "equal",
+    amount: Optional[float] = None,
+    accumulate: bool = False,
+    start: int = 0,
+    lot: float = OPTIONS_MULTIPLIER,
+    first_id: int = 1,
+    first_group: int = 1,
+    note: str = "",
+    account: str = DEFAULT_ACCOUNT,
+) -> Book:
+    """
+    Trade `positions` (dates x symbols, long only) at `prices`, filling at
+    each bar's price moved against the order by ``costs.slippage``.
+
+    Exposure positions (0..1) are sized by `sizing`: ``equal`` targets that
+    fraction of an equal share of current equity per symbol, ``amount``
+    that fraction of `amount` dollars, ``units`` that many lots. With
+    `accumulate` (the EMA-wick strategy), positions are cumulative units and
+    each new unit buys `amount` dollars' worth, or one lot without `amount`;
+    buys the cash cannot pay for are dropped, not retried. Rows before
+    `start` (indicator warm-up) are not traded. Fills are booked to `account`.
+    """
+    if sizing not in SIZING_MODES:
+        raise ValueError(f"sizing must be one of {SIZING_MODES}")
+    if sizing == "amount" and amount is None and not accumulate:
+        raise ValueError("sizing='amount' needs an amount")
+    costs = costs or Costs()
+    close = prices.to_numpy(dtype=np.float64)
+    target = np.clip(np.nan_to_num(positions.reindex_like(prices).to_numpy(dtype=np.float64)), 0.0, None)
+    rows, width = close.shape
+    buy_price = close * (1.0 + costs.slippage)
+    sell_price = close * (1.0 - costs.slippage)
+
+    # Lots wanted per bar where that does not depend on the running equity
+    orders = wanted = None
+    if accumulate:
+        units = np.diff(target, axis=0, prepend=0.0).clip(0.0)
+        orders = units if amount is None else units * _lots(np.full(close.shape, amount), buy_price, lot)
+    elif sizing == "amount":
+        wanted = _lots(target * amount, buy_price, lot)
+    elif sizing == "units":
+        wanted = np.floor(target)
+
+    held = np.zeros(width)
+    mark = np.full(width, np.nan)
+    group = np.zeros(width, dtype=np.int64)
+    next_group = first_group
+    cash = float(capital)
+    slipped = 0.0
+    cash_out = np.full(rows, cash)
+    lots_out = np.zeros(close.shape)
+    equity_out = np.full(rows, cash)
+    fills: List[tuple] = []
+    for t in range(start, rows):
+        price = close[t]
+        priced = ~np.isnan(price)
+        np.copyto(mark, price, where=priced)
+        value = held * lot * np.nan_to_num(mark)
+        if accumulate:
+            want = held + orders[t]
+        elif wanted is not None:
+            want = wanted[t]
+        else:
+            want = _lots(target[t] * (cash + value.sum()) / width, buy_price[t], lot)
+        delta = np.where(priced, want - held, 0.0)
+
+        # Sells first, so their proceeds can pay for this bar's buys
+        sells = np.minimum(delta, 0.0)
+        proceeds = -sells * lot * np.nan_to_num(sell_price[t])
+        sell_fees = costs.fees(sells * lot)
+        cash += float(proceeds.sum() - sell_fees.sum())
+
+        buys = np.maximum(delta, 0.0)
+        per_lot = lot * (np.nan_to_num(buy_price[t]) + costs.per_share)
+        spend = buys * per_lot
+        orders_placed = buys > 0
+        budget = cash - costs.commission * orders_placed.sum()
+        needed = spend.sum()
+        if needed > max(budget, 0.0):
+            # Scale every buy down alike; orders rounded to zero drop their commission
+            buys = np.floor(buys * max(budget, 0.0) / needed)
+        buy_fees = costs.fees(buys * lot)
+        cash -= float((buys * lot * np.nan_to_num(buy_price[t])).sum() + buy_fees.sum())
+
+        traded = buys + sells
+        if traded.any():
+            opened = (held == 0) & (buys > 0)
+            group[opened] = next_group + np.arange(opened.sum())
+            next_group += int(opened.sum())
+            cols = np.flatnonzero(traded)
+            fill_price = np.where(traded[cols] > 0, buy_price[t, cols], sell_price[t, cols])
+            slipped += float(np.abs(traded[cols] * lot * (fill_price - price[cols])).sum())
+            fills.append((t, cols, traded[cols], fill_price, (buy_fees + sell_fees)[cols], group[cols]))
+            held = held + traded
+        cash_out[t] = cash
+        lots_out[t] = held
+        equity_out[t] = cash + (held * lot * np.nan_to_num(mark)).sum()
+
+    trades = _trade_rows(fills, prices, first_id, note, account)
+    return Book(prices.index, prices.columns, cash_out, lots_out, equity_out, trades, float(capital), slipped)
+
+
+def _trade_rows(fills: List[tuple], prices: pd.DataFrame, first_id: int, note: str,
+                account: str = DEFAULT_ACCOUNT) -> pd.DataFrame:
+    """Fills as tracker trades, in fill order."""
+    if not fills:
+        return pd.DataFrame(columns=TRADE_COLUMNS)
+    bars = np.concatenate([np.full(len(cols), t) for t, cols, *_ in fills])
+    cols = np.concatenate([f[1] for f in fills])
+    lots = np.concatenate([f[2] for f in fills])
+    expiry = prices.index[-1].date()
+    return pd.DataFrame({
+        "id": pd.array(first_id + np.arange(len(bars)), dtype="Int64"),
+        "group_id": pd.array(np.concatenate([f[5] for f in fills]), dtype="Int64"),
+        "symbol": prices.columns[cols].astype(str),
+        "expiry": expiry,
+        "strike": 0.0,
+        "option_type": "C",
+        "action": np.where(lots > 0, "BTO", "STC"),
+        "quantity": pd.array(np.abs(lots).astype(np.int64), dtype="Int64"),
+        "price": np.concatenate([f[3] for f in fills]),
+        "fees": np.concatenate([f[4] for f in fills]),
+        "trade_datetime": prices.index[bars],
+        "note": note,
+        "account": account,
+    })[TRADE_COLUMNS]
+
+
+def backtest_events(strategy: Strategy, prices: pd.DataFrame, capital: float = 100_000.0,
+                    costs: Optional[Costs] = None, sizing: str = "equal", amount: Optional[float] = None,
+                    **kwargs) -> Book:
+    """Run `strategy` through `run_book`; fills are noted with the strategy."""
+    signals = strategy.signals(prices)
+    traded = strategy.prices(prices, signals)
+    return run_book(
+        traded, strategy.positions(signals), capital, costs, sizing, amount,
+        accumulate=strategy.accumulates, start=strategy.warmup(), note=kwargs.pop("note", repr(strategy)),
+        **kwargs,
+    )
@@ -0,0 +1,160 @@
+"""
+Indicators over (dates x symbols) arrays.
+
+Each function runs down the date axis for every symbol column at once. NaNs
+(dates before a symbol listed, or gaps) are handled like pandas' rolling,
+ewm and resample defaults: a rolling window is NaN until it holds `window`
+valid values, an EMA starts at a symbol's first price, and a candle is built
+from whatever valid prices fall into its bin.
+
+Most universes only have NaNs before each symbol's listing date. That case is
+detected up front and takes a cheaper path (readiness is a comparison
+against the listing row instead of running counts, and the EMA needs no gap
+weights).
+"""
+from typing import Dict, Iterable, Tuple
+
+import numpy as np
+import pandas as pd
+
+CANDLE_FIELDS = ("open", "high", "low", "close")
+
+
+def listing_rows(values: np.ndarray) -> np.ndarray:
+    """First row with a value per column (the number of rows if never listed)."""
+    valid = ~np.isnan(values)
+    return np.where(valid.any(axis=0), np.argmax(valid, axis=0), len(values))
+
+
+def _gapless(valid: np.ndarray, first: np.ndarray) -> bool:
+    """True when every column is valid on every row from its listing date on."""
+    return bool((valid.sum(axis=0) == len(valid) - first).all())
+
+
+def _running_sum(values: np.ndarray) -> np.ndarray:
+    """Cumulative sum down the date axis with a leading row of zeros."""
+    sums = np.empty((len(values) + 1,) + values.shape[1:], dtype=values.dtype)
+    sums[0] = 0
+    # Row by row: several times faster than cumsum(axis=0) on wide C-ordered arrays
+    for i, row in enumerate(values):
+        np.add(sums[i], row, out=sums[i + 1])
+    return sums
+
+
+def rolling_means(values: np.ndarray, windows: Iterable[int]) -> Dict[int, np.ndarray]:
+    """
+    Simple moving averages for several windows, ``rolling(w).mean()`` on
+    arrays. All windows share one running sum.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    valid = ~np.isnan(values)
+    first = listing_rows(values)
+    sums = _running_sum(np.where(valid, values, 0.0))
+    counts = None
+    if not _gapless(valid, first):
+        counts = _running_sum(valid.astype(np.int64))
+    rows = np.arange(len(values))[:, None]
+    means = {}
+    for window in sorted(set(windows)):
+        out = np.empty(values.shape)
+        if not 1 <= window <= len(values):
+            out.fill(np.nan)
+        else:
+            out[:window - 1] = np.nan
+            mean = out[window - 1:]
+            np.subtract(sums[window:], sums[:-window], out=mean)
+            mean /= window
+            if counts is None:
+                # Only pre-listing NaNs: a window is ready `window` rows after
+                # listing, so rows past the latest listing need no mask
+                head = mean[:first.max(initial=0)]
+                np.copyto(head, np.nan, where=rows[window - 1:window - 1 + len(head)] < first + window - 1)
+            else:
+                np.copyto(mean, np.nan, where=counts[window:] - counts[:-window] < window)
+        means[window] = out
+    return means
+
+
+def rolling_mean(values: np.ndarray, window: int) -> np.ndarray:
+    """Simple moving average, ``DataFrame.rolling(window).mean()`` on arrays."""
+    return rolling_means(values, [window])[window]
+
+
+def ewm_mean(values: np.ndarray, span: int) -> np.ndarray:
+    """
+    Recursive EMA, ``ewm(span=span, adjust=False).mean()``: seeded at each
+    column's first value; across a gap the old value keeps decaying, and the
+    last value is carried through the gap.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    alpha = 2.0 / (span + 1.0)
+    out = np.empty(values.shape)
+    prev = np.full(values.shape[1:], np.nan)
+    valid = ~np.isnan(values)
+    if _gapless(valid, listing_rows(values)):
+        for i, row in enumerate(values):
+            step = prev + alpha * (row - prev)
+            prev = np.where(np.isnan(prev), row, step)
+            out[i] = prev
+        return out
+    # pandas' ignore_na=False weighting: the old value's weight decays by
+    # (1 - alpha) per row, observed or not, and resets after each observation
+    old_weight = np.ones(values.shape[1:])
+    for i, row in enumerate(values):
+        seeded = ~np.isnan(prev)
+        observed = valid[i]
+        old_weight = np.where(seeded, old_weight * (1.0 - alpha), old_weight)
+        with np.errstate(invalid="ignore"):
+            step = (old_weight * prev + alpha * row) / (old_weight + alpha)
+        prev = np.where(observed, np.where(seeded, step, row), prev)
+        old_weight = np.where(observed, 1.0, old_weight)
+        out[i] = prev
+    return out
+
+
+def _edge_rows(valid: np.ndarray, starts: np.ndarray, last: bool) -> np.ndarray:
+    """First (or last) valid row of each bin per column; -1 where the bin has none."""
+    n = len(valid)
+    rows = np.arange(n)[:, None]
+    if last:
+        picked = np.maximum.reduceat(np.where(valid, rows, -1), starts, axis=0)
+    else:
+        picked = np.minimum.reduceat(np.where(valid, rows, n), starts, axis=0)
+        picked[picked == n] = -1
+    return picked
+
+
+def resample_ohlc(values: np.ndarray, index: pd.DatetimeIndex, bar: str) -> Tuple[pd.DatetimeIndex, Dict[str, np.ndarray]]:
+    """
+    Open/high/low/close candles of `bar` length (``"84B"``, ``"ME"``, ...)
+    for every column at once, ``resample(bar).ohlc()`` on arrays. Bins come
+    from pandas, so the labels match its resample; bins without any row are
+    dropped, and a column without a valid price in a bin gets NaN.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    positions = pd.Series(np.arange(len(index)), index=index).resample(bar).first().dropna()
+    starts = positions.to_numpy(dtype=np.int64)
+    labels = pd.DatetimeIndex(positions.index)
+    if not len(starts):
+        return labels, {field: np.empty((0,) + values.shape[1:]) for field in CANDLE_FIELDS}
+    ends = np.append(starts[1:], len(values)) - 1
+    valid = ~np.isnan(values)
+    first = listing_rows(values)
+    if _gapless(valid, first):
+        # Bins open at the later of their start and the listing row and close
+        # on their last row; bins ending before the listing are empty
+        open_rows = np.maximum(starts[:, None], first)
+        close_rows = np.broadcast_to(ends[:, None], open_rows.shape)
+        empty = ends[:, None] < first
+    else:
+        open_rows = _edge_rows(valid, starts, last=False)
+        close_rows = _edge_rows(valid, starts, last=True)
+        empty = close_rows < 0
+    columns = np.arange(values.shape[1])
+    candles = {
+        "open": values[np.where(empty, 0, open_rows), columns],
+        "high": np.fmax.reduceat(values, starts, axis=0),
+        "low": np.fmin.reduceat(values, starts, axis=0),
+        "close": values[np.where(empty, 0, close_rows), columns],
+    }
+    return labels, {field: np.where(empty, np.nan, array) for field, array in candles.items()}
@@ -0,0 +1,226 @@
+"""
+Vectorized portfolio simulation over (dates x symbols) price matrices.
+
+`simulate` is the notebook's return-based backtest (strategy return = daily
+return x yesterday's position, minus trading cost on position changes).
+`accumulate` is the unit-based one used for the EMA-wick and DCA cells:
+units bought per bar, cash invested, value and value / cost multiple.
+Both are whole-array expressions across every symbol.
+"""
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from metrics import (
+    TRADING_DAYS, cagr, max_drawdown, periods_per_year, sharpe_ratio, total_return, win_loss, years_between,
+)
+
+SUMMARY_COLUMNS = [
+    "total_return", "cagr", "max_drawdown", "sharpe", "days_in_market",
+    "win_rate", "avg_win", "avg_loss", "win_loss_ratio",
+    "buy_hold_return", "buy_hold_cagr", "buy_hold_max_drawdown", "buy_hold_sharpe",
+]
+ACCUMULATION_COLUMNS = ["units", "invested", "value", "multiple", "cagr", "max_drawdown", "sharpe"]
+
+
+def _growth(returns: np.ndarray) -> np.ndarray:
+    """Growth of $1; NaN returns (not listed yet) leave the value unchanged."""
+    return np.cumprod(1.0 + np.nan_to_num(returns), axis=0)
+
+
+def _final(values: np.ndarray) -> np.ndarray:
+    return values[-1] if len(values) else np.full(values.shape[1:], np.nan)
+
+
+@dataclass
+class Simulation:
+    """Per-period strategy and market returns, one column per symbol."""
+    index: pd.DatetimeIndex
+    symbols: pd.Index
+    returns: np.ndarray
+    market_returns: np.ndarray
+    exposure: np.ndarray
+    turnover: np.ndarray
+
+    @property
+    def equity(self) -> np.ndarray:
+        return _growth(self.returns)
+
+    @property
+    def market_equity(self) -> np.ndarray:
+        return _growth(self.market_returns)
+
+    def frame(self, name: str = "equity") -> pd.DataFrame:
+        """Any of the (dates x symbols) arrays as a DataFrame."""
+        return pd.DataFrame(getattr(self, name), index=self.index, columns=self.symbols)
+
+    def summary(self, periods: int = TRADING_DAYS) -> pd.DataFrame:
+        """Strategy and buy-and-hold statistics per symbol."""
+        returns = np.where(np.isnan(self.market_returns), np.nan, self.returns)
+        equity = np.where(np.isnan(self.market_returns), np.nan, self.equity)
+        market = np.where(np.isnan(self.market_returns), np.nan, self.market_equity)
+        stats = win_loss(returns, self.exposure)
+        table = pd.DataFrame({
+            "total_return": total_return(equity),
+            "cagr": cagr(equity, periods=periods),
+            "max_drawdown": max_drawdown(equity),
+            "sharpe": sharpe_ratio(returns, periods),
+            "days_in_market": np.nansum(self.exposure, axis=0),
+            "win_rate": stats["win_rate"],
+            "avg_win": stats["avg_win"],
+            "avg_loss": stats["avg_loss"],
+            "win_loss_ratio": stats["win_loss_ratio"],
+            "buy_hold_return": total_return(market),
+            "buy_hold_cagr": cagr(market, periods=periods),
+            "buy_hold_max_drawdown": max_drawdown(market),
+            "buy_hold_sharpe": sharpe_ratio(self.market_returns, periods),
+        }, index=self.symbols)
+        return table[SUMMARY_COLUMNS]
+
+
+def simulate(prices: pd.DataFrame, positions: pd.DataFrame, cost: float = 0.0, start: int = 0) -> Simulation:
+    """
+    Return-based backtest: each period earns its close-to-close return times
+    the position held at the previous close. `cost` is charged per unit of
+    position change (0.001 = 10 bps of the traded notional). Rows before
+    `start` (indicator warm-up) are dropped, as the notebook's ``dropna`` does.
+    """
+    close = prices.to_numpy(dtype=np.float64)
+    held = positions.reindex_like(prices).to_numpy(dtype=np.float64)
+    return simulate_arrays(close, held, prices.index, prices.columns, cost, start)
+
+
+def simulate_arrays(close: np.ndarray, held: np.ndarray, index: pd.DatetimeIndex, symbols: pd.Index,
+                    cost: float = 0.0, start: int = 0) -> Simulation:
+    """`simulate` on (dates x symbols) arrays that share `index` and `symbols`."""
+    close = close[start:]
+    held = np.nan_to_num(held[start:])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        market = close[1:] / close[:-1] - 1.0
+    previous = held[:-1]
+    before = np.vstack([np.zeros((1,) + held.shape[1:]), held[:-2]]) if len(held) > 1 else previous
+    turnover = np.abs(previous - before)
+    returns = np.where(np.isnan(market), 0.0, market * previous) - cost * turnover
+    return Simulation(
+        index=index[start + 1:],
+        symbols=symbols,
+        returns=returns,
+        market_returns=market,
+        exposure=previous,
+        turnover=turnover,
+    )
+
+
+@dataclass
+class Accumulation:
+    """Units bought per bar and the resulting holdings, one column per symbol."""
+    index: pd.DatetimeIndex
+    symbols: pd.Index
+    units: np.ndarray
+    prices: np.ndarray
+    fees: np.ndarray
+
+    @property
+    def held(self) -> np.ndarray:
+        return np.cumsum(self.units, axis=0)
+
+    @property
+    def invested(self) -> np.ndarray:
+        """Cumulative cash put in, fees included."""
+        return np.cumsum(np.nan_to_num(self.units * self.prices) + self.fees, axis=0)
+
+    @property
+    def value(self) -> np.ndarray:
+        return self.held * self.prices
+
+    @property
+    def multiple(self) -> np.ndarray:
+        """Value / cash invested (NaN before the first buy)."""
+        invested = self.invested
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(invested > 0, self.value / invested, np.nan)
+
+    @property
+    def returns(self) -> np.ndarray:
+        """Time-weighted return per bar: units bought at a bar's close earn nothing that bar."""
+        value = self.value
+        previous = np.vstack([np.full((1,) + value.shape[1:], np.nan), value[:-1]])
+        with np.errstate(divide="ignore", invalid="ignore"):
+            start = np.nan_to_num(previous) + np.nan_to_num(self.units * self.prices)
+            return np.where(start > 0, value / start - 1.0, np.nan)
+
+    def frame(self, name: str = "value") -> pd.DataFrame:
+        return pd.DataFrame(getattr(self, name), index=self.index, columns=self.symbols)
+
+    def summary(self, periods: Optional[float] = None) -> pd.DataFrame:
+        """
+        Final holdings, cash in, value and multiple per symbol; CAGR over
+        calendar years. Sharpe uses the bar returns, annualized with
+        `periods` bars a year (inferred from the dates by default).
+        """
+        multiple = self.multiple
+        invested = self.invested
+        first = np.argmax(invested > 0, axis=0)
+        years = np.array([years_between(self.index[i:]) for i in first])
+        table = pd.DataFrame({
+            "units": _final(self.held),
+            "invested": _final(invested),
+            "value": _final(self.value),
+            "multiple": _final(multiple),
+            "cagr": cagr(multiple, years=years),
+            "max_drawdown": max_drawdown(multiple),
+            "sharpe": sharpe_ratio(self.returns, periods or periods_per_year(self.index)),
+        }, index=self.symbols)
+        return table[ACCUMULATION_COLUMNS]
+
+
+def accumulate(prices: pd.DataFrame, units: pd.DataFrame, fee: float = 0.0) -> Accumulation:
+    """Buy `units` per bar at that bar's price; `fee` is charged per buy."""
+    bought = np.nan_to_num(units.reindex_like(prices).to_numpy(dtype=np.float64))
+    close = prices.to_numpy(dtype=np.float64)
+    bought = np.where(np.isnan(close), 0.0, bought)
+    return Accumulation(prices.index, prices.columns, bought, close, fee * (bought != 0))
+
+
+def schedule(index: pd.DatetimeIndex, freq: Optional[str] = None, at: str = "first",
+             start: Optional[object] = None) -> np.ndarray:
+    """
+    Boolean mask of buy dates: every row without `freq`, otherwise the first
+    (or ``at="last"``) row of each `freq` period (``"MS"``, ``"ME"``, ``"84B"``),
+    from `start` on.
+    """
+    mask = np.ones(len(index), dtype=bool)
+    if freq is not None:
+        rows = pd.Series(np.arange(len(index)), index=index).resample(freq)
+        picked = (rows.first() if at == "first" else rows.last()).dropna().astype(np.int64)
+        mask = np.zeros(len(index), dtype=bool)
+        mask[picked.to_numpy()] = True
+    if start is not None:
+        mask &= index >= pd.Timestamp(start)
+    return mask
+
+
+def entry_units(prices: pd.DataFrame, entries: pd.DataFrame, amount: Optional[float] = None) -> pd.DataFrame:
+    """Units per entry: one share each, or `amount` dollars' worth at that bar's price."""
+    flags = entries.reindex_like(prices).fillna(0).to_numpy(dtype=np.float64)
+    if amount is None:
+        return pd.DataFrame(flags, index=prices.index, columns=prices.columns)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        units = np.where(flags != 0, amount / prices.to_numpy(dtype=np.float64), 0.0)
+    return pd.DataFrame(np.nan_to_num(units), index=prices.index, columns=prices.columns)
+
+
+def dca(prices: pd.DataFrame, freq: Optional[str] = None, shares: float = 1.0, amount: Optional[float] = None,
+        at: str = "first", start: Optional[object] = None, fee: float = 0.0) -> Accumulation:
+    """
+    Dollar-cost averaging benchmark: buy `shares` (or `amount` dollars) of
+    every symbol on each scheduled date, e.g. ``freq="MS"`` for the first
+    trading day of each month or no `freq` for every bar.
+    """
+    mask = schedule(prices.index, freq, at, start)
+    entries = pd.DataFrame(np.repeat(mask[:, None] * shares, prices.shape[1], axis=1),
+                           index=prices.index, columns=prices.columns)
+    units = entry_units(prices, entries != 0, amount) if amount is not None else entries
+    return accumulate(prices, units, fee)
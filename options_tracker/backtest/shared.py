@@ -0,0 +1,45 @@
+"""
+Read-only NumPy arrays shared with process-pool workers.
+
+The parent copies an array into a shared-memory block once and hands the
+workers a small (name, shape, dtype) handle instead of pickling the data
+into every task. Workers attach on first use and keep the view for the
+rest of their life. Run in-process, the handle is just the array itself.
+"""
+from multiprocessing import shared_memory
+from typing import Dict, Tuple, Union
+
+import numpy as np
+
+Handle = Union[np.ndarray, Tuple[str, Tuple[int, ...], str]]
+
+# Worker-side views, by segment name
+_SEGMENTS: Dict[str, Tuple[shared_memory.SharedMemory, np.ndarray]] = {}
+
+
+class SharedArray:
+    """Context manager owning one shared copy of `array`; `handle` goes to the workers."""
+
+    def __init__(self, array: np.ndarray) -> None:
+        array = np.ascontiguousarray(array)
+        self.segment = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        np.ndarray(array.shape, dtype=array.dtype, buffer=self.segment.buf)[...] = array
+        self.handle: Handle = (self.segment.name, array.shape, array.dtype.str)
+
+    def __enter__(self) -> "SharedArray":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.segment.close()
+        self.segment.unlink()
+
+
+def view(handle: Handle) -> np.ndarray:
+    """The array behind a handle (attaching to the block in a worker)."""
+    if isinstance(handle, np.ndarray):
+        return handle
+    name, shape, dtype = handle
+    if name not in _SEGMENTS:
+        segment = shared_memory.SharedMemory(name=name)
+        _SEGMENTS[name] = (segment, np.ndarray(shape, dtype=np.dtype(dtype), buffer=segment.buf))
+    return _SEGMENTS[name][1]
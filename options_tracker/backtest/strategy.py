@@ -0,0 +1,122 @@
+"""
+Strategy interface: prices in, signals out; signals in, positions out.
+
+Strategies work on a wide price frame (dates x symbols) and return wide
+frames, so one call covers every symbol in the universe. The two notebook
+strategies from day-2-backtesting.ipynb are provided.
+"""
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from backtest.indicators import ewm_mean, resample_ohlc, rolling_means
+
+ENTRY_MODES = ("edge", "every", "first")
+
+
+def crossover_signals(fast: np.ndarray, slow: np.ndarray) -> np.ndarray:
+    """+1 while `fast` is above `slow`, -1 otherwise, 0 until both are defined."""
+    # Comparisons with NaN are False both ways, which leaves 0
+    return (fast > slow).astype(np.int8) - (fast <= slow).astype(np.int8)
+
+
+class Strategy(ABC):
+    """
+    Base class. `signals` maps prices to +1 / -1 / 0 per date and symbol;
+    `positions` maps signals to the exposure (or units) held. `prices` is what
+    the simulator should trade at, on the dates of the signals. Strategies
+    that `accumulate` buy units on entry signals instead of holding an
+    exposure.
+    """
+    accumulates = False
+
+    @abstractmethod
+    def signals(self, prices: pd.DataFrame) -> pd.DataFrame:
+        """+1 / -1 / 0 per date and symbol of `prices`."""
+
+    def positions(self, signals: pd.DataFrame) -> pd.DataFrame:
+        # Long on a buy signal, flat otherwise (the notebook's Position column)
+        return (signals == 1).astype(np.float64)
+
+    def prices(self, prices: pd.DataFrame, signals: pd.DataFrame) -> pd.DataFrame:
+        return prices.reindex(index=signals.index, columns=signals.columns)
+
+    def warmup(self) -> int:
+        """Leading rows without a valid signal."""
+        return 0
+
+
+@dataclass
+class MACrossover(Strategy):
+    """Long while the fast moving average is above the slow one."""
+    fast: int = 20
+    slow: int = 50
+
+    def signals(self, prices: pd.DataFrame) -> pd.DataFrame:
+        means = rolling_means(prices.to_numpy(dtype=np.float64), (self.fast, self.slow))
+        signal = crossover_signals(means[self.fast], means[self.slow])
+        return pd.DataFrame(signal, index=prices.index, columns=prices.columns)
+
+    def warmup(self) -> int:
+        return max(self.fast, self.slow) - 1
+
+
+@dataclass
+class EMAWick(Strategy):
+    """
+    Buy when the low wick of a `bar`-long candle of symbol / `benchmark`
+    touches the `span` EMA of the candle closes. `entry` picks which touches
+    buy: ``edge`` (first bar of each run of touches), ``every`` touching bar,
+    or only the ``first`` touch. Positions are units held (one unit per
+    entry), for ``portfolio.accumulate``.
+    """
+    benchmark: str = "QQQ"
+    span: int = 20
+    bar: str = "84B"
+    entry: str = "edge"
+    tolerance: Optional[float] = None
+    accumulates = True
+
+    def __post_init__(self):
+        if self.entry not in ENTRY_MODES:
+            raise ValueError(f"entry must be one of {ENTRY_MODES}")
+
+    def candles(self, prices: pd.DataFrame) -> dict:
+        """Ratio candles (open/high/low/close), one frame each."""
+        symbols = prices.columns.drop(self.benchmark)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            ratio = prices[symbols].to_numpy(dtype=np.float64) / prices[[self.benchmark]].to_numpy(dtype=np.float64)
+        labels, candles = resample_ohlc(ratio, prices.index, self.bar)
+        # Bins where no symbol has a ratio yet have no candle
+        keep = ~np.isnan(candles["close"]).all(axis=1)
+        return {name: pd.DataFrame(array[keep], index=labels[keep], columns=symbols) for name, array in candles.items()}
+
+    def entries(self, low: np.ndarray, ema: np.ndarray) -> np.ndarray:
+        """1 on the bars that buy, from candle lows and the close EMA."""
+        if self.tolerance is None:
+            touch = low <= ema
+        else:
+            touch = np.abs(low - ema) <= ema * self.tolerance
+        if self.entry == "edge":
+            previous = np.vstack([np.zeros((1, touch.shape[1]), dtype=bool), touch[:-1]])
+            touch = touch & ~previous
+        elif self.entry == "first":
+            touch = touch & (np.cumsum(touch, axis=0) == 1)
+        return touch.astype(np.int64)
+
+    def signals(self, prices: pd.DataFrame) -> pd.DataFrame:
+        candles = self.candles(prices)
+        low = candles["low"]
+        ema = ewm_mean(candles["close"].to_numpy(), self.span)
+        return pd.DataFrame(self.entries(low.to_numpy(), ema), index=low.index, columns=low.columns)
+
+    def positions(self, signals: pd.DataFrame) -> pd.DataFrame:
+        return signals.cumsum().astype(np.float64)
+
+    def prices(self, prices: pd.DataFrame, signals: pd.DataFrame) -> pd.DataFrame:
+        # Bar closes of the traded symbols, labelled like the candles
+        labels, candles = resample_ohlc(prices[signals.columns].to_numpy(dtype=np.float64), prices.index, self.bar)
+        return pd.DataFrame(candles["close"], index=labels, columns=signals.columns).reindex(signals.index)
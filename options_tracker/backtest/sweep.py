@@ -0,0 +1,202 @@
+"""
+Parameter sweeps over a symbol universe.
+
+The universe is cut into column chunks and every chunk runs the whole
+parameter grid, so each rolling mean (one per distinct window), each set of
+ratio candles (one per bar length) and each EMA (one per span and bar
+length) is computed once per chunk and shared by all grid points that use
+it. Chunks run on a process pool that reads the prices from one
+shared-memory block instead of pickling them to every worker.
+
+With a `checkpoint` directory every finished chunk is saved as it
+completes; rerunning the same sweep loads those and only runs what is
+missing, so an interrupted sweep resumes where it stopped.
+"""
+import hashlib
+import itertools
+import os
+import pickle
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from backtest.indicators import ewm_mean, rolling_means
+from backtest.portfolio import accumulate, entry_units, simulate_arrays
+from backtest.shared import SharedArray, view
+from backtest.strategy import EMAWick, crossover_signals
+
+# Symbols per task; small enough to spread a universe over the pool and to
+# lose little work on interruption
+CHUNK_SYMBOLS = 256
+
+RANK_COLUMNS = ["cagr", "sharpe", "max_drawdown"]
+
+
+def ma_grid(fast: Sequence[int], slow: Sequence[int]) -> List[Dict[str, int]]:
+    """Every (fast, slow) pair with fast < slow."""
+    return [{"fast": f, "slow": s} for f, s in itertools.product(fast, slow) if f < s]
+
+
+def ema_grid(spans: Sequence[int], bars: Sequence[str]) -> List[Dict[str, object]]:
+    return [{"bar": b, "span": s} for b, s in itertools.product(bars, spans)]
+
+
+def _ma_chunk(source, index: pd.DatetimeIndex, symbols: pd.Index, columns: np.ndarray,
+              grid: List[Dict[str, int]], cost: float) -> pd.DataFrame:
+    close = view(source)[:, columns]
+    windows = {w for point in grid for w in (point["fast"], point["slow"])}
+    means = rolling_means(close, windows)
+    frames = []
+    for point in grid:
+        held = (crossover_signals(means[point["fast"]], means[point["slow"]]) == 1).astype(np.float64)
+        sim = simulate_arrays(close, held, index, symbols, cost, start=max(point["fast"], point["slow"]) - 1)
+        frames.append(sim.summary().assign(**point))
+    return pd.concat(frames).rename_axis("symbol").reset_index()
+
+
+def _ema_chunk(source, index: pd.DatetimeIndex, symbols: pd.Index, columns: np.ndarray,
+               grid: List[Dict[str, object]], benchmark: str, entry: str, amount: Optional[float],
+               fee: float) -> pd.DataFrame:
+    prices = pd.DataFrame(view(source)[:, columns], index=index, columns=symbols)
+    frames = []
+    for bar, points in itertools.groupby(grid, key=lambda point: point["bar"]):
+        base = EMAWick(benchmark=benchmark, bar=bar, entry=entry)
+        candles = base.candles(prices)
+        low = candles["low"]
+        traded = base.prices(prices, low)
+        close = candles["close"].to_numpy()
+        emas: Dict[int, np.ndarray] = {}
+        for point in points:
+            if point["span"] not in emas:
+                emas[point["span"]] = ewm_mean(close, point["span"])
+            entries = pd.DataFrame(base.entries(low.to_numpy(), emas[point["span"]]),
+                                   index=low.index, columns=low.columns)
+            acc = accumulate(traded, entry_units(traded, entries, amount), fee)
+            frames.append(acc.summary().assign(**point))
+    return pd.concat(frames).rename_axis("symbol").reset_index()
+
+
+def _task_key(kind: str, close: np.ndarray, index: pd.DatetimeIndex, symbols: pd.Index, settings: tuple) -> str:
+    """Checkpoint name: the task's settings plus a hash of its prices, so new data reruns it."""
+    digest = hashlib.sha1(repr((kind, list(symbols), settings)).encode())
+    digest.update(index.asi8.tobytes())
+    digest.update(np.ascontiguousarray(close).tobytes())
+    return f"{kind}-{digest.hexdigest()[:20]}.pkl"
+
+
+def _load_part(path: str) -> Optional[pd.DataFrame]:
+    try:
+        with open(path, "rb") as f:
+            return pickle.load(f)
+    except (OSError, EOFError, pickle.UnpicklingError):
+        return None
+
+
+def _save_part(path: str, part: pd.DataFrame) -> None:
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        pickle.dump(part, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, path)
+
+
+def _run(kind: str, func, prices: pd.DataFrame, chunks: List[np.ndarray], args: tuple,
+         max_workers: Optional[int], checkpoint: Optional[str]) -> pd.DataFrame:
+    close = np.ascontiguousarray(prices.to_numpy(dtype=np.float64))
+    parts: List[Optional[pd.DataFrame]] = [None] * len(chunks)
+    pending = []
+    for position, columns in enumerate(chunks):
+        symbols = prices.columns[columns]
+        path = None
+        if checkpoint:
+            path = os.path.join(checkpoint, _task_key(kind, close[:, columns], prices.index, symbols, args))
+            done = _load_part(path)
+            if done is not None:
+                parts[position] = done
+                continue
+        pending.append((position, columns, symbols, path))
+
+    def finish(position: int, part: pd.DataFrame, path: Optional[str]) -> None:
+        if path:
+            _save_part(path, part)
+        parts[position] = part
+
+    if checkpoint:
+        os.makedirs(checkpoint, exist_ok=True)
+    workers = max_workers if max_workers is not None else min(len(pending), os.cpu_count() or 1)
+    if len(pending) <= 1 or workers <= 1:
+        for position, columns, symbols, path in pending:
+            finish(position, func(close, prices.index, symbols, columns, *args), path)
+    else:
+        with SharedArray(close) as shared, ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(func, shared.handle, prices.index, symbols, columns, *args): (position, path)
+                       for position, columns, symbols, path in pending}
+            # Checkpoint each chunk as soon as it lands
+            for future in as_completed(futures):
+                position, path = futures[future]
+                finish(position, future.result(), path)
+    if not parts:
+        return pd.DataFrame()
+    return pd.concat(parts, ignore_index=True)
+
+
+def _chunks(columns: np.ndarray, size: int) -> List[np.ndarray]:
+    return [columns[i:i + size] for i in range(0, len(columns), max(1, size))]
+
+
+def ma_sweep(
+    prices: pd.DataFrame,
+    fast: Sequence[int] = (10, 20, 30),
+    slow: Sequence[int] = (50, 100, 200),
+    cost: float = 0.0,
+    max_workers: Optional[int] = None,
+    checkpoint: Optional[str] = None,
+    chunk: int = CHUNK_SYMBOLS,
+) -> pd.DataFrame:
+    """
+    MA-crossover statistics for every (fast, slow) pair and symbol, one row
+    each with the ``Simulation.summary`` columns. Rank with `rank`.
+    """
+    grid = ma_grid(fast, slow)
+    chunks = _chunks(np.arange(prices.shape[1]), chunk)
+    return _run("ma", _ma_chunk, prices, chunks, (grid, cost), max_workers, checkpoint)
+
+
+def ema_wick_sweep(
+    prices: pd.DataFrame,
+    spans: Sequence[int] = (10, 20, 30),
+    bars: Sequence[str] = ("63B", "84B", "126B"),
+    benchmark: str = "QQQ",
+    entry: str = "edge",
+    amount: Optional[float] = None,
+    fee: float = 0.0,
+    max_workers: Optional[int] = None,
+    checkpoint: Optional[str] = None,
+    chunk: int = CHUNK_SYMBOLS,
+) -> pd.DataFrame:
+    """
+    EMA-wick statistics for every (bar length, EMA span) and symbol against
+    `benchmark`, one row each with the ``Accumulation.summary`` columns.
+    """
+    grid = ema_grid(spans, bars)
+    bench = prices.columns.get_loc(benchmark)
+    others = np.array([i for i in range(prices.shape[1]) if i != bench], dtype=np.int64)
+    chunks = [np.append(part, bench) for part in _chunks(others, chunk)]
+    return _run("ema", _ema_chunk, prices, chunks, (grid, benchmark, entry, amount, fee), max_workers, checkpoint)
+
+
+def rank(results: pd.DataFrame, by: str = "sharpe", params: Optional[Sequence[str]] = None,
+         agg: str = "median") -> pd.DataFrame:
+    """
+    One row per parameter combination: CAGR, Sharpe and max drawdown
+    aggregated across symbols (`agg`), best `by` first.
+    """
+    if params is None:
+        params = [col for col in ("fast", "slow", "bar", "span") if col in results.columns]
+    table = results.groupby(list(params))[RANK_COLUMNS].agg(agg)
+    table["symbols"] = results.groupby(list(params))["symbol"].nunique()
+    # Drawdowns are negative, so larger is better for every ranking column
+    table = table.sort_values(by, ascending=False, na_position="last").reset_index()
+    table.insert(0, "rank", np.arange(1, len(table) + 1))
+    return table
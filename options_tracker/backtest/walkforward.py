@@ -0,0 +1,261 @@
+"""
+Walk-forward evaluation: pick parameters on a train window, score the pick
+on the following test window, roll forward and stitch the test windows into
+one out-of-sample equity curve.
+
+Candidate returns are computed once over the whole history. The indicators
+are causal, so their value on a date does not depend on later data, and
+candidates share rolling means. Prefix sums of those returns (count, sum,
+sum of squares, log growth) then give any window's mean, Sharpe, total
+return and CAGR for every candidate and symbol in O(1), so the statistics
+of each rolling window are never recomputed from scratch. Folds only read
+these arrays; they run in parallel on a process pool that shares them.
+"""
+import dataclasses
+import os
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from backtest.indicators import rolling_means
+from backtest.shared import SharedArray, view
+from backtest.strategy import MACrossover, Strategy, crossover_signals
+from backtest.sweep import ma_grid
+from metrics import TRADING_DAYS, cagr, max_drawdown, sharpe_ratio, total_return
+
+OBJECTIVES = ("sharpe", "cagr", "total_return")
+# Cells per (candidate x date x symbol) array; larger universes run in symbol chunks
+MAX_CHUNK_CELLS = 10_000_000
+# Returns below this are clipped before taking logs (a total loss)
+MIN_GROWTH = 1e-12
+
+FOLD_COLUMNS = [
+    "fold", "symbol", "train_start", "train_end", "test_start", "test_end", "candidate",
+    "train_score", "total_return", "cagr", "sharpe", "max_drawdown",
+]
+SUMMARY_COLUMNS = ["total_return", "cagr", "sharpe", "max_drawdown"]
+
+
+@dataclass
+class Fold:
+    """Row bounds of one train / test split (end exclusive)."""
+    train_start: int
+    train_end: int
+    test_start: int
+    test_end: int
+
+
+def make_folds(rows: int, train: int, test: int, step: Optional[int] = None, anchored: bool = False) -> List[Fold]:
+    """
+    Rolling (or, `anchored`, expanding) train windows of `train` rows, each
+    followed by a test window of up to `test` rows; windows advance by
+    `step` (default `test`, so the test windows tile the history).
+    """
+    step = step or test
+    folds = []
+    start = 0
+    while start + train < rows:
+        train_end = start + train
+        folds.append(Fold(0 if anchored else start, train_end, train_end, min(train_end + test, rows)))
+        start += step
+    return folds
+
+
+@dataclass
+class RollingStats:
+    """Prefix sums over the date axis of (candidate x date x symbol) returns."""
+    count: np.ndarray
+    total: np.ndarray
+    squares: np.ndarray
+    log_growth: np.ndarray
+
+    @classmethod
+    def from_returns(cls, returns: np.ndarray) -> "RollingStats":
+        valid = ~np.isnan(returns)
+        filled = np.where(valid, returns, 0.0)
+        growth = np.log(np.maximum(1.0 + filled, MIN_GROWTH))
+
+        def prefix(values: np.ndarray) -> np.ndarray:
+            out = np.zeros((values.shape[0], values.shape[1] + 1) + values.shape[2:])
+            np.cumsum(values, axis=1, out=out[:, 1:])
+            return out
+
+        return cls(prefix(valid.astype(np.float64)), prefix(filled), prefix(filled * filled), prefix(growth))
+
+    def window(self, start: int, end: int, periods: int = TRADING_DAYS) -> Dict[str, np.ndarray]:
+        """Statistics of rows [start, end) per candidate and symbol, in O(1) each."""
+        n = self.count[:, end] - self.count[:, start]
+        total = self.total[:, end] - self.total[:, start]
+        squares = self.squares[:, end] - self.squares[:, start]
+        growth = self.log_growth[:, end] - self.log_growth[:, start]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            mean = total / n
+            std = np.sqrt(np.maximum(squares - n * mean * mean, 0.0) / (n - 1))
+            sharpe = np.where((n > 1) & (std > 0), (mean * periods) / (std * np.sqrt(periods)), np.nan)
+            annual = np.where(n > 0, np.expm1(growth * periods / n), np.nan)
+        return {
+            "sharpe": sharpe,
+            "cagr": annual,
+            "total_return": np.where(n > 0, np.expm1(growth), np.nan),
+        }
+
+
+def candidate_returns(prices: pd.DataFrame, candidates: Sequence[Strategy], cost: float = 0.0) -> np.ndarray:
+    """
+    Per-period returns of every candidate, shape (candidate, date, symbol):
+    row t earns the close-to-close return times the position held at t-1,
+    less `cost` per unit of position change, as in ``portfolio.simulate``.
+    Rows inside a candidate's warm-up, and dates without prices, are NaN.
+    """
+    close = prices.to_numpy(dtype=np.float64)
+    market = np.full(close.shape, np.nan)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        market[1:] = close[1:] / close[:-1] - 1.0
+    windows = {w for c in candidates if isinstance(c, MACrossover) for w in (c.fast, c.slow)}
+    means = rolling_means(close, windows)
+    out = np.full((len(candidates),) + close.shape, np.nan)
+    for i, strategy in enumerate(candidates):
+        if strategy.accumulates:
+            raise ValueError(f"Walk-forward needs exposure strategies, not {type(strategy).__name__}")
+        if isinstance(strategy, MACrossover):
+            held = (crossover_signals(means[strategy.fast], means[strategy.slow]) == 1).astype(np.float64)
+        else:
+            positions = strategy.positions(strategy.signals(prices)).reindex_like(prices)
+            held = np.nan_to_num(positions.to_numpy(dtype=np.float64))
+        previous = np.vstack([np.zeros((1, close.shape[1])), held[:-1]])
+        before = np.vstack([np.zeros((2, close.shape[1])), held[:-2]])[:len(held)]
+        returns = market * previous - cost * np.abs(previous - before)
+        returns[:strategy.warmup() + 1] = np.nan
+        out[i] = returns
+    return out
+
+
+def _run_fold(handles: Dict[str, tuple], fold: Fold, objective: str, periods: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Best candidate per symbol on the train rows, its train score and its test-row returns."""
+    stats = RollingStats(**{name: view(handle) for name, handle in handles.items() if name != "returns"})
+    returns = view(handles["returns"])
+    score = stats.window(fold.train_start, fold.train_end, periods)[objective]
+    scored = ~np.isnan(score).all(axis=0)
+    best = np.where(scored, np.argmax(np.where(np.isnan(score), -np.inf, score), axis=0), -1)
+    symbols = np.arange(returns.shape[2])
+    test = returns[np.maximum(best, 0), fold.test_start:fold.test_end, symbols].T
+    # No candidate could be scored: stay in cash (NaN while unlisted)
+    test = np.where(scored | np.isnan(test), test, 0.0)
+    return best, np.where(scored, score[np.maximum(best, 0), symbols], np.nan), test
+
+
+def _growth(returns: np.ndarray) -> np.ndarray:
+    return np.cumprod(1.0 + np.nan_to_num(returns), axis=0)
+
+
+@dataclass
+class WalkForward:
+    """Per-fold picks and test metrics, and the stitched out-of-sample returns."""
+    folds: pd.DataFrame
+    returns: pd.DataFrame
+    candidates: pd.DataFrame
+    periods: int = TRADING_DAYS
+
+    @property
+    def equity(self) -> pd.DataFrame:
+        """Growth of $1 over the stitched test windows."""
+        return pd.DataFrame(_growth(self.returns.to_numpy()), index=self.returns.index, columns=self.returns.columns)
+
+    def summary(self) -> pd.DataFrame:
+        """Out-of-sample statistics per symbol."""
+        returns = self.returns.to_numpy()
+        equity = np.where(np.isnan(returns), np.nan, _growth(returns))
+        return pd.DataFrame({
+            "total_return": total_return(equity),
+            "cagr": cagr(equity, periods=self.periods),
+            "sharpe": sharpe_ratio(returns, self.periods),
+            "max_drawdown": max_drawdown(equity),
+        }, index=self.returns.columns)[SUMMARY_COLUMNS]
+
+
+def _candidate_table(candidates: Sequence[Strategy]) -> pd.DataFrame:
+    rows = [dataclasses.asdict(c) if dataclasses.is_dataclass(c) else {} for c in candidates]
+    table = pd.DataFrame(rows, index=pd.RangeIndex(len(candidates), name="candidate"))
+    table.insert(0, "strategy", [type(c).__name__ for c in candidates])
+    return table
+
+
+def walk_forward(
+    prices: pd.DataFrame,
+    candidates: Optional[Sequence[Strategy]] = None,
+    train: int = 3 * TRADING_DAYS,
+    test: int = TRADING_DAYS // 2,
+    step: Optional[int] = None,
+    anchored: bool = False,
+    objective: str = "sharpe",
+    cost: float = 0.0,
+    periods: int = TRADING_DAYS,
+    max_workers: Optional[int] = None,
+) -> WalkForward:
+    """
+    Walk-forward test of `candidates` (default: MA crossovers over fast
+    10/20/30 x slow 50/100/200) on every symbol of `prices`. Each fold picks,
+    per symbol, the candidate with the best `objective` on its `train` rows
+    and records that candidate's returns on the next `test` rows. Windows
+    are in rows (bars).
+    """
+    if objective not in OBJECTIVES:
+        raise ValueError(f"objective must be one of {OBJECTIVES}")
+    if candidates is None:
+        candidates = [MACrossover(**point) for point in ma_grid((10, 20, 30), (50, 100, 200))]
+    candidates = list(candidates)
+    folds = make_folds(len(prices), train, test, step, anchored)
+    if not folds:
+        raise ValueError(f"Need more than {train} rows for a train window of {train}")
+    # Each fold's stitched slice runs until the next fold's test window starts
+    stitch_end = [min(f.test_end, nxt.test_start) for f, nxt in zip(folds, folds[1:])] + [folds[-1].test_end]
+
+    chunk = max(1, MAX_CHUNK_CELLS // (len(candidates) * len(prices)))
+    workers = max_workers if max_workers is not None else min(len(folds), os.cpu_count() or 1)
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 and len(folds) > 1 else None
+    records, stitched = [], []
+    try:
+        for lo in range(0, prices.shape[1], chunk):
+            part = prices.iloc[:, lo:lo + chunk]
+            returns = candidate_returns(part, candidates, cost)
+            arrays = {"returns": returns, **dataclasses.asdict(RollingStats.from_returns(returns))}
+            if pool is None:
+                outcomes = [_run_fold(arrays, fold, objective, periods) for fold in folds]
+            else:
+                with ExitStack() as stack:
+                    handles = {name: stack.enter_context(SharedArray(array)).handle for name, array in arrays.items()}
+                    outcomes = list(pool.map(_run_fold, [handles] * len(folds), folds,
+                                             [objective] * len(folds), [periods] * len(folds)))
+            chunk_returns = []
+            for k, (fold, (best, score, test_returns)) in enumerate(zip(folds, outcomes)):
+                equity = np.where(np.isnan(test_returns), np.nan, _growth(test_returns))
+                records.append(pd.DataFrame({
+                    "fold": k,
+                    "symbol": part.columns,
+                    "train_start": prices.index[fold.train_start],
+                    "train_end": prices.index[fold.train_end - 1],
+                    "test_start": prices.index[fold.test_start],
+                    "test_end": prices.index[fold.test_end - 1],
+                    "candidate": best,
+                    "train_score": score,
+                    "total_return": total_return(equity),
+                    "cagr": cagr(equity, periods=periods),
+                    "sharpe": sharpe_ratio(test_returns, periods),
+                    "max_drawdown": max_drawdown(equity),
+                }))
+                chunk_returns.append(test_returns[:stitch_end[k] - fold.test_start])
+            stitched.append(np.vstack(chunk_returns))
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    test_rows = np.concatenate([np.arange(f.test_start, end) for f, end in zip(folds, stitch_end)])
+    oos = pd.DataFrame(np.hstack(stitched), index=prices.index[test_rows], columns=prices.columns)
+    table = _candidate_table(candidates)
+    fold_table = pd.concat(records, ignore_index=True)[FOLD_COLUMNS]
+    fold_table = fold_table.join(table, on="candidate")
+    return WalkForward(fold_table, oos, table, periods)
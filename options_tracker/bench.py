@@ -0,0 +1,511 @@
+"""
+Benchmarks for the options tracker hot paths.
+
+Usage:
+    python bench.py --rows 1000000
+    python bench.py --rows 0 --pricing-legs 100000
+    python bench.py --rows 0 --signal-symbols 3000 --signal-years 10
+    python bench.py --rows 0 --book-symbols 3000 --signal-years 10
+    python bench.py --rows 0 --suite 1000,10000,100000 [--save-baseline] [--profile profiles/]
+"""
+import argparse
+import cProfile
+import datetime as dt
+import importlib
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from pl import OPTIONS_MULTIPLIER, OPEN_COLUMNS, Lot, RealizedEvent, OpenPosition, _leg_key, _side_for_action, compute_pl
+
+
+def make_trades(rows: int, legs: int = 500, seed: int = 0) -> pd.DataFrame:
+    """
+    Synthetic trade journal with `rows` fills spread over `legs` option legs.
+
+    Roughly half the fills open positions and half close them (often partially),
+    so the FIFO queues see realistic churn.
+    """
+    rng = np.random.default_rng(seed)
+    symbols = np.array(["AAPL", "QQQ", "SPY", "MSFT", "TSLA", "NVDA", "AMZN", "META"])
+    leg_symbol = symbols[rng.integers(0, len(symbols), legs)]
+    leg_expiry = pd.Timestamp("2024-01-19") + pd.to_timedelta(rng.integers(0, 104, legs) * 7, unit="D")
+    leg_strike = rng.integers(20, 120, legs) * 5.0
+    leg_type = np.where(rng.random(legs) < 0.5, "C", "P")
+    leg = rng.integers(0, legs, rows)
+    short = rng.random(rows) < 0.4
+    opening = rng.random(rows) < 0.55
+    action = np.where(opening, np.where(short, "STO", "BTO"), np.where(short, "BTC", "STC"))
+    return pd.DataFrame({
+        "id": pd.array(np.arange(1, rows + 1), dtype="Int64"),
+        "group_id": pd.array(rng.integers(1, max(2, rows // 20), rows), dtype="Int64"),
+        "symbol": leg_symbol[leg],
+        "expiry": leg_expiry[leg].date,
+        "strike": leg_strike[leg],
+        "option_type": leg_type[leg],
+        "action": action,
+        "quantity": pd.array(rng.integers(1, 10, rows), dtype="Int64"),
+        "price": np.round(rng.uniform(0.05, 25.0, rows), 2),
+        "fees": np.round(rng.uniform(0.0, 1.3, rows), 2),
+        "trade_datetime": pd.Timestamp("2023-01-03 09:30") + pd.to_timedelta(np.arange(rows) * 7, unit="s"),
+        "note": "",
+    })
+
+
+# Position structures for make_journal, up to four legs each: option type,
+# strike offset in strike steps and whether the leg is sold to open
+STRUCTURES = [
+    # long call, short put, call debit vertical, put credit vertical, long straddle, iron condor
+    (("C",), (0,), (False,)),
+    (("P",), (0,), (True,)),
+    (("C", "C"), (0, 2), (False, True)),
+    (("P", "P"), (0, -2), (True, False)),
+    (("C", "P"), (0, 0), (False, False)),
+    (("P", "P", "C", "C"), (-4, -2, 2, 4), (False, True, True, False)),
+]
+STRUCTURE_WEIGHTS = [0.2, 0.15, 0.2, 0.15, 0.1, 0.2]
+# How positions end: still open, closed at once, half then the rest, half only
+CLOSE_PLANS = np.array([1, 2, 3, 2])
+CLOSE_PLAN_WEIGHTS = [0.25, 0.45, 0.2, 0.1]
+
+
+def make_journal(rows: int, seed: int = 0, symbols: int = 60) -> pd.DataFrame:
+    """
+    Realistic synthetic journal of about `rows` fills: positions are single
+    legs, verticals, straddles and iron condors opened as one group, then
+    left open, closed at once, or closed half first and the rest later
+    (every leg of a group alike). Fills are in time order with increasing ids.
+    """
+    rng = np.random.default_rng(seed)
+    legs_per = np.array([len(types) for types, _, _ in STRUCTURES])
+    per_position = (legs_per @ STRUCTURE_WEIGHTS) * (CLOSE_PLANS @ CLOSE_PLAN_WEIGHTS)
+    positions = int(rows / per_position * 1.2) + 10
+
+    kind = rng.choice(len(STRUCTURES), positions, p=STRUCTURE_WEIGHTS)
+    plan = rng.choice(len(CLOSE_PLANS), positions, p=CLOSE_PLAN_WEIGHTS)
+    names = np.array([f"T{i:03d}" for i in range(symbols)])
+    symbol = names[rng.integers(0, symbols, positions)]
+    spot = rng.integers(10, 100, positions) * 5.0
+    opened = pd.Timestamp("2020-01-02 09:30") + pd.to_timedelta(np.sort(rng.uniform(0, 4 * 365, positions)), unit="D")
+    days_left = rng.integers(7, 120, positions)
+    quantity = rng.integers(1, 11, positions)
+
+    # One row per leg
+    position = np.repeat(np.arange(positions), legs_per[kind])
+    leg = np.arange(len(position)) - np.repeat(np.cumsum(legs_per[kind]) - legs_per[kind], legs_per[kind])
+    width = legs_per.max()
+    types = np.array([list(t) + [""] * (width - len(t)) for t, _, _ in STRUCTURES])
+    offsets = np.array([list(o) + [0] * (width - len(o)) for _, o, _ in STRUCTURES])
+    sold = np.array([list(w) + [False] * (width - len(w)) for _, _, w in STRUCTURES])
+    leg_kind = kind[position]
+    leg_short = sold[leg_kind, leg]
+    leg_price = np.round(rng.uniform(0.2, 12.0, len(position)), 2)
+
+    # One row per fill: the open, then one or two closes
+    events = CLOSE_PLANS[plan[position]]
+    fill_leg = np.repeat(np.arange(len(position)), events)
+    step = np.arange(len(fill_leg)) - np.repeat(np.cumsum(events) - events, events)
+    owner = position[fill_leg]
+    qty = quantity[owner]
+    half = np.maximum(1, qty // 2)
+    split = np.isin(plan[owner], (2, 3))
+    fill_qty = np.where(step == 0, qty, np.where(split, np.where(step == 1, half, qty - half), qty))
+    short = leg_short[fill_leg]
+    action = np.where(step == 0, np.where(short, "STO", "BTO"), np.where(short, "BTC", "STC"))
+    # Closes land partway to expiry, the second after the first
+    held_days = days_left[owner] * np.where(step == 0, 0.0, step * 0.4 * rng.uniform(0.5, 1.0, len(step)))
+    when = opened[owner] + pd.to_timedelta(held_days, unit="D")
+    price = leg_price[fill_leg] * np.where(step == 0, 1.0, rng.lognormal(0.0, 0.5, len(step)))
+
+    journal = pd.DataFrame({
+        "group_id": owner + 1,
+        "symbol": symbol[owner],
+        "expiry": (opened[owner].normalize() + pd.to_timedelta(days_left[owner], unit="D")).date,
+        "strike": spot[owner] + offsets[leg_kind[fill_leg], leg[fill_leg]] * 5.0,
+        "option_type": types[leg_kind[fill_leg], leg[fill_leg]],
+        "action": action,
+        "quantity": fill_qty,
+        "price": np.round(price, 2),
+        "fees": np.round(0.65 * fill_qty, 2),
+        "trade_datetime": when.floor("s"),
+        "note": "",
+    })
+    journal = journal[journal["quantity"] > 0].sort_values("trade_datetime", kind="stable").head(rows)
+    journal = journal.reset_index(drop=True)
+    journal.insert(0, "id", pd.array(np.arange(1, len(journal) + 1), dtype="Int64"))
+    journal["group_id"] = pd.array(journal["group_id"].to_numpy(), dtype="Int64")
+    journal["quantity"] = pd.array(journal["quantity"].to_numpy(), dtype="Int64")
+    return journal
+
+
+def make_open_positions(legs: int, seed: int = 0) -> pd.DataFrame:
+    """Synthetic `open_df` with `legs` distinct legs around a 100-500 spot range."""
+    rng = np.random.default_rng(seed)
+    symbols = np.array([f"SYM{i}" for i in range(max(1, legs // 200))])
+    return pd.DataFrame({
+        "symbol": symbols[rng.integers(0, len(symbols), legs)],
+        "expiry": pd.Timestamp("2024-01-19") + pd.to_timedelta(rng.integers(0, 104, legs) * 7, unit="D"),
+        "strike": rng.integers(20, 100, legs) * 5.0,
+        "option_type": np.where(rng.random(legs) < 0.5, "C", "P"),
+        "side": np.where(rng.random(legs) < 0.4, "SHORT", "LONG"),
+        "open_quantity": rng.integers(1, 20, legs),
+        "average_cost": np.round(rng.uniform(0.5, 40.0, legs), 2),
+        "total_fees": np.round(rng.uniform(0.0, 5.0, legs), 2),
+    })[OPEN_COLUMNS]
+
+
+def bench_pricing(legs: int) -> None:
+    import pricing
+
+    open_df = make_open_positions(legs)
+    spot = {symbol: 300.0 for symbol in open_df["symbol"].unique()}
+    marks = open_df[["symbol", "expiry", "strike", "option_type", "side"]].assign(mark=open_df["average_cost"])
+    elapsed = _timed(pricing.price_positions, open_df, spot, 0.04, 0.3, None, "2024-01-02")
+    print(f"greeks:     {legs:,} legs in {elapsed:.3f}s")
+    elapsed = _timed(pricing.price_positions, open_df, spot, 0.04, None, marks, "2024-01-02")
+    print(f"implied vol + greeks: {legs:,} legs in {elapsed:.3f}s")
+
+
+def make_prices(days: int, symbols: int, seed: int = 0) -> pd.DataFrame:
+    """
+    Daily closes (dates x symbols) as a random walk, plus a QQQ benchmark
+    column. A third of the symbols list partway through, so their early
+    rows are NaN.
+    """
+    rng = np.random.default_rng(seed)
+    index = pd.bdate_range("2015-01-02", periods=days)
+    closes = 100.0 * np.exp(np.cumsum(rng.normal(0.0003, 0.02, (days, symbols + 1)), axis=0))
+    listed = np.where(rng.random(symbols + 1) < 1 / 3, rng.integers(0, days, symbols + 1), 0)
+    listed[-1] = 0
+    closes[np.arange(days)[:, None] < listed] = np.nan
+    return pd.DataFrame(closes, index=index, columns=[f"S{i}" for i in range(symbols)] + ["QQQ"])
+
+
+def bench_signals(symbols: int, years: int) -> None:
+    from backtest import EMAWick, MACrossover
+    from backtest.indicators import ewm_mean
+
+    prices = make_prices(years * 252, symbols)
+    cells = f"{prices.shape[0]:,} days x {symbols:,} symbols"
+    ma = MACrossover(20, 50)
+    wick = EMAWick(benchmark="QQQ", span=20, bar="84B")
+    timings = {
+        "ma crossover": _timed(lambda: ma.positions(ma.signals(prices))),
+        "daily ema": _timed(ewm_mean, prices.to_numpy(), 20),
+        "ema-wick": _timed(lambda: wick.positions(wick.signals(prices))),
+    }
+    for name, elapsed in timings.items():
+        print(f"{name + ':':<13} {cells} in {elapsed:.3f}s")
+    print(f"{'signals:':<13} {sum(timings.values()):.3f}s total")
+
+
+def bench_book(symbols: int, years: int) -> None:
+    from backtest import Costs, MACrossover, backtest_events
+
+    prices = make_prices(years * 252, symbols)
+    costs = Costs(commission=1.0, per_share=0.005, slippage=0.0005)
+    elapsed = _timed(backtest_events, MACrossover(20, 50), prices, 10_000_000.0, costs)
+    print(f"event book:   {prices.size:,} bars in {elapsed:.3f}s ({prices.size / elapsed * 60 / 1e6:,.0f}M bars/min)")
+
+
+def reference_compute_pl(trades: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame, float]:
+    """The original row-by-row FIFO matcher, kept as the equivalence baseline."""
+    if trades.empty:
+        return compute_pl(trades)
+    trades = trades.sort_values(["trade_datetime", "id"], kind="stable").reset_index(drop=True)
+    realized_records: List[RealizedEvent] = []
+    open_lots: Dict[tuple, List[Tuple[int, Lot]]] = {}
+    for _, row in trades.iterrows():
+        key = _leg_key(row)
+        action = str(row["action"]).upper()
+        quantity = int(row["quantity"]) if pd.notna(row["quantity"]) else 0
+        price = float(row["price"]) if pd.notna(row["price"]) else 0.0
+        fees = float(row["fees"]) if pd.notna(row["fees"]) else 0.0
+        trade_id = int(row["id"]) if pd.notna(row["id"]) else -1
+        side = _side_for_action(action)
+        if action in {"BTO", "STO"}:
+            open_lots.setdefault((*key, side), []).append((trade_id, Lot(quantity=quantity, price=price, fees=fees)))
+        elif action in {"BTC", "STC"}:
+            lots = open_lots.setdefault((*key, side), [])
+            qty_to_close = quantity
+            while qty_to_close > 0 and lots:
+                open_trade_id, lot = lots[0]
+                matched_qty = min(qty_to_close, lot.quantity)
+                pl_per_contract = (price - lot.price) if side == "LONG" else (lot.price - price)
+                open_fee_alloc = lot.fees * (matched_qty / lot.quantity if lot.quantity else 1.0)
+                close_fee_alloc = fees * (matched_qty / quantity if quantity else 1.0)
+                realized_amount = (pl_per_contract * matched_qty * OPTIONS_MULTIPLIER) - open_fee_alloc - close_fee_alloc
+                realized_records.append(RealizedEvent(
+                    symbol=key[0], expiry=pd.to_datetime(key[1]), strike=key[2], option_type=key[3], side=side,
+                    quantity=matched_qty, realized_pl=realized_amount, open_price=lot.price, close_price=price,
+                    open_fees=open_fee_alloc, close_fees=close_fee_alloc, open_ids=[open_trade_id], close_id=trade_id,
+                ))
+                lot.quantity -= matched_qty
+                qty_to_close -= matched_qty
+                if lot.quantity == 0:
+                    lots.pop(0)
+    realized_df = pd.DataFrame([r.__dict__ for r in realized_records])
+    total_realized = float(realized_df["realized_pl"].sum()) if not realized_df.empty else 0.0
+    open_rows = []
+    for (symbol, expiry, strike, option_type, side), lots in open_lots.items():
+        total_qty = sum(lot.quantity for _, lot in lots)
+        if not lots or total_qty == 0:
+            continue
+        open_rows.append(OpenPosition(
+            symbol=symbol, expiry=pd.to_datetime(expiry), strike=float(strike), option_type=str(option_type), side=side,
+            open_quantity=int(total_qty), average_cost=float(sum(lot.quantity * lot.price for _, lot in lots) / total_qty),
+            total_fees=float(sum(lot.fees for _, lot in lots)),
+        ))
+    return realized_df, pd.DataFrame([o.__dict__ for o in open_rows]), total_realized
+
+
+def _timed(fn, *args) -> float:
+    start = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - start
+
+
+# compute_pl must beat the row-by-row reference by this factor (rows/s vs rows/s)
+MIN_SPEEDUP = 20.0
+
+
+SUITE_ROWS = (1_000, 10_000, 100_000)
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_baseline.json")
+# Slower than the baseline by more than this fraction (and by more than
+# MIN_REGRESSION_SECONDS, so timer noise on tiny cases is ignored) counts as a regression
+REGRESSION_TOLERANCE = 0.25
+MIN_REGRESSION_SECONDS = 0.01
+PROFILERS = ("cprofile", "pyinstrument")
+
+
+@dataclass
+class Case:
+    """One timed call: `run(setup())`, where `setup` is untimed and runs before every call."""
+    function: str
+    rows: int
+    run: Callable[[Any], Any]
+    setup: Callable[[], Any] = lambda: None
+
+    @property
+    def key(self) -> str:
+        return f"{self.function}@{self.rows}"
+
+
+def _storage_in(directory: str, backend: str):
+    """`storage` reloaded to keep its files under `directory` with `backend`."""
+    os.environ["OPTIONS_TRADES_CSV"] = os.path.join(directory, "trades.csv")
+    os.environ["OPTIONS_TRADES_BACKEND"] = backend
+    for name in ("OPTIONS_PL_STATE", "OPTIONS_EQUITY_CURVE", "OPTIONS_TRADES_LOG",
+                 "OPTIONS_TRADES_COLUMNAR", "OPTIONS_TRADES_SQLITE"):
+        os.environ.pop(name, None)
+    import storage
+    return importlib.reload(storage)
+
+
+def suite_cases(storage, journal: pd.DataFrame) -> List[Case]:
+    """The hot paths of the app over `journal`, which `storage` already holds."""
+    from pl import compute_pl_result, compute_unrealized, summarize_by_group
+
+    rows = len(journal)
+    result = compute_pl_result(journal)
+    open_df = result.open_positions
+    marks = open_df[["symbol", "expiry", "strike", "option_type"]].assign(mark=open_df["average_cost"] * 1.1)
+    raw = storage._csv_text(journal)
+    new_trade = journal.iloc[-1].to_dict()
+    new_trade.update(id=None, action="BTO", trade_datetime=journal["trade_datetime"].iloc[-1] + pd.Timedelta(seconds=1))
+    return [
+        Case("load_trades", rows, lambda _: storage.load_trades(), setup=storage._cache_invalidate),
+        Case("_coerce_types", rows, storage._coerce_types, setup=raw.copy),
+        Case("upsert_trade", rows, lambda row: storage.upsert_trade(row), setup=new_trade.copy),
+        Case("compute_pl", rows, lambda _: compute_pl_result(journal)),
+        Case("summarize_by_group", rows, lambda _: summarize_by_group(result, marks)),
+        Case("compute_unrealized", rows, lambda _: compute_unrealized(open_df, marks)),
+    ]
+
+
+def measure(case: Case, repeat: int) -> Dict[str, float]:
+    """Best wall time of `repeat` calls, then the peak traced allocation of one more."""
+    best = float("inf")
+    for _ in range(repeat):
+        arg = case.setup()
+        start = time.perf_counter()
+        case.run(arg)
+        best = min(best, time.perf_counter() - start)
+    arg = case.setup()
+    tracemalloc.start()
+    try:
+        case.run(arg)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {"seconds": best, "peak_mb": peak / 2**20}
+
+
+def profile_case(case: Case, directory: str, profiler: str = "cprofile") -> str:
+    """Run `case` once under `profiler` and write the profile to `directory`."""
+    os.makedirs(directory, exist_ok=True)
+    arg = case.setup()
+    if profiler == "pyinstrument":
+        try:
+            from pyinstrument import Profiler
+        except ImportError as exc:
+            raise ImportError("--profiler pyinstrument requires pyinstrument (pip install pyinstrument)") from exc
+        path = os.path.join(directory, f"{case.key}.html")
+        with Profiler() as prof:
+            case.run(arg)
+        with open(path, "w") as f:
+            f.write(prof.output_html())
+        return path
+    path = os.path.join(directory, f"{case.key}.prof")
+    prof = cProfile.Profile()
+    prof.runcall(case.run, arg)
+    prof.dump_stats(path)
+    return path
+
+
+def _commit() -> Optional[str]:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                             cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return out.stdout.strip() or None
+
+
+def load_baseline(path: str) -> Dict[str, Any]:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {"cases": {}}
+
+
+def save_baseline(path: str, results: Dict[str, Dict[str, float]]) -> None:
+    """Merge `results` into the baseline at `path` (other sizes keep their entries)."""
+    baseline = load_baseline(path)
+    baseline["cases"].update(results)
+    baseline.update(commit=_commit(), python=platform.python_version(), machine=platform.machine(),
+                    saved=dt.datetime.now().isoformat(timespec="seconds"))
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(baseline, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def run_suite(sizes: List[int], backend: str = "csv", repeat: int = 3, baseline_path: str = BASELINE_PATH,
+              save: bool = False, profile_dir: Optional[str] = None, profile_top: int = 3,
+              profiler: str = "cprofile", tolerance: float = REGRESSION_TOLERANCE) -> int:
+    """
+    Time every suite case at each journal size on `backend` and compare with
+    the stored baseline for that backend; returns the number of regressions. With `profile_dir`, the
+    `profile_top` slowest cases are profiled once more and dumped there.
+    """
+    baseline = load_baseline(baseline_path)["cases"]
+    results: Dict[str, Dict[str, float]] = {}
+    regressions = 0
+    print(f"{'case':<28} {'seconds':>10} {'peak MB':>9} {'baseline':>10} {'change':>8}")
+    with tempfile.TemporaryDirectory(prefix="options-bench-") as directory:
+        storage = _storage_in(directory, backend)
+        for rows in sizes:
+            journal = make_journal(rows)
+            storage.save_trades(journal)
+            storage.load_trades()
+            for case in suite_cases(storage, journal):
+                result = measure(case, repeat)
+                key = f"{backend}/{case.key}"
+                results[key] = result
+                before = baseline.get(key, {}).get("seconds")
+                previous, change = "-", ""
+                if before:
+                    ratio = result["seconds"] / before - 1.0
+                    previous, change = f"{before:.4f}", f"{ratio:+.0%}"
+                    if ratio > tolerance and result["seconds"] - before > MIN_REGRESSION_SECONDS:
+                        change += " !"
+                        regressions += 1
+                print(f"{case.key:<28} {result['seconds']:>10.4f} {result['peak_mb']:>9.1f} {previous:>10} {change:>8}")
+        if profile_dir:
+            slowest = sorted(results, key=lambda key: results[key]["seconds"], reverse=True)[:profile_top]
+            slowest = [key.split("/", 1)[1] for key in slowest]
+            for rows in sizes:
+                wanted = [key for key in slowest if key.endswith(f"@{rows}")]
+                if not wanted:
+                    continue
+                # The same journal again (the generator is seeded), stored afresh
+                journal = make_journal(rows)
+                storage.save_trades(journal)
+                storage.load_trades()
+                for case in suite_cases(storage, journal):
+                    if case.key in wanted:
+                        print(f"profile: {profile_case(case, profile_dir, profiler)}")
+    if save:
+        save_baseline(baseline_path, results)
+        print(f"baseline saved to {baseline_path}")
+    if regressions:
+        print(f"{regressions} case(s) slower than the baseline by more than {tolerance:.0%}")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--legs", type=int, default=500)
+    parser.add_argument("--reference-rows", type=int, help="rows to time the reference on (default: all of --rows, 0 skips it)")
+    parser.add_argument("--min-speedup", type=float, default=MIN_SPEEDUP,
+                        help="exit non-zero if compute_pl is not this many times faster than the reference (0 disables)")
+    parser.add_argument("--pricing-legs", type=int, default=0, help="also time Greeks/implied vol on this many legs")
+    parser.add_argument("--signal-symbols", type=int, default=0, help="also time backtest signals on this many symbols")
+    parser.add_argument("--signal-years", type=int, default=10, help="years of daily prices for --signal-symbols")
+    parser.add_argument("--book-symbols", type=int, default=0, help="also time the event-driven book on this many symbols")
+    parser.add_argument("--suite", help="comma-separated journal sizes for the hot-path suite, e.g. 1000,100000")
+    parser.add_argument("--backend", default="csv", help="storage backend for the suite (csv, log, parquet, arrow, sqlite)")
+    parser.add_argument("--repeat", type=int, default=3, help="timed calls per suite case (the best is kept)")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="baseline file to compare with")
+    parser.add_argument("--save-baseline", action="store_true", help="store this run's suite results as the baseline")
+    parser.add_argument("--tolerance", type=float, default=REGRESSION_TOLERANCE, help="allowed slowdown vs the baseline")
+    parser.add_argument("--profile", metavar="DIR", help="dump profiles of the slowest suite cases to DIR")
+    parser.add_argument("--profile-top", type=int, default=3, help="how many of the slowest cases to profile")
+    parser.add_argument("--profiler", choices=PROFILERS, default="cprofile")
+    args = parser.parse_args()
+
+    if args.suite:
+        sizes = [int(size) for size in args.suite.split(",") if size]
+        regressions = run_suite(sizes, args.backend, args.repeat, args.baseline, args.save_baseline,
+                                args.profile, args.profile_top, args.profiler, args.tolerance)
+        if regressions:
+            raise SystemExit(1)
+
+    if args.pricing_legs:
+        bench_pricing(args.pricing_legs)
+    if args.signal_symbols:
+        bench_signals(args.signal_symbols, args.signal_years)
+    if args.book_symbols:
+        bench_book(args.book_symbols, args.signal_years)
+    if not args.rows:
+        return
+
+    trades = make_trades(args.rows, legs=args.legs)
+    elapsed = _timed(compute_pl, trades)
+    print(f"compute_pl: {args.rows:,} rows in {elapsed:.2f}s ({args.rows / elapsed:,.0f} rows/s)")
+    reference_rows = args.rows if args.reference_rows is None else args.reference_rows
+    if reference_rows:
+        sample = trades.head(reference_rows)
+        ref_elapsed = _timed(reference_compute_pl, sample)
+        ref_rate = len(sample) / ref_elapsed
+        speedup = args.rows / elapsed / ref_rate
+        print(f"reference:  {len(sample):,} rows in {ref_elapsed:.2f}s ({ref_rate:,.0f} rows/s)")
+        print(f"speedup:    {speedup:.1f}x")
+        if speedup < args.min_speedup:
+            print(f"speedup below {args.min_speedup:g}x")
+            raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Typed columnar trade tables (Parquet or Arrow IPC) for the storage layer.
+
+Columns keep their dtypes on disk, so a load needs no parsing or coercion.
+Arrow IPC files are read through a memory map without copying column data;
+Parquet files are memory-mapped and decoded.
+"""
+import os
+from typing import Iterable, List, Optional
+
+import pandas as pd
+
+# pyarrow is optional and only imported once a columnar table is opened
+pa = None
+pq = None
+
+FORMATS = {"parquet", "arrow"}
+
+
+def _import_pyarrow(fmt: str) -> None:
+    global pa, pq
+    if pa is not None:
+        return
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError as exc:
+        raise ImportError(f"The {fmt} storage backend requires pyarrow (pip install pyarrow)") from exc
+    pa, pq = pyarrow, pyarrow.parquet
+
+
+def _schema():
+    return pa.schema([
+        ("id", pa.int64()),
+        ("group_id", pa.int64()),
+        ("symbol", pa.string()),
+        ("expiry", pa.date32()),
+        ("strike", pa.float64()),
+        ("option_type", pa.string()),
+        ("action", pa.string()),
+        ("quantity", pa.int64()),
+        ("price", pa.float64()),
+        ("fees", pa.float64()),
+        ("trade_datetime", pa.timestamp("ns")),
+        ("note", pa.string()),
+        ("account", pa.string()),
+    ])
+
+
+def _conform(table, schema):
+    """`table` cast to `schema`; columns added since it was written (account) are null."""
+    for field in schema:
+        if field.name not in table.column_names:
+            table = table.append_column(field, pa.nulls(len(table), field.type))
+    return table.select(schema.names).cast(schema)
+
+
+def _types_mapper(arrow_type):
+    # Nullable ints round-trip as Int64, matching storage._coerce_types
+    if pa.types.is_int64(arrow_type):
+        return pd.Int64Dtype()
+    return None
+
+
+class ColumnarTable:
+    def __init__(self, path: str, fmt: str) -> None:
+        if fmt not in FORMATS:
+            raise ValueError(f"Invalid columnar format {fmt}")
+        _import_pyarrow(fmt)
+        self.path = path
+        self.fmt = fmt
+
+    def read(self, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        if self.fmt == "parquet":
+            table = pq.read_table(self.path, columns=columns, memory_map=True)
+        else:
+            # The map stays open for as long as the returned columns reference it
+            table = pa.ipc.open_file(pa.memory_map(self.path, "r")).read_all()
+            if columns is not None:
+                table = table.select(columns)
+        return table.to_pandas(types_mapper=_types_mapper)
+
+    def write(self, df: pd.DataFrame) -> None:
+        """Write an already type-coerced frame; goes through a temp file and rename."""
+        table = pa.Table.from_pandas(df, schema=_schema(), preserve_index=False)
+        tmp_path = f"{self.path}.tmp"
+        if self.fmt == "parquet":
+            pq.write_table(table, tmp_path)
+        else:
+            with pa.OSFile(tmp_path, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        os.replace(tmp_path, self.path)
+
+    def append(self, chunks: Iterable[pd.DataFrame]) -> None:
+        """
+        Stream the existing batches and then `chunks` into a new file, so only
+        one batch or chunk is held in memory at a time.
+        """
+        schema = _schema()
+        tmp_path = f"{self.path}.tmp"
+        if self.fmt == "parquet":
+            existing = pq.ParquetFile(self.path, memory_map=True)
+            with pq.ParquetWriter(tmp_path, schema) as writer:
+                for batch in existing.iter_batches():
+                    writer.write_table(_conform(pa.Table.from_batches([batch]), schema))
+                for chunk in chunks:
+                    writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+        else:
+            existing = pa.ipc.open_file(pa.memory_map(self.path, "r"))
+            with pa.OSFile(tmp_path, "wb") as sink, pa.ipc.new_file(sink, schema) as writer:
+                for i in range(existing.num_record_batches):
+                    writer.write_table(_conform(pa.Table.from_batches([existing.get_batch(i)]), schema))
+                for chunk in chunks:
+                    writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+        os.replace(tmp_path, self.path)
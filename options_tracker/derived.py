@@ -0,0 +1,120 @@
+"""
+Derived state kept next to the active trade store: the FIFO matcher state
+(`PLState`) and the daily equity curve. Both are cached in memory per store
+version, saved beside the store and brought up to date from it on load;
+storage's writers keep the P/L state current as they change trades.
+"""
+import os
+from typing import Any, Dict, Optional, Tuple
+
+import pandas as pd
+
+import instrument
+import storage
+from pl_state import PLState
+from timeline import EquityCurve, build_equity_curve
+
+PL_STATE_PATH = os.environ.get(
+    "OPTIONS_PL_STATE", os.path.splitext(storage.TRADES_STORE_PATH)[0] + ".plstate.pkl"
+)
+EQUITY_CURVE_PATH = os.environ.get(
+    "OPTIONS_EQUITY_CURVE", os.path.splitext(storage.TRADES_STORE_PATH)[0] + ".equity.pkl"
+)
+
+_pl_state: Optional[PLState] = None
+
+
+def _catch_up_pl_state(state: PLState, version: Tuple) -> bool:
+    """Apply log records appended since `state` was current; False if it can't be caught up."""
+    tail = storage._log_tail(state.version, version)
+    if tail is None:
+        return False
+    records, puts = tail
+    done = 0
+    pending = 0
+    for record in records + [None]:
+        # Runs of consecutive puts go through apply_many as one batch
+        if record is not None and record["op"] == "put":
+            pending += 1
+            continue
+        state.apply_many(puts.iloc[done:done + pending])
+        done += pending
+        pending = 0
+        if record is not None:
+            state.remove(int(record["id"]))
+    state.version = version
+    return True
+
+
+def load_pl_state(trades: Optional[pd.DataFrame] = None) -> PLState:
+    """
+    FIFO matcher state for the current trades.
+
+    Served from memory or the state file when its version matches, caught up
+    from the log tail when only new log records were added, and otherwise
+    rebuilt once from `trades` (or a fresh load). Changed state is persisted.
+    """
+    global _pl_state
+    version = storage.trades_version()
+    if _pl_state is not None and _pl_state.version == version:
+        instrument.count("pl_state.cache_hit")
+        return _pl_state
+    instrument.count("pl_state.cache_miss")
+    state = _pl_state if _pl_state is not None and _catch_up_pl_state(_pl_state, version) else None
+    if state is None:
+        state = PLState.load(PL_STATE_PATH)
+        if state is not None and state.version != version and not _catch_up_pl_state(state, version):
+            state = None
+    if state is None:
+        trades = storage.load_trades() if trades is None else trades
+        with instrument.span("storage.rebuild_pl_state", rows=len(trades)):
+            state = PLState.from_trades(trades)
+        state.version = version
+    state.save(PL_STATE_PATH)
+    _pl_state = state
+    return state
+
+
+def _commit_pl_state(state: PLState, previous: Optional[Tuple] = None, writes: int = 1) -> None:
+    global _pl_state
+    version = storage.trades_version()
+    if previous is not None and storage._sqlite() is not None and version[1] != previous[1] + writes:
+        # Another session wrote in between; let the next load rebuild
+        _pl_state = None
+        return
+    state.version = version
+    state.save(PL_STATE_PATH)
+    _pl_state = state
+
+
+_equity_curve: Dict[str, Any] = {"version": None, "curve": None}
+
+
+def load_equity_curve(marks: Optional[pd.DataFrame] = None) -> EquityCurve:
+    """
+    Daily equity curve of the current trades (see timeline.build_equity_curve),
+    matched per account when there are several.
+
+    The saved curve is extended from its last day when the trades and marks
+    before that day are unchanged; a curve without marks is also kept in
+    memory per store version.
+    """
+    version = storage.trades_version()
+    if marks is None and _equity_curve["version"] == version:
+        instrument.count("equity_curve.cache_hit")
+        return _equity_curve["curve"]
+    instrument.count("equity_curve.cache_miss")
+    trades = storage.load_trades()
+    previous = _equity_curve["curve"] or EquityCurve.load(EQUITY_CURVE_PATH)
+    if trades["account"].nunique() > 1:
+        # Each account's result is cached on its own, so only accounts with new trades are re-matched
+        from accounts import account_book
+        result = account_book(trades).firm()
+    else:
+        result = load_pl_state(trades).result()
+    with instrument.span("storage.build_equity_curve", rows=len(trades)):
+        curve = build_equity_curve(trades, result, marks, previous=previous)
+    curve.save(EQUITY_CURVE_PATH)
+    _equity_curve["version"] = version if marks is None else None
+    _equity_curve["curve"] = curve
+    return curve
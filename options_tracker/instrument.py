@@ -0,0 +1,207 @@
+"""
+Lightweight instrumentation for the hot paths: timed spans, row counts and
+counters (cache hits and misses), grouped into runs (one per app rerun).
+
+Off by default. Set OPTIONS_INSTRUMENT=1 (or call `enable()`) to record.
+While disabled, `span` returns a shared no-op object and `timed` wrappers
+and `count` return after a single flag check, so instrumented code pays
+next to nothing.
+
+A finished run is appended as one JSON line to METRICS_LOG_PATH and kept in
+memory (`recent_runs`) for the app's diagnostics panel. Runs are
+per-thread, so concurrent Streamlit sessions do not mix their spans.
+"""
+import datetime as dt
+import functools
+import json
+import os
+import threading
+import time
+from collections import deque
+from dataclasses import asdict, dataclass, field
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+_TRADES_CSV_PATH = os.environ.get("OPTIONS_TRADES_CSV", "/workspace/options_tracker/trades.csv")
+METRICS_LOG_PATH = os.environ.get("OPTIONS_METRICS_LOG", os.path.splitext(_TRADES_CSV_PATH)[0] + ".metrics.jsonl")
+# Spans kept per run (a runaway loop of spans must not grow without bound)
+MAX_SPANS = 2_000
+RECENT_RUNS = 50
+
+_enabled = os.environ.get("OPTIONS_INSTRUMENT", "") not in ("", "0")
+_local = threading.local()
+_recent: Deque["Run"] = deque(maxlen=RECENT_RUNS)
+_log_lock = threading.Lock()
+
+
+@dataclass
+class SpanRecord:
+    """One timed block; `offset` is when it started, in seconds from the run's start."""
+    name: str
+    seconds: float
+    rows: Optional[int] = None
+    depth: int = 0
+    offset: float = 0.0
+
+
+@dataclass
+class Run:
+    """Spans and counters recorded between `begin_run` and `end_run`."""
+    label: str
+    started: str
+    seconds: float = 0.0
+    spans: List[SpanRecord] = field(default_factory=list)
+    counters: Dict[str, int] = field(default_factory=dict)
+
+    def ordered(self) -> List[SpanRecord]:
+        """Spans in the order they started (they are recorded as they finish)."""
+        return sorted(self.spans, key=lambda span: span.offset)
+
+    def totals(self) -> Dict[str, float]:
+        """Seconds per span name (nested spans also count toward their parents)."""
+        out: Dict[str, float] = {}
+        for span in self.spans:
+            out[span.name] = out.get(span.name, 0.0) + span.seconds
+        return out
+
+
+def enable(on: bool = True) -> None:
+    global _enabled
+    _enabled = on
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+def _run() -> Run:
+    run = getattr(_local, "run", None)
+    if run is None:
+        run = _local.run = Run("default", dt.datetime.now().isoformat(timespec="seconds"))
+        _local.start = time.perf_counter()
+        _local.depth = 0
+    return run
+
+
+class _Span:
+    __slots__ = ("name", "rows", "_start", "_depth")
+
+    def __init__(self, name: str, rows: Optional[int]) -> None:
+        self.name = name
+        self.rows = rows
+
+    def __enter__(self) -> "_Span":
+        _run()
+        self._depth = _local.depth
+        _local.depth += 1
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        elapsed = time.perf_counter() - self._start
+        _local.depth = self._depth
+        run = _run()
+        if len(run.spans) < MAX_SPANS:
+            rows = None if self.rows is None else int(self.rows)
+            run.spans.append(SpanRecord(self.name, elapsed, rows, self._depth, self._start - _local.start))
+
+
+class _Idle:
+    """What `span` hands out while disabled: accepts `rows` and does nothing."""
+    rows = None
+
+    def __enter__(self) -> "_Idle":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        pass
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        pass
+
+
+_IDLE = _Idle()
+
+
+def span(name: str, rows: Optional[int] = None):
+    """
+    Context manager timing a block; set ``.rows`` on it to record a row
+    count::
+
+        with instrument.span("storage.read_csv") as s:
+            df = pd.read_csv(path)
+            s.rows = len(df)
+    """
+    if not _enabled:
+        return _IDLE
+    return _Span(name, rows)
+
+
+def timed(name: str, rows: Optional[Callable[[Any], int]] = None) -> Callable:
+    """
+    Decorator recording each call of the function as a span; `rows`, if
+    given, maps the first argument to the span's row count (e.g. ``len``).
+    """
+    def decorate(fn: Callable) -> Callable:
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            with _Span(name, rows(args[0]) if rows is not None and args else None):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def count(name: str, n: int = 1) -> None:
+    """Add `n` to a counter of the current run, e.g. ``count("load_trades.hit")``."""
+    if not _enabled:
+        return
+    counters = _run().counters
+    counters[name] = counters.get(name, 0) + n
+
+
+def begin_run(label: str) -> None:
+    """Start a new run on this thread, dropping anything recorded outside one."""
+    if not _enabled:
+        return
+    _local.run = Run(label, dt.datetime.now().isoformat(timespec="seconds"))
+    _local.start = time.perf_counter()
+    _local.depth = 0
+
+
+def end_run(log_path: Optional[str] = None) -> Optional[Run]:
+    """Finish this thread's run: total latency, kept in `recent_runs` and logged."""
+    if not _enabled:
+        return None
+    run = _run()
+    run.seconds = time.perf_counter() - _local.start
+    _local.run = None
+    _recent.append(run)
+    _write(run, log_path or METRICS_LOG_PATH)
+    return run
+
+
+def _write(run: Run, path: str) -> None:
+    line = json.dumps(asdict(run), separators=(",", ":")) + "\n"
+    try:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with _log_lock, open(path, "a") as f:
+            f.write(line)
+    except OSError:
+        # Diagnostics must never break the app
+        pass
+
+
+def recent_runs() -> List[Run]:
+    """The last RECENT_RUNS finished runs of this process, oldest first."""
+    return list(_recent)
+
+
+def read_log(path: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Runs from a metrics log, for offline analysis."""
+    runs = []
+    with open(path or METRICS_LOG_PATH) as f:
+        for line in f:
+            if line.strip():
+                runs.append(json.loads(line))
+    return runs
@@ -0,0 +1,327 @@
+"""
+Marks store: timestamped option marks keyed on the contract
+(symbol, expiry, strike, option_type), for unrealized P/L.
+
+Marks arrive in bulk, either as snapshot files (CSV, JSON records or JSON
+lines) or from any `MarkSource`, and are kept in an indexed SQLite database
+in WAL mode next to the trades. Every mark is kept in `marks` with its
+``as_of`` time; `latest` holds the newest mark per contract and is
+maintained in the same transaction, so the current marks are one indexed
+table read and need no GROUP BY over the history. A `meta.version` counter
+is bumped on every write, and the latest frame is cached per version.
+
+`MarkStore.latest()` and `history()` return frames that `pl.mark_to_market`,
+`compute_unrealized`, `summarize_by_group` and `derived.load_equity_curve`
+take as they are.
+"""
+import io
+import os
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import pandas as pd
+
+import instrument
+from pl import MARK_KEY_COLUMNS
+from sqlite_store import _sql_column
+from storage import OPTION_TYPES, TRADES_STORE_PATH
+
+MARKS_PATH = os.environ.get("OPTIONS_MARKS", os.path.splitext(TRADES_STORE_PATH)[0] + ".marks.sqlite")
+
+MARK_COLUMNS = MARK_KEY_COLUMNS + ["mark", "as_of", "source"]
+JSON_SUFFIXES = (".json", ".jsonl", ".ndjson")
+MAX_REJECTED_KEPT = 1_000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS marks (
+    symbol TEXT NOT NULL,
+    expiry TEXT NOT NULL,
+    strike REAL NOT NULL,
+    option_type TEXT NOT NULL,
+    as_of TEXT NOT NULL,
+    mark REAL NOT NULL,
+    source TEXT,
+    PRIMARY KEY (symbol, expiry, strike, option_type, as_of)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS marks_as_of ON marks (as_of);
+CREATE TABLE IF NOT EXISTS latest (
+    symbol TEXT NOT NULL,
+    expiry TEXT NOT NULL,
+    strike REAL NOT NULL,
+    option_type TEXT NOT NULL,
+    as_of TEXT NOT NULL,
+    mark REAL NOT NULL,
+    source TEXT,
+    PRIMARY KEY (symbol, expiry, strike, option_type)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL);
+INSERT OR IGNORE INTO meta (key, value) VALUES ('version', 0);
+"""
+
+_COLUMNS = ", ".join(MARK_COLUMNS)
+_PLACEHOLDERS = ", ".join("?" * len(MARK_COLUMNS))
+# Re-loading a snapshot replaces its marks; `latest` only moves forward in time
+INSERT_MARKS = f"""
+INSERT INTO marks ({_COLUMNS}) VALUES ({_PLACEHOLDERS})
+ON CONFLICT (symbol, expiry, strike, option_type, as_of)
+DO UPDATE SET mark = excluded.mark, source = excluded.source
+"""
+UPSERT_LATEST = f"""
+INSERT INTO latest ({_COLUMNS}) VALUES ({_PLACEHOLDERS})
+ON CONFLICT (symbol, expiry, strike, option_type)
+DO UPDATE SET as_of = excluded.as_of, mark = excluded.mark, source = excluded.source
+WHERE excluded.as_of >= latest.as_of
+"""
+
+
+@dataclass
+class MarksImport:
+    read: int = 0
+    imported: int = 0
+    rejected: int = 0
+    # First MAX_REJECTED_KEPT rejected rows with a "reason" column
+    rejected_rows: pd.DataFrame = field(default_factory=lambda: pd.DataFrame(columns=MARK_COLUMNS + ["reason"]))
+
+
+def _stamp(value: Any) -> pd.Timestamp:
+    """A timestamp to the second; no value means now."""
+    return (pd.Timestamp(value) if value is not None else pd.Timestamp.now()).floor("s")
+
+
+def _name(source: Any) -> str:
+    """File name of a path or file object (Streamlit uploads carry `.name`)."""
+    return str(source if isinstance(source, (str, os.PathLike)) else getattr(source, "name", ""))
+
+
+def read_snapshot(source: Any) -> pd.DataFrame:
+    """
+    Raw rows of a marks file (path or file object): JSON records or JSON
+    lines for .json/.jsonl/.ndjson names, CSV otherwise.
+    """
+    name = _name(source).lower()
+    if name.endswith(JSON_SUFFIXES):
+        lines = not name.endswith(".json")
+        if not lines and hasattr(source, "read"):
+            # A .json upload may still be JSON lines; peek at the first character
+            text = source.read()
+            text = text.decode() if isinstance(text, bytes) else text
+            lines = not text.lstrip().startswith("[")
+            return pd.read_json(io.StringIO(text), lines=lines, orient="records", dtype=False)
+        return pd.read_json(source, lines=lines, orient="records", dtype=False)
+    return pd.read_csv(source)
+
+
+def validate_marks(raw: pd.DataFrame, as_of: Any = None, source: str = "") -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Split raw mark rows into typed accepted rows (MARK_COLUMNS) and rejected
+    rows with a reason. Rows without an ``as_of`` column or value get
+    `as_of` (now by default).
+    """
+    default = _stamp(as_of)
+    frame = raw.reindex(columns=MARK_COLUMNS).reset_index(drop=True)
+    marks = pd.DataFrame({
+        "symbol": frame["symbol"].astype("string").str.strip(),
+        "expiry": pd.to_datetime(frame["expiry"], errors="coerce").dt.normalize(),
+        "strike": pd.to_numeric(frame["strike"], errors="coerce"),
+        "option_type": frame["option_type"].astype("string").str.strip().str.upper(),
+        "mark": pd.to_numeric(frame["mark"], errors="coerce"),
+        "as_of": pd.to_datetime(frame["as_of"], errors="coerce").dt.floor("s").fillna(default),
+        "source": frame["source"].astype("string").fillna(source),
+    })
+    checks = [
+        (marks["symbol"].isna() | (marks["symbol"] == ""), "missing symbol"),
+        (marks["expiry"].isna(), "missing expiry"),
+        (marks["strike"].isna(), "missing strike"),
+        (~marks["option_type"].isin(OPTION_TYPES), "invalid option_type"),
+        (marks["mark"].isna() | (marks["mark"] < 0), "invalid mark"),
+    ]
+    reason = pd.Series(None, index=marks.index, dtype=object)
+    # Apply in reverse so each rejected row reports its first failing check
+    for mask, why in reversed(checks):
+        reason = reason.mask(mask.fillna(True).astype(bool), why)
+    bad = reason.notna()
+    good = marks[~bad].reset_index(drop=True)
+    good["symbol"] = good["symbol"].astype(str)
+    good["option_type"] = good["option_type"].astype(str)
+    good["source"] = good["source"].astype(str)
+    return good, frame[bad].assign(reason=reason[bad])
+
+
+def with_overrides(marks: Optional[pd.DataFrame], overrides: Optional[pd.DataFrame]) -> Optional[pd.DataFrame]:
+    """
+    Contract marks with `overrides` (any frame with the key columns and
+    ``mark``; a ``side`` column is ignored) taking precedence.
+    """
+    if overrides is None or overrides.empty:
+        return marks
+    overrides = overrides[MARK_KEY_COLUMNS + ["mark"]]
+    if marks is None or marks.empty:
+        return overrides
+    # The last row wins for a contract in pl.OpenBook.mark_matrix
+    return pd.concat([marks[MARK_KEY_COLUMNS + ["mark"]], overrides], ignore_index=True)
+
+
+class MarkSource(ABC):
+    """Supplies marks for the contracts of the given open legs."""
+
+    @abstractmethod
+    def fetch(self, legs: pd.DataFrame) -> pd.DataFrame:
+        """Rows with the MARK_KEY_COLUMNS, ``mark`` and optionally ``as_of``."""
+
+
+class FileSource(MarkSource):
+    """
+    A snapshot file that something else keeps writing (a broker export, a
+    script); each fetch re-reads it and stamps rows lacking ``as_of`` with
+    the file's modification time.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+
+    def fetch(self, legs: pd.DataFrame) -> pd.DataFrame:
+        marks = read_snapshot(self.path)
+        if "as_of" not in marks.columns:
+            marks["as_of"] = pd.Timestamp.fromtimestamp(os.path.getmtime(self.path))
+        return marks
+
+
+class FrameSource(MarkSource):
+    """Serves a fixed marks frame (tests, fixtures) and records every fetch."""
+
+    def __init__(self, marks: pd.DataFrame) -> None:
+        self.marks = marks
+        self.calls: List[int] = []
+
+    def fetch(self, legs: pd.DataFrame) -> pd.DataFrame:
+        self.calls.append(len(legs))
+        return self.marks
+
+
+class MarkStore:
+    def __init__(self, path: str = MARKS_PATH) -> None:
+        self.path = path
+        # One connection per thread; Streamlit runs each session in its own thread
+        self._local = threading.local()
+        self._latest: Dict[str, Any] = {"version": None, "frame": None}
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, isolation_level=None, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _write(self) -> Iterator[sqlite3.Connection]:
+        """Write transaction that also bumps the version counter."""
+        conn = self.conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+            conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'version'")
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def version(self) -> int:
+        return int(self.conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()[0])
+
+    def ingest(self, marks: pd.DataFrame, as_of: Any = None, source: str = "") -> MarksImport:
+        """
+        Validate and store mark rows in one transaction; rows without
+        ``as_of`` are stamped with `as_of` (now by default).
+        """
+        result = MarksImport(read=len(marks))
+        with instrument.span("marks.ingest", rows=len(marks)):
+            good, bad = validate_marks(marks, as_of, source)
+            result.imported, result.rejected = len(good), len(bad)
+            if not bad.empty:
+                result.rejected_rows = bad.head(MAX_REJECTED_KEPT).reset_index(drop=True)
+            if good.empty:
+                return result
+            good["expiry"] = good["expiry"].dt.strftime("%Y-%m-%d")
+            rows = list(zip(*(_sql_column(good[column]) for column in MARK_COLUMNS)))
+            with self._write() as conn:
+                conn.executemany(INSERT_MARKS, rows)
+                conn.executemany(UPSERT_LATEST, rows)
+        return result
+
+    def load_snapshot(self, source: Any, as_of: Any = None) -> MarksImport:
+        """
+        Ingest a snapshot file (path or file object). Rows without ``as_of``
+        take `as_of`, else the file's modification time (paths) or now.
+        """
+        if as_of is None and isinstance(source, (str, os.PathLike)):
+            as_of = pd.Timestamp.fromtimestamp(os.path.getmtime(source))
+        return self.ingest(read_snapshot(source), as_of, source=os.path.basename(_name(source)))
+
+    def refresh(self, source: MarkSource, legs: pd.DataFrame) -> MarksImport:
+        """Ingest what `source` returns for the contracts of `legs`."""
+        return self.ingest(source.fetch(legs), source=type(source).__name__)
+
+    def _frame(self, sql: str, params: Tuple = ()) -> pd.DataFrame:
+        frame = pd.read_sql_query(sql, self.conn, params=params)
+        frame["expiry"] = pd.to_datetime(frame["expiry"])
+        frame["as_of"] = pd.to_datetime(frame["as_of"])
+        return frame
+
+    def latest(self) -> pd.DataFrame:
+        """The newest mark per contract; cached until the next write."""
+        version = self.version()
+        if self._latest["version"] != version:
+            instrument.count("marks.latest.cache_miss")
+            with instrument.span("marks.latest") as s:
+                frame = self._frame(f"SELECT {_COLUMNS} FROM latest ORDER BY symbol, expiry, strike, option_type")
+                s.rows = len(frame)
+            self._latest = {"version": version, "frame": frame}
+        else:
+            instrument.count("marks.latest.cache_hit")
+        return self._latest["frame"]
+
+    def history(self, start: Any = None, end: Any = None, symbol: Optional[str] = None) -> pd.DataFrame:
+        """
+        Every stored mark with ``as_of`` in [start, end] (inclusive), in long
+        format for `pl.unrealized_timeseries` and `load_equity_curve`.
+        """
+        clauses: List[str] = []
+        params: List[Any] = []
+        if start is not None:
+            clauses.append("as_of >= ?")
+            params.append(_stamp(start).strftime("%Y-%m-%d %H:%M:%S"))
+        if end is not None:
+            clauses.append("as_of <= ?")
+            params.append(_stamp(end).strftime("%Y-%m-%d %H:%M:%S"))
+        if symbol is not None:
+            clauses.append("symbol = ?")
+            params.append(symbol)
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        return self._frame(f"SELECT {_COLUMNS} FROM marks{where} ORDER BY as_of", tuple(params))
+
+    def prune(self, before: Any) -> int:
+        """Drop history older than `before`; the latest marks are kept."""
+        with self._write() as conn:
+            cursor = conn.execute("DELETE FROM marks WHERE as_of < ?", (_stamp(before).strftime("%Y-%m-%d %H:%M:%S"),))
+        return cursor.rowcount
+
+
+_stores: Dict[str, MarkStore] = {}
+
+
+def mark_store(path: Optional[str] = None) -> MarkStore:
+    """The process-wide store for `path` (MARKS_PATH by default)."""
+    path = path or MARKS_PATH
+    store = _stores.get(path)
+    if store is None:
+        store = _stores[path] = MarkStore(path)
+    return store
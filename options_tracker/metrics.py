@@ -0,0 +1,129 @@
+"""
+Performance statistics shared by the equity curve and the backtests.
+
+The formulas are the ones used in day-2-backtesting.ipynb: drawdown against
+the running peak of a growth-of-$1 series and an annualized Sharpe ratio of
+per-period returns (no risk-free rate).
+
+Every function works along the first axis, so a pandas Series or 1-D array
+gives a scalar and a (dates x symbols) array or DataFrame gives one value
+per symbol. NaNs (dates before a symbol listed) are skipped like pandas does.
+"""
+from typing import Dict, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+TRADING_DAYS = 252
+
+Values = Union[pd.Series, pd.DataFrame, np.ndarray]
+Stat = Union[float, np.ndarray]
+
+
+def _array(values: Values) -> np.ndarray:
+    return np.asarray(values, dtype=np.float64)
+
+
+def _scalar(result: np.ndarray) -> Stat:
+    """Plain float for 1-D inputs, per-column array otherwise."""
+    return float(result) if np.ndim(result) == 0 else result
+
+
+def _last_valid(values: np.ndarray) -> np.ndarray:
+    """Last non-NaN value along the first axis (NaN for all-NaN columns)."""
+    valid = ~np.isnan(values)
+    if not len(values):
+        return np.full(values.shape[1:], np.nan)
+    last = len(values) - 1 - np.argmax(valid[::-1], axis=0)
+    picked = np.take_along_axis(values, np.expand_dims(last, 0), axis=0)[0]
+    return np.where(valid.any(axis=0), picked, np.nan)
+
+
+def drawdown(cumulative: Values) -> Values:
+    """Fractional distance below the running peak of a cumulative (growth of $1) series."""
+    values = _array(cumulative)
+    running_max = np.fmax.accumulate(values, axis=0) if len(values) else values
+    with np.errstate(divide="ignore", invalid="ignore"):
+        result = (values - running_max) / running_max
+    if isinstance(cumulative, pd.Series):
+        return pd.Series(result, index=cumulative.index, name=cumulative.name)
+    if isinstance(cumulative, pd.DataFrame):
+        return pd.DataFrame(result, index=cumulative.index, columns=cumulative.columns)
+    return result
+
+
+def max_drawdown(cumulative: Values) -> Stat:
+    values = _array(cumulative)
+    if not len(values):
+        return 0.0 if values.ndim == 1 else np.zeros(values.shape[1:])
+    # fmin skips NaNs and leaves all-NaN columns NaN without a warning
+    return _scalar(np.fmin.reduce(_array(drawdown(values)), axis=0))
+
+
+def sharpe_ratio(returns: Values, periods: int = TRADING_DAYS) -> Stat:
+    """Annualized Sharpe ratio of per-period returns; NaN without variation."""
+    values = _array(returns)
+    count = np.sum(~np.isnan(values), axis=0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean = np.nansum(values, axis=0) / count
+        std = np.sqrt(np.nansum((values - mean) ** 2, axis=0) / (count - 1))
+        sharpe = (mean * periods) / (std * np.sqrt(periods))
+    return _scalar(np.where((count > 1) & (std > 0), sharpe, np.nan))
+
+
+def total_return(cumulative: Values) -> Stat:
+    """Final value of a growth-of-$1 series minus one."""
+    return _scalar(_last_valid(_array(cumulative)) - 1.0)
+
+
+def cagr(cumulative: Values, years: Optional[Union[float, np.ndarray]] = None, periods: int = TRADING_DAYS) -> Stat:
+    """
+    Compound annual growth of a growth-of-$1 (or value / cost multiple)
+    series. Without `years` the length is taken as valid periods / `periods`,
+    the way the notebook converts 84-day bars with ``len * 84 / 252``.
+    """
+    values = _array(cumulative)
+    if years is None:
+        years = np.sum(~np.isnan(values), axis=0) / periods
+    with np.errstate(divide="ignore", invalid="ignore"):
+        growth = _last_valid(values) ** (1.0 / np.asarray(years, dtype=np.float64)) - 1.0
+    return _scalar(np.where(np.asarray(years) > 0, growth, np.nan))
+
+
+def years_between(index: pd.DatetimeIndex) -> float:
+    """Calendar years spanned by a date index (the notebook's days / 365.25)."""
+    if len(index) < 2:
+        return 0.0
+    return (index[-1] - index[0]).days / 365.25
+
+
+def periods_per_year(index: pd.DatetimeIndex) -> float:
+    """Observed periods per calendar year (about 3 for 84-business-day bars)."""
+    years = years_between(index)
+    return (len(index) - 1) / years if years > 0 else float(TRADING_DAYS)
+
+
+def win_loss(returns: Values, exposure: Optional[Values] = None) -> Dict[str, Stat]:
+    """
+    Winning and losing periods with their average sizes. `exposure` (the
+    positions held) makes the win rate relative to periods in the market, as
+    in the notebook; otherwise it is wins / (wins + losses).
+    """
+    values = _array(returns)
+    wins = values > 0
+    losses = values < 0
+    n_wins = wins.sum(axis=0)
+    n_losses = losses.sum(axis=0)
+    in_market = n_wins + n_losses if exposure is None else np.nansum(np.abs(_array(exposure)), axis=0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        avg_win = np.where(wins, values, 0.0).sum(axis=0) / n_wins
+        avg_loss = np.where(losses, values, 0.0).sum(axis=0) / n_losses
+        stats = {
+            "wins": n_wins,
+            "losses": n_losses,
+            "win_rate": n_wins / in_market,
+            "avg_win": avg_win,
+            "avg_loss": avg_loss,
+            "win_loss_ratio": np.abs(avg_win / avg_loss),
+        }
+    return {name: _scalar(np.asarray(value, dtype=np.float64)) for name, value in stats.items()}
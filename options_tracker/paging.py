@@ -0,0 +1,207 @@
+"""
+Server-side filtering, sorting and pagination for the app's large tables.
+
+A query's filtered and sorted row order is computed once per store version
+and kept, so moving between pages only slices it. Only the visible page is
+copied and formatted (date columns to strings) for display, and formatted
+pages are cached too. Both caches are small LRUs keyed on the version, so a
+write to the store simply stops matching old entries.
+"""
+import datetime as dt
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Hashable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+import instrument
+
+PAGE_SIZES = (50, 100, 250, 500)
+# Filtered orders and formatted pages kept (per process, across tables and versions)
+MAX_ORDERS = 16
+MAX_PAGES = 64
+
+DATE_COLUMNS = {"expiry": "%Y-%m-%d", "trade_datetime": "%Y-%m-%d %H:%M:%S", "closed_at": "%Y-%m-%d %H:%M:%S"}
+# Realized events come from closing trades: STC closes LONG, BTC closes SHORT
+CLOSE_ACTIONS = {"LONG": "STC", "SHORT": "BTC"}
+
+
+@dataclass(frozen=True)
+class TableQuery:
+    """Filters (all optional, combined with AND), sort and page of a table view."""
+    symbol: Optional[str] = None
+    start: Optional[dt.date] = None
+    end: Optional[dt.date] = None
+    group_id: Optional[int] = None
+    account: Optional[str] = None
+    actions: Tuple[str, ...] = ()
+    sort_by: Optional[str] = None
+    ascending: bool = True
+    page: int = 0
+    page_size: int = 100
+
+    def filters(self) -> Tuple:
+        """Everything that decides the row order, i.e. all but the page."""
+        return (self.symbol, self.start, self.end, self.group_id, self.account, tuple(self.actions), self.sort_by,
+                self.ascending)
+
+
+@dataclass
+class Page:
+    rows: pd.DataFrame
+    total: int
+    page: int
+    pages: int
+    first_row: int
+
+    @property
+    def last_row(self) -> int:
+        return self.first_row + len(self.rows)
+
+
+class _LRU(OrderedDict):
+    def __init__(self, size: int) -> None:
+        super().__init__()
+        self.size = size
+
+    def get_or(self, key: Hashable, make: Callable[[], Any], counter: str) -> Any:
+        if key in self:
+            self.move_to_end(key)
+            instrument.count(f"{counter}.cache_hit")
+            return self[key]
+        instrument.count(f"{counter}.cache_miss")
+        value = self[key] = make()
+        while len(self) > self.size:
+            self.popitem(last=False)
+        return value
+
+
+_orders = _LRU(MAX_ORDERS)
+_pages = _LRU(MAX_PAGES)
+
+
+def clear_cache() -> None:
+    _orders.clear()
+    _pages.clear()
+
+
+def format_rows(rows: pd.DataFrame) -> pd.DataFrame:
+    """A display copy of `rows` with its date columns as strings."""
+    rows = rows.copy()
+    for column, fmt in DATE_COLUMNS.items():
+        if column in rows.columns:
+            rows[column] = pd.to_datetime(rows[column], errors="coerce").dt.strftime(fmt)
+    return rows
+
+
+def _order(frame: pd.DataFrame, keys: pd.DataFrame, query: TableQuery) -> np.ndarray:
+    """Row positions of `frame` that pass the filters, in sort order."""
+    mask = np.ones(len(frame), dtype=bool)
+    if query.symbol:
+        mask &= (keys["symbol"] == query.symbol).to_numpy()
+    if query.group_id is not None:
+        mask &= (keys["group_id"] == query.group_id).fillna(False).to_numpy(dtype=bool)
+    if query.account:
+        mask &= (keys["account"] == query.account).to_numpy()
+    if query.actions:
+        mask &= keys["action"].isin(query.actions).to_numpy()
+    if query.start is not None:
+        mask &= (keys["time"] >= pd.Timestamp(query.start)).to_numpy()
+    if query.end is not None:
+        # Inclusive end date
+        mask &= (keys["time"] < pd.Timestamp(query.end) + pd.Timedelta(days=1)).to_numpy()
+    positions = np.flatnonzero(mask)
+    if query.sort_by is None:
+        return positions
+    column = keys[query.sort_by] if query.sort_by in keys.columns else frame[query.sort_by]
+    values = column.iloc[positions].reset_index(drop=True)
+    order = values.sort_values(ascending=query.ascending, kind="stable", na_position="last").index.to_numpy()
+    return positions[order]
+
+
+def _positions(table: str, frame: pd.DataFrame, keys: Callable[[], pd.DataFrame], query: TableQuery,
+               version: Hashable) -> np.ndarray:
+    def order() -> np.ndarray:
+        with instrument.span(f"paging.{table}.filter_sort", rows=len(frame)):
+            return _order(frame, keys(), query)
+
+    return _orders.get_or((table, version, query.filters()), order, "paging.order")
+
+
+def _view(table: str, frame: pd.DataFrame, keys: Callable[[], pd.DataFrame], query: TableQuery,
+          version: Hashable, extra: Optional[Callable[[np.ndarray], pd.DataFrame]] = None) -> Page:
+    positions = _positions(table, frame, keys, query, version)
+    size = max(1, int(query.page_size))
+    pages = max(1, -(-len(positions) // size))
+    page = min(max(0, int(query.page)), pages - 1)
+
+    def render() -> pd.DataFrame:
+        picked = positions[page * size:(page + 1) * size]
+        with instrument.span(f"paging.{table}.format", rows=len(picked)):
+            rows = frame.iloc[picked].reset_index(drop=True)
+            if extra is not None:
+                rows = pd.concat([rows, extra(picked)], axis=1)
+            return format_rows(rows)
+
+    rows = _pages.get_or((table, version, query.filters(), page, size), render, "paging.page")
+    return Page(rows, len(positions), page, pages, page * size)
+
+
+def _trade_keys(trades: pd.DataFrame) -> pd.DataFrame:
+    return pd.DataFrame({
+        "symbol": trades["symbol"],
+        "group_id": trades["group_id"],
+        "account": trades["account"],
+        "action": trades["action"],
+        "time": trades["trade_datetime"],
+    })
+
+
+def trades_page(trades: pd.DataFrame, query: TableQuery, version: Hashable) -> Page:
+    """One page of the trades table (filters apply to trade_datetime)."""
+    return _view("trades", trades, lambda: _trade_keys(trades), query, version)
+
+
+def _close_times(realized: pd.DataFrame, trades: pd.DataFrame) -> pd.Series:
+    """trade_datetime of each realized event's closing trade."""
+    times = pd.Series(trades["trade_datetime"].to_numpy(), index=trades["id"].to_numpy())
+    times = times[~times.index.duplicated(keep="last")]
+    return pd.Series(times.reindex(realized["close_id"].to_numpy()).to_numpy(), index=realized.index)
+
+
+def realized_page(realized: pd.DataFrame, trades: pd.DataFrame, query: TableQuery, version: Hashable) -> Page:
+    """
+    One page of the realized events, each with the time of its closing trade
+    (`closed_at`, what the date filter applies to). The group filter uses
+    the opening group, which the P/L is attributed to.
+    """
+    def keys() -> pd.DataFrame:
+        closed = _close_times(realized, trades)
+        return pd.DataFrame({
+            "symbol": realized["symbol"],
+            "group_id": realized["open_group_id"],
+            # Only the firm-wide events (accounts.AccountBook) carry an account
+            "account": realized["account"] if "account" in realized.columns else None,
+            "action": realized["side"].map(CLOSE_ACTIONS),
+            "time": closed,
+            "closed_at": closed,
+        })
+
+    def closed_at(picked: np.ndarray) -> pd.DataFrame:
+        return pd.DataFrame({"closed_at": _close_times(realized.iloc[picked], trades).to_numpy()})
+
+    return _view("realized", realized, keys, query, version, extra=closed_at)
+
+
+def trades_filtered(trades: pd.DataFrame, query: TableQuery, version: Hashable) -> pd.DataFrame:
+    """Every trade matching `query`, sorted and unformatted (e.g. for export)."""
+    positions = _positions("trades", trades, lambda: _trade_keys(trades), query, version)
+    return trades.iloc[positions].reset_index(drop=True)
+
+
+def distinct(table: str, frame: pd.DataFrame, column: str, version: Hashable) -> List[Any]:
+    """Sorted distinct non-null values of a column, for filter choices."""
+    def values() -> List[Any]:
+        return sorted(frame[column].dropna().unique().tolist())
+    return _orders.get_or(("distinct", table, column, version), values, "paging.distinct")
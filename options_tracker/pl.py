@@ -1,9 +1,15 @@
 from __future__ import annotations
 
+import gc
+from collections import deque
+from contextlib import contextmanager
 from dataclasses import dataclass
-from typing import Dict, List, Tuple, Optional
+from typing import Deque, Dict, List, Optional, Tuple, Union
+import numpy as np
 import pandas as pd
 
+import instrument
+
 OPTIONS_MULTIPLIER = 100.0
 
 
@@ -46,7 +52,7 @@ class RealizedEvent:
 def _leg_key(row: pd.Series) -> Tuple[str, pd.Timestamp, float, str]:
     return (
         row["symbol"],
-        pd.to_datetime(row["expiry"]),
+        pd.Timestamp(row["expiry"]),
         float(row["strike"]),
         str(row["option_type"]).upper(),
     )
@@ -66,206 +72,607 @@ def _side_for_action(action: str) -> str:
     return "SHORT"
 
 
-def compute_pl(trades: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame, float]:
-    """
-    Compute realized events and open positions from a trades DataFrame.
+REALIZED_COLUMNS = [
+    "symbol",
+    "expiry",
+    "strike",
+    "option_type",
+    "side",
+    "quantity",
+    "realized_pl",
+    "open_price",
+    "close_price",
+    "open_fees",
+    "close_fees",
+    "open_ids",
+    "close_id",
+    "open_group_id",
+    "close_group_id",
+]
+
+OPEN_COLUMNS = [
+    "symbol",
+    "expiry",
+    "strike",
+    "option_type",
+    "side",
+    "open_quantity",
+    "average_cost",
+    "total_fees",
+]
+
+# One row per remaining FIFO lot; average_cost and total_fees are the lot's own
+OPEN_LOT_COLUMNS = OPEN_COLUMNS + ["open_id", "group_id"]
+
+LEG_COLUMNS = ["symbol", "expiry", "strike", "option_type", "side"]
 
-    Returns (realized_events_df, open_positions_df, total_realized_pl)
-    Prices are per-option; multiplier applied in realized_pl.
-    Fees are included: open fees increase cost basis; close fees reduce proceeds.
+
+@dataclass
+class PLResult:
+    """Everything one FIFO matching pass produces."""
+    realized: pd.DataFrame
+    open_positions: pd.DataFrame
+    total_realized: float
+    open_lots: pd.DataFrame
+
+    def as_tuple(self) -> Tuple[pd.DataFrame, pd.DataFrame, float]:
+        """The (realized_df, open_df, total_realized) triple ``compute_pl`` returns."""
+        return self.realized, self.open_positions, self.total_realized
+
+
+def _match_close(
+    lots: Deque[list],
+    closing_side: str,
+    quantity: int,
+    price: float,
+    fees: float,
+) -> List[Tuple[int, int, float, float, float, float, float]]:
     """
-    if trades.empty:
-        return (
-            pd.DataFrame(columns=[
-                "symbol",
-                "expiry",
-                "strike",
-                "option_type",
-                "side",
-                "quantity",
-                "realized_pl",
-                "open_price",
-                "close_price",
-                "open_fees",
-                "close_fees",
-                "open_ids",
-                "close_id",
-            ]),
-            pd.DataFrame(columns=[
-                "symbol",
-                "expiry",
-                "strike",
-                "option_type",
-                "side",
-                "open_quantity",
-                "average_cost",
-                "total_fees",
-            ]),
-            0.0,
-        )
+    Consume FIFO lots for one closing fill.
 
-    trades = trades.sort_values("trade_datetime").reset_index(drop=True)
-    realized_records: List[RealizedEvent] = []
-    # For each leg, maintain separate long and short open lots (FIFO)
-    open_lots: Dict[Tuple[str, pd.Timestamp, float, str, str], List[Tuple[int, Lot]]] = {}
-
-    for idx, row in trades.iterrows():
-        key = _leg_key(row)
-        action = str(row["action"]).upper()
-        option_side = _side_for_action(action)  # LONG/SHORT side of the position impacted
-        quantity: int = int(row["quantity"]) if pd.notna(row["quantity"]) else 0
-        price: float = float(row["price"]) if pd.notna(row["price"]) else 0.0
-        fees: float = float(row["fees"]) if pd.notna(row["fees"]) else 0.0
-        trade_id: int = int(row["id"]) if pd.notna(row["id"]) else -1
-
-        if _is_open_action(action):
-            # BTO opens LONG; STO opens SHORT
-            lots_key = (*key, option_side)
-            lots = open_lots.setdefault(lots_key, [])
-            lots.append((trade_id, Lot(quantity=quantity, price=price, fees=fees)))
-        elif _is_close_action(action):
-            # STC closes LONG; BTC closes SHORT
-            closing_side = _side_for_action(action)
-            lots_key = (*key, closing_side)
-            lots = open_lots.setdefault(lots_key, [])
-            qty_to_close = quantity
-            while qty_to_close > 0 and lots:
-                open_trade_id, lot = lots[0]
-                matched_qty = min(qty_to_close, lot.quantity)
-                # Calculate realized P/L
-                if closing_side == "LONG":
-                    # Selling to close: proceeds - cost
-                    pl_per_contract = (price - lot.price)
-                else:
-                    # Buying to close a short: open proceeds - repurchase cost
-                    pl_per_contract = (lot.price - price)
-                # Allocate pro-rata fees
-                open_fee_alloc = lot.fees * (matched_qty / lot.quantity if lot.quantity else 1.0)
-                close_fee_alloc = fees * (matched_qty / quantity if quantity else 1.0)
-                realized_amount = (pl_per_contract * matched_qty * OPTIONS_MULTIPLIER) - open_fee_alloc - close_fee_alloc
-
-                realized_records.append(
-                    RealizedEvent(
-                        symbol=key[0],
-                        expiry=pd.to_datetime(key[1]),
-                        strike=key[2],
-                        option_type=key[3],
-                        side=closing_side,
-                        quantity=matched_qty,
-                        realized_pl=realized_amount,
-                        open_price=lot.price,
-                        close_price=price,
-                        open_fees=open_fee_alloc,
-                        close_fees=close_fee_alloc,
-                        open_ids=[open_trade_id],
-                        close_id=trade_id,
-                    )
-                )
-                # Reduce or remove lot
-                lot.quantity -= matched_qty
-                qty_to_close -= matched_qty
-                if lot.quantity == 0:
-                    lots.pop(0)
-                else:
-                    lots[0] = (open_trade_id, lot)
-            # If qty_to_close remains, it indicates closing more than open; ignore remainder
+    Lots are mutable ``[trade_id, quantity, price, fees, group_id]`` lists.
+    Returns one ``(open_id, matched_qty, open_price, open_fee, close_fee,
+    realized_pl, open_group_id)`` tuple per matched lot. Any quantity beyond
+    the open lots is ignored.
+    """
+    matches = []
+    qty_to_close = quantity
+    while qty_to_close > 0 and lots:
+        lot = lots[0]
+        open_id, lot_qty, lot_price, lot_fees = lot[0], lot[1], lot[2], lot[3]
+        matched_qty = min(qty_to_close, lot_qty)
+        if closing_side == "LONG":
+            # Selling to close: proceeds - cost
+            pl_per_contract = (price - lot_price)
         else:
-            continue
+            # Buying to close a short: open proceeds - repurchase cost
+            pl_per_contract = (lot_price - price)
+        # Allocate pro-rata fees
+        open_fee_alloc = lot_fees * (matched_qty / lot_qty if lot_qty else 1.0)
+        close_fee_alloc = fees * (matched_qty / quantity if quantity else 1.0)
+        realized_amount = (pl_per_contract * matched_qty * OPTIONS_MULTIPLIER) - open_fee_alloc - close_fee_alloc
+        matches.append((open_id, matched_qty, lot_price, open_fee_alloc, close_fee_alloc, realized_amount, lot[4]))
+        # Reduce or remove lot
+        lot[1] = lot_qty - matched_qty
+        qty_to_close -= matched_qty
+        if lot[1] == 0:
+            lots.popleft()
+    return matches
+
+
+def _upper(series: pd.Series) -> np.ndarray:
+    # Upper-case the distinct values only; journals repeat a handful of codes
+    codes, uniques = pd.factorize(series.astype(str))
+    return np.asarray(uniques.str.upper(), dtype=object)[codes]
+
+
+@contextmanager
+def _gc_paused():
+    # The matcher allocates millions of small lists; generational GC passes over
+    # them dominate the loop on large journals without freeing anything.
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def _leg_frame(trades: pd.DataFrame) -> pd.DataFrame:
+    """
+    Normalized leg key columns (including position side) for every trade,
+    led by ``account`` when the trades carry one.
+    """
+    actions = pd.Series(_upper(trades["action"]), index=trades.index)
+    legs = pd.DataFrame({
+        "symbol": trades["symbol"],
+        "expiry": pd.to_datetime(trades["expiry"]),
+        "strike": trades["strike"].astype(float),
+        "option_type": _upper(trades["option_type"]),
+        "side": np.where(actions.isin(["BTO", "STC"]), "LONG", "SHORT"),
+        "action": actions,
+    })
+    if "account" in trades.columns:
+        account = trades["account"].astype(object)
+        legs.insert(0, "account", account.where(account.notna(), None).to_numpy())
+    return legs
+
+
+def _key_columns(frame: pd.DataFrame) -> List[str]:
+    """The columns lots are matched on: LEG_COLUMNS, within the ``account`` if `frame` has one."""
+    return (["account"] if "account" in frame.columns else []) + LEG_COLUMNS
+
+
+def _numeric_or(series: pd.Series, default, dtype) -> np.ndarray:
+    return pd.to_numeric(series, errors="coerce").fillna(default).to_numpy(dtype=dtype)
 
-    # Build realized events DataFrame
-    realized_df = pd.DataFrame([r.__dict__ for r in realized_records])
-    total_realized = float(realized_df["realized_pl"].sum()) if not realized_df.empty else 0.0
 
-    # Build open positions summary
-    open_rows: List[OpenPosition] = []
-    for lots_key, lots in open_lots.items():
+# Sorts a fill without a trade_datetime after every dated one
+_MISSING_TIME = np.iinfo(np.int64).max
+
+
+def _fill_key(when: pd.Timestamp, trade_id: int) -> Tuple[int, int]:
+    """Matching-order key of one fill; `_sort_fills` orders whole frames by the same key."""
+    return (_MISSING_TIME if pd.isna(when) else when.value, trade_id)
+
+
+def _sort_fills(trades: pd.DataFrame) -> pd.DataFrame:
+    """
+    Trades in matching order: by trade_datetime (missing last), then by id (a
+    missing id counts as -1, as in the matcher). The sort is stable, so fills
+    sharing both keep their row order. PLState keeps its legs in the same order
+    through `_fill_key`.
+    """
+    when = pd.to_datetime(trades["trade_datetime"])
+    times = when.to_numpy(dtype="datetime64[ns]").view(np.int64).copy()
+    times[when.isna().to_numpy()] = _MISSING_TIME
+    order = np.lexsort((_numeric_or(trades["id"], -1, np.int64), times))
+    return trades.iloc[order].reset_index(drop=True)
+
+
+def _group_ids(trades: pd.DataFrame) -> np.ndarray:
+    # Float so a missing group stays NaN through the matcher; see _int_groups
+    if "group_id" not in trades.columns:
+        return np.full(len(trades), np.nan)
+    return pd.to_numeric(trades["group_id"], errors="coerce").to_numpy(dtype=np.float64)
+
+
+def _int_groups(values) -> pd.arrays.IntegerArray:
+    values = np.asarray(values, dtype=np.float64)
+    missing = np.isnan(values)
+    whole = np.where(missing, 0.0, values)
+    if not (np.isfinite(whole).all() and np.array_equal(whole, np.trunc(whole))):
+        # Let pandas raise on ids that are not whole numbers
+        return pd.array(values, dtype="Float64").astype("Int64")
+    return pd.arrays.IntegerArray(whole.astype(np.int64), missing)
+
+
+def _empty_result() -> PLResult:
+    return PLResult(pd.DataFrame(columns=REALIZED_COLUMNS), pd.DataFrame(columns=OPEN_COLUMNS), 0.0,
+                    pd.DataFrame(columns=OPEN_LOT_COLUMNS))
+
+
+def _empty_pl() -> Tuple[pd.DataFrame, pd.DataFrame, float]:
+    return _empty_result().as_tuple()
+
+
+def _open_frame(keys: pd.DataFrame, queues: List[Deque[list]]) -> pd.DataFrame:
+    """Open quantity, average cost and fees per leg; `keys` holds each queue's `_key_columns` row."""
+    totals = []
+    for code, lots in enumerate(queues):
         if not lots:
             continue
-        symbol, expiry, strike, option_type, side = lots_key
-        total_qty = sum(lot.quantity for _, lot in lots)
+        total_qty = sum(lot[1] for lot in lots)
         if total_qty == 0:
             continue
         # Weighted average cost and total fees
-        total_cost = sum(lot.quantity * lot.price for _, lot in lots)
-        total_fees = sum(lot.fees for _, lot in lots)
-        average_cost = total_cost / total_qty if total_qty else 0.0
-        open_rows.append(
-            OpenPosition(
-                symbol=symbol,
-                expiry=pd.to_datetime(expiry),
-                strike=float(strike),
-                option_type=str(option_type),
-                side=side,
-                open_quantity=int(total_qty),
-                average_cost=float(average_cost),
-                total_fees=float(total_fees),
-            )
+        total_cost = sum(lot[1] * lot[2] for lot in lots)
+        totals.append((code, total_qty, total_cost / total_qty, sum(lot[3] for lot in lots)))
+    if not totals:
+        return pd.DataFrame()
+    codes, quantity, average_cost, fees = zip(*totals)
+    # Key columns are taken by position, so no per-row Timestamps are boxed
+    open_df = keys.iloc[list(codes)].reset_index(drop=True)
+    open_df["open_quantity"] = np.asarray(quantity, dtype=np.int64)
+    open_df["average_cost"] = np.asarray(average_cost, dtype=np.float64)
+    open_df["total_fees"] = np.asarray(fees, dtype=np.float64)
+    return open_df
+
+
+def _open_lots_frame(keys: pd.DataFrame, queues: List[Deque[list]]) -> pd.DataFrame:
+    rows = [(code, *lot) for code, lots in enumerate(queues) for lot in lots if lot[1]]
+    codes, open_ids, quantity, price, fees, groups = zip(*rows) if rows else ((),) * 6
+    lots = keys.iloc[list(codes)].reset_index(drop=True)
+    lots["open_quantity"] = np.asarray(quantity, dtype=np.int64)
+    lots["average_cost"] = np.asarray(price, dtype=np.float64)
+    lots["total_fees"] = np.asarray(fees, dtype=np.float64)
+    lots["open_id"] = np.asarray(open_ids, dtype=np.int64)
+    lots["group_id"] = _int_groups(groups)
+    return lots
+
+
+def _realized_frame(keys: pd.DataFrame, event_codes: List[int], matches: List[tuple],
+                    close_prices: List[float], close_ids: List[int], close_groups: List[float]) -> pd.DataFrame:
+    open_ids, matched_qty, open_prices, open_fees, close_fees, realized, open_groups = zip(*matches)
+    realized_df = keys.iloc[event_codes].reset_index(drop=True)
+    realized_df["quantity"] = np.asarray(matched_qty, dtype=np.int64)
+    realized_df["realized_pl"] = np.asarray(realized, dtype=np.float64)
+    realized_df["open_price"] = np.asarray(open_prices, dtype=np.float64)
+    realized_df["close_price"] = np.asarray(close_prices, dtype=np.float64)
+    realized_df["open_fees"] = np.asarray(open_fees, dtype=np.float64)
+    realized_df["close_fees"] = np.asarray(close_fees, dtype=np.float64)
+    realized_df["open_ids"] = [[open_id] for open_id in open_ids]
+    realized_df["close_id"] = np.asarray(close_ids, dtype=np.int64)
+    realized_df["open_group_id"] = _int_groups(open_groups)
+    realized_df["close_group_id"] = _int_groups(close_groups)
+    return realized_df
+
+
+@dataclass
+class _FillColumns:
+    """Per-fill numeric columns of the sorted, active trades, looked up by row."""
+    quantity: np.ndarray
+    price: np.ndarray
+    fees: np.ndarray
+    trade_id: np.ndarray
+    group: np.ndarray
+
+    @classmethod
+    def from_trades(cls, trades: pd.DataFrame, quantities: np.ndarray) -> "_FillColumns":
+        return cls(
+            quantity=quantities,
+            price=_numeric_or(trades["price"], 0.0, np.float64),
+            fees=_numeric_or(trades["fees"], 0.0, np.float64),
+            trade_id=_numeric_or(trades["id"], -1, np.int64),
+            group=_group_ids(trades),
         )
 
-    open_df = pd.DataFrame([o.__dict__ for o in open_rows])
-    return realized_df, open_df, total_realized
 
+def _remaining_frames(keys: pd.DataFrame, remaining_lots: List[Tuple[int, int, int]],
+                      columns: _FillColumns) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Open positions and open lots from the `(code, row, quantity)` of every lot left in the queues."""
+    if not remaining_lots:
+        return pd.DataFrame(), _open_lots_frame(keys, [])
+    codes, rows, quantity = (np.asarray(column, dtype=np.int64) for column in zip(*remaining_lots))
+    price = columns.price[rows]
+    # bincount adds in lot order, as the per-leg sums over the FIFO queues do
+    total_qty = np.bincount(codes, weights=quantity, minlength=len(keys)).astype(np.int64)
+    held = np.flatnonzero(np.bincount(codes, minlength=len(keys)).astype(bool) & (total_qty != 0))
+    if len(held):
+        total_cost = np.bincount(codes, weights=quantity * price, minlength=len(keys))
+        total_fees = np.bincount(codes, weights=columns.fees[rows], minlength=len(keys))
+        open_df = keys.iloc[held].reset_index(drop=True)
+        open_df["open_quantity"] = total_qty[held]
+        open_df["average_cost"] = total_cost[held] / total_qty[held]
+        open_df["total_fees"] = total_fees[held]
+    else:
+        open_df = pd.DataFrame()
+
+    nonzero = quantity != 0
+    lots = keys.iloc[codes[nonzero]].reset_index(drop=True)
+    rows = rows[nonzero]
+    lots["open_quantity"] = quantity[nonzero]
+    lots["average_cost"] = price[nonzero]
+    lots["total_fees"] = columns.fees[rows]
+    lots["open_id"] = columns.trade_id[rows]
+    lots["group_id"] = _int_groups(columns.group[rows])
+    return open_df, lots
+
+
+def _matched_frame(keys: pd.DataFrame, codes: np.ndarray, long_side: np.ndarray, columns: _FillColumns,
+                   open_rows: np.ndarray, close_rows: np.ndarray, matched_qty: np.ndarray,
+                   lot_qty: np.ndarray) -> pd.DataFrame:
+    """
+    Realized events from matches given as (opening row, closing row, matched
+    quantity, lot quantity before the match), valued as `_match_close` does.
+    """
+    event_codes = codes[close_rows]
+    open_price = columns.price[open_rows]
+    close_price = columns.price[close_rows]
+    pl_per_contract = np.where(long_side[event_codes], close_price - open_price, open_price - close_price)
+    # Pro-rata fees: the lot's fees over its quantity before this match, the fill's over its own
+    open_share = np.divide(matched_qty, lot_qty, out=np.ones(len(lot_qty)), where=lot_qty != 0)
+    open_fees = columns.fees[open_rows] * open_share
+    close_fees = columns.fees[close_rows] * (matched_qty / columns.quantity[close_rows])
+    realized_df = keys.iloc[event_codes].reset_index(drop=True)
+    realized_df["quantity"] = matched_qty
+    realized_df["realized_pl"] = (pl_per_contract * matched_qty * OPTIONS_MULTIPLIER) - open_fees - close_fees
+    realized_df["open_price"] = open_price
+    realized_df["close_price"] = close_price
+    realized_df["open_fees"] = open_fees
+    realized_df["close_fees"] = close_fees
+    realized_df["open_ids"] = [[open_id] for open_id in columns.trade_id[open_rows].tolist()]
+    realized_df["close_id"] = columns.trade_id[close_rows]
+    realized_df["open_group_id"] = _int_groups(columns.group[open_rows])
+    realized_df["close_group_id"] = _int_groups(columns.group[close_rows])
+    return realized_df
 
-def summarize_by_group(trades: pd.DataFrame) -> pd.DataFrame:
-    realized_df, open_df, total_realized = compute_pl(trades)
-    # Map realized events to group_id via close_id lookup
+
+def compute_pl(trades: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame, float]:
+    """
+    Compute realized events and open positions from a trades DataFrame.
+
+    Returns (realized_events_df, open_positions_df, total_realized_pl)
+    Prices are per-option; multiplier applied in realized_pl.
+    Fees are included: open fees increase cost basis; close fees reduce proceeds.
+    """
+    return compute_pl_result(trades).as_tuple()
+
+
+@instrument.timed("pl.compute_pl", rows=len)
+def compute_pl_result(trades: pd.DataFrame) -> PLResult:
+    """
+    `compute_pl` plus the remaining lots. Every lot keeps the group_id of its
+    opening trade, and realized events carry both the opening and the
+    closing group.
+
+    Legs are keyed once for the whole frame; the FIFO match then walks plain
+    NumPy-backed columns with one deque of lots per (account, leg, side).
+    When the trades carry an ``account``, every frame is led by it. Lots and
+    matches hold only row numbers and quantities; prices, fees, ids and
+    groups are gathered by row once the walk is done.
+    """
     if trades.empty:
-        return pd.DataFrame(columns=[
-            "group_id",
-            "realized_pl",
-            "open_positions",
-        ])
-    id_to_group = trades.set_index("id")["group_id"].to_dict()
-    if realized_df.empty:
-        group_realized = pd.Series(dtype=float)
-    else:
-        realized_df = realized_df.copy()
-        realized_df["group_id"] = realized_df["close_id"].map(id_to_group)
-        group_realized = realized_df.groupby("group_id")["realized_pl"].sum()
+        return _empty_result()
+
+    trades = _sort_fills(trades)
+    legs = _leg_frame(trades)
+    is_open = legs["action"].isin(["BTO", "STO"]).to_numpy()
+    is_close = legs["action"].isin(["BTC", "STC"]).to_numpy()
+    active = is_open | is_close
+    if not active.any():
+        return PLResult(pd.DataFrame(), pd.DataFrame(), 0.0, pd.DataFrame(columns=OPEN_LOT_COLUMNS))
+
+    trades = trades[active]
+    legs = legs[active]
+    is_open = is_open[active]
+    # Leg codes in order of first appearance, matching the order open legs are reported in
+    key_columns = _key_columns(legs)
+    codes = legs.groupby(key_columns, sort=False, dropna=False).ngroup().to_numpy()
+    firsts = np.unique(codes, return_index=True)[1]
+    keys = legs[key_columns].iloc[firsts].reset_index(drop=True)
+    queues: List[Deque[list]] = [deque() for _ in range(len(keys))]
+    quantities = _numeric_or(trades["quantity"], 0, np.int64)
+
+    # Lots are [row, remaining quantity]; a match is recorded as row numbers and
+    # quantities only, and prices, fees, ids and groups are joined on afterwards
+    open_rows: List[int] = []
+    close_rows: List[int] = []
+    matched_qty: List[int] = []
+    lot_qty: List[int] = []
+    with _gc_paused():
+        for row, (code, opening, quantity) in enumerate(zip(codes.tolist(), is_open.tolist(), quantities.tolist())):
+            lots = queues[code]
+            if opening:
+                # BTO opens LONG; STO opens SHORT
+                lots.append([row, quantity])
+                continue
+            # STC closes LONG; BTC closes SHORT. Any quantity beyond the open lots is ignored.
+            while quantity > 0 and lots:
+                lot = lots[0]
+                remaining = lot[1]
+                matched = quantity if quantity < remaining else remaining
+                open_rows.append(lot[0])
+                close_rows.append(row)
+                matched_qty.append(matched)
+                lot_qty.append(remaining)
+                quantity -= matched
+                if matched == remaining:
+                    lots.popleft()
+                else:
+                    lot[1] = remaining - matched
+        remaining_lots = [(code, row, qty) for code, lots in enumerate(queues) for row, qty in lots]
 
-    # Count open positions per group via latest open trades mapping
-    if open_df.empty:
-        group_open_counts = pd.Series(dtype=int)
-    else:
-        # Approximate: count open legs per group by mapping any remaining open trade ids' groups
-        # Build a mapping from leg to remaining open quantities and associated open trade ids
-        group_counts: Dict[Optional[int], int] = {}
-        # Recompute lot keys to capture group via remaining trades
-        # Not perfect, but we can estimate by taking last known trade for that leg's group
-        for _, o in open_df.iterrows():
-            group_counts[None] = group_counts.get(None, 0) + 1
-        group_open_counts = pd.Series(group_counts)
-
-    summary = pd.DataFrame({
-        "group_id": group_realized.index,
-        "realized_pl": group_realized.values,
-    })
-    # Fill open positions as N/A for now
-    if summary.empty:
-        summary = pd.DataFrame(columns=["group_id", "realized_pl"])
+        columns = _FillColumns.from_trades(trades, quantities)
+        open_df, open_lots = _remaining_frames(keys, remaining_lots, columns)
+        if not open_rows:
+            return PLResult(pd.DataFrame(), open_df, 0.0, open_lots)
+        realized_df = _matched_frame(keys, codes, (keys["side"] == "LONG").to_numpy(), columns,
+                                     np.asarray(open_rows, dtype=np.int64), np.asarray(close_rows, dtype=np.int64),
+                                     np.asarray(matched_qty, dtype=np.int64), np.asarray(lot_qty, dtype=np.int64))
+    return PLResult(realized_df, open_df, float(realized_df["realized_pl"].sum()), open_lots)
+
+
+GROUP_SUMMARY_COLUMNS = ["group_id", "realized_pl", "open_quantity", "cost_basis", "fees"]
+
+
+@instrument.timed("pl.summarize_by_group")
+def summarize_by_group(
+    trades: Union[pd.DataFrame, PLResult],
+    marks: Optional[pd.DataFrame] = None,
+) -> pd.DataFrame:
+    """
+    Per strategy group: realized P/L, open contracts, cost basis of the open
+    lots (premium paid, negative for credit received), fees and, when
+    `marks` are given, unrealized P/L.
+
+    Attribution is per lot: realized P/L and open lots belong to the group of
+    the opening trade. Pass a `PLResult` (e.g. from `PLState.result()`) to avoid
+    re-matching.
+    """
+    result = trades if isinstance(trades, PLResult) else compute_pl_result(trades)
+    columns = GROUP_SUMMARY_COLUMNS + (["unrealized_pl"] if marks is not None else [])
+    parts = []
+    realized = result.realized
+    if not realized.empty:
+        parts.append(pd.DataFrame({
+            "group_id": realized["open_group_id"],
+            "realized_pl": realized["realized_pl"],
+            "fees": realized["open_fees"] + realized["close_fees"],
+        }))
+    lots = result.open_lots
+    if not lots.empty:
+        sign = np.where(lots["side"].to_numpy() == "LONG", 1.0, -1.0)
+        open_part = pd.DataFrame({
+            "group_id": lots["group_id"],
+            "open_quantity": lots["open_quantity"],
+            "cost_basis": sign * lots["open_quantity"].to_numpy() * lots["average_cost"].to_numpy() * OPTIONS_MULTIPLIER,
+            "fees": lots["total_fees"],
+        })
+        if marks is not None:
+            open_part["unrealized_pl"] = mark_to_market(lots, marks)[0]["unrealized_pl"].to_numpy()
+        parts.append(open_part)
+    if not parts:
+        return pd.DataFrame(columns=columns)
+    summary = pd.concat(parts, ignore_index=True).reindex(columns=columns)
+    summary = summary.groupby("group_id", dropna=False, sort=True).sum(min_count=0).reset_index()
+    summary["open_quantity"] = summary["open_quantity"].astype(np.int64)
     return summary
 
 
-def compute_unrealized(open_positions: pd.DataFrame, marks: pd.DataFrame) -> pd.DataFrame:
+MARK_KEY_COLUMNS = ["symbol", "expiry", "strike", "option_type"]
+
+
+@dataclass
+class OpenBook:
     """
-    Given open positions and a marks DataFrame with columns:
-      symbol, expiry, strike, option_type, side, mark
-    compute unrealized P/L per leg and total.
+    Open legs as arrays plus a prebuilt index on the leg key, so marks can be
+    joined and valued for every leg (and every snapshot) in one array op.
+    """
+    positions: pd.DataFrame
+    legs: pd.MultiIndex  # (symbol, expiry, strike, option_type, side) per leg
+    levels: Dict[str, pd.Index]  # distinct values of each key column
+    leg_index: pd.Index  # encoded full leg key -> distinct leg position
+    leg_position: np.ndarray  # distinct leg position of each row
+    contract_index: pd.Index  # encoded contract key (no side) -> contract position
+    leg_contract: np.ndarray  # contract position of each leg
+    quantity: np.ndarray
+    average_cost: np.ndarray
+    sign: np.ndarray  # +1 for LONG, -1 for SHORT
+
+    @classmethod
+    def from_positions(cls, open_positions: pd.DataFrame) -> "OpenBook":
+        positions = open_positions.reset_index(drop=True)
+        if positions.empty:
+            positions = pd.DataFrame(columns=OPEN_COLUMNS)
+        keys = _mark_keys(positions, with_side=True)
+        levels = {col: pd.Index(pd.unique(keys[col])) for col in LEG_COLUMNS}
+        leg_position, leg_codes = pd.factorize(_encode(keys, levels, LEG_COLUMNS))
+        leg_contract, contracts = pd.factorize(_encode(keys, levels, MARK_KEY_COLUMNS))
+        return cls(
+            positions=positions,
+            legs=pd.MultiIndex.from_frame(keys),
+            levels=levels,
+            leg_index=pd.Index(leg_codes),
+            leg_position=leg_position,
+            contract_index=pd.Index(contracts),
+            leg_contract=leg_contract,
+            quantity=_numeric_or(positions["open_quantity"], 0, np.int64),
+            average_cost=_numeric_or(positions["average_cost"], np.nan, np.float64),
+            sign=np.where(positions["side"].to_numpy() == "LONG", 1.0, -1.0),
+        )
+
+    def __len__(self) -> int:
+        return len(self.positions)
+
+    def mark_lookup(self, marks: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray, int]:
+        """
+        Key position of every mark row (-1 if it matches no leg), the key
+        position of every leg, and the number of keys. Keys are contracts, or
+        full legs when `marks` has a ``side`` column.
+        """
+        if "side" in marks.columns:
+            columns, index, leg_pos = LEG_COLUMNS, self.leg_index, self.leg_position
+        else:
+            columns, index, leg_pos = MARK_KEY_COLUMNS, self.contract_index, self.leg_contract
+        pos = index.get_indexer(_encode(_mark_keys(marks, "side" in columns), self.levels, columns))
+        return pos, leg_pos, len(index)
+
+    def mark_matrix(self, marks: pd.DataFrame, time_column: Optional[str] = None) -> Tuple[pd.Index, np.ndarray]:
+        """
+        Marks as a (time x leg) matrix aligned to this book. Marks are keyed on
+        the contract, or on the full leg when they carry a ``side`` column; the
+        last row wins for duplicate keys. Without `time_column` there is a
+        single snapshot. Missing marks carry forward in time, then fall back
+        to the average cost.
+        """
+        if time_column is None:
+            times = pd.Index([None])
+            t_codes = np.zeros(len(marks), dtype=np.int64)
+        else:
+            t_codes, times = pd.factorize(pd.to_datetime(marks[time_column]), sort=True)
+        pos, leg_pos, n_keys = self.mark_lookup(marks)
+        found = pos >= 0
+        values = pd.to_numeric(marks["mark"], errors="coerce").to_numpy(dtype=np.float64)
+        by_key = np.full((len(times), n_keys), np.nan)
+        # Fancy assignment keeps the last write for repeated (time, key) pairs
+        by_key[t_codes[found], pos[found]] = values[found]
+        matrix = by_key[:, leg_pos]
+        if len(times) > 1:
+            matrix = pd.DataFrame(matrix).ffill().to_numpy()
+        return times, np.where(np.isnan(matrix), self.average_cost, matrix)
+
+    def unrealized(self, marks: np.ndarray) -> np.ndarray:
+        """Unrealized P/L for a mark vector or (time x leg) mark matrix."""
+        return (marks - self.average_cost) * self.sign * self.quantity * OPTIONS_MULTIPLIER
+
+
+def _mark_keys(frame: pd.DataFrame, with_side: bool) -> pd.DataFrame:
+    """Normalized leg key columns, so marks join whatever dtypes they arrive in."""
+    keys = pd.DataFrame({
+        "symbol": frame["symbol"].astype(str).to_numpy(),
+        "expiry": pd.to_datetime(frame["expiry"]).to_numpy(),
+        "strike": frame["strike"].astype(float).to_numpy(),
+        "option_type": _upper(frame["option_type"]),
+    })
+    if with_side:
+        keys["side"] = _upper(frame["side"])
+    return keys
+
+
+def _encode(keys: pd.DataFrame, levels: Dict[str, pd.Index], columns: List[str]) -> np.ndarray:
+    """One int64 per key row (mixed radix over the column levels); -1 if any value is unknown."""
+    code = np.zeros(len(keys), dtype=np.int64)
+    for col in columns:
+        level = levels[col]
+        pos = level.get_indexer(keys[col])
+        code = np.where((code < 0) | (pos < 0), -1, code * len(level) + pos)
+    return code
+
+
+@instrument.timed("pl.mark_to_market", rows=len)
+def mark_to_market(
+    open_positions: pd.DataFrame,
+    marks: pd.DataFrame,
+    book: Optional[OpenBook] = None,
+) -> Tuple[pd.DataFrame, float]:
+    """
+    Per-leg unrealized P/L (open positions plus ``mark`` and ``unrealized_pl``)
+    and the total, in one pass. Pass a prebuilt `book` to reuse its index.
     """
     if open_positions.empty:
-        return pd.DataFrame(columns=list(open_positions.columns) + ["mark", "unrealized_pl"])
+        return pd.DataFrame(columns=list(open_positions.columns) + ["mark", "unrealized_pl"]), 0.0
+    book = book if book is not None else OpenBook.from_positions(open_positions)
+    _, matrix = book.mark_matrix(marks)
+    unrealized = book.unrealized(matrix[0])
+    per_leg = book.positions.assign(mark=matrix[0], unrealized_pl=unrealized)
+    return per_leg, float(unrealized.sum())
+
+
+def unrealized_timeseries(
+    open_positions: pd.DataFrame,
+    marks: pd.DataFrame,
+    time_column: str = "as_of",
+    book: Optional[OpenBook] = None,
+) -> Tuple[pd.DataFrame, pd.Series]:
+    """
+    Unrealized P/L of the current open legs under many mark snapshots.
 
-    key_cols = ["symbol", "expiry", "strike", "option_type", "side"]
-    merged = open_positions.merge(marks, on=key_cols, how="left")
-    merged["mark"] = pd.to_numeric(merged["mark"], errors="coerce").fillna(merged["average_cost"])
+    `marks` is long-format (`time_column`, leg key columns, ``mark``). Returns
+    a (time x leg) frame with leg-key columns and the per-time total.
+    """
+    book = book if book is not None else OpenBook.from_positions(open_positions)
+    times, matrix = book.mark_matrix(marks, time_column=time_column)
+    per_leg = pd.DataFrame(book.unrealized(matrix), index=pd.DatetimeIndex(times, name=time_column), columns=book.legs)
+    return per_leg, per_leg.sum(axis=1).rename("unrealized_pl")
 
-    def _leg_unrealized(row):
-        qty = int(row["open_quantity"]) if pd.notna(row["open_quantity"]) else 0
-        if row["side"] == "LONG":
-            diff = row["mark"] - row["average_cost"]
-        else:
-            diff = row["average_cost"] - row["mark"]
-        return float(diff * qty * OPTIONS_MULTIPLIER)
 
-    merged["unrealized_pl"] = merged.apply(_leg_unrealized, axis=1)
-    return merged
\ No newline at end of file
+def compute_unrealized(open_positions: pd.DataFrame, marks: pd.DataFrame) -> pd.DataFrame:
+    """
+    Given open positions and a marks DataFrame with columns:
+      symbol, expiry, strike, option_type, [side,] mark
+    compute unrealized P/L per leg. Legs without a mark are valued at cost.
+    """
+    per_leg, _ = mark_to_market(open_positions, marks)
+    return per_leg
@@ -0,0 +1,339 @@
+from __future__ import annotations
+
+import os
+import pickle
+import uuid
+from bisect import insort
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from pl import (
+    LEG_COLUMNS,
+    PLResult,
+    _empty_result,
+    _fill_key,
+    _group_ids,
+    _is_close_action,
+    _is_open_action,
+    _key_columns,
+    _leg_frame,
+    _leg_key,
+    _match_close,
+    _numeric_or,
+    _open_frame,
+    _open_lots_frame,
+    _realized_frame,
+    _side_for_action,
+    _sort_fills,
+)
+
+# Bump when the pickled layout changes so stale state files get rebuilt
+STATE_FORMAT = 4
+# Delta records `save` appends before it rewrites the snapshot
+MAX_DELTAS = 200
+
+# (trade_datetime, trade_id, is_open, quantity, price, fees, group_id); group_id is NaN when missing
+TradeEntry = Tuple[pd.Timestamp, int, bool, int, float, float, float]
+
+
+@dataclass
+class LegBook:
+    """Trades, open lots and realized events for one (leg, side)."""
+    trades: List[TradeEntry] = field(default_factory=list)
+    lots: Deque[list] = field(default_factory=deque)
+    # (close_datetime, close_id, close_price, close_group_id, open_id, quantity, open_price, open_fee, close_fee,
+    #  realized_pl, open_group_id)
+    events: List[tuple] = field(default_factory=list)
+    realized: float = 0.0
+
+    def apply(self, side: str, entry: TradeEntry) -> None:
+        trade_dt, trade_id, is_open, quantity, price, fees, group = entry
+        if is_open:
+            self.lots.append([trade_id, quantity, price, fees, group])
+            return
+        for match in _match_close(self.lots, side, quantity, price, fees):
+            self.events.append((trade_dt, trade_id, price, group, *match))
+            self.realized += match[5]
+
+    def replay(self, side: str) -> None:
+        self.lots = deque()
+        self.events = []
+        self.realized = 0.0
+        for entry in self.trades:
+            self.apply(side, entry)
+
+
+def _trade_entry(row: Dict[str, Any]) -> Tuple[Optional[tuple], TradeEntry]:
+    """
+    Leg key (None for actions that never match) and FIFO entry for one trade
+    row. The key is led by the row's account, if it has one, as in `_key_columns`.
+    """
+    action = str(row.get("action")).upper()
+    trade_id = int(row["id"]) if pd.notna(row.get("id")) else -1
+    quantity = int(row["quantity"]) if pd.notna(row.get("quantity")) else 0
+    price = float(row["price"]) if pd.notna(row.get("price")) else 0.0
+    fees = float(row["fees"]) if pd.notna(row.get("fees")) else 0.0
+    group = float(row["group_id"]) if pd.notna(row.get("group_id")) else np.nan
+    entry = (pd.Timestamp(row.get("trade_datetime")), trade_id, _is_open_action(action), quantity, price, fees, group)
+    if not (_is_open_action(action) or _is_close_action(action)):
+        return None, entry
+    key = (*_leg_key(row), _side_for_action(action))
+    if "account" in row:
+        key = (row["account"] if pd.notna(row["account"]) else None, *key)
+    return key, entry
+
+
+def _trade_entries(trades: pd.DataFrame) -> List[Tuple[Optional[tuple], TradeEntry]]:
+    """Vectorized `_trade_entry` over a frame, in row order."""
+    legs = _leg_frame(trades)
+    is_open = legs["action"].isin(["BTO", "STO"])
+    active = (is_open | legs["action"].isin(["BTC", "STC"])).tolist()
+    keys = legs[_key_columns(legs)].itertuples(index=False, name=None)
+    entries = zip(
+        pd.to_datetime(trades["trade_datetime"]).tolist(),
+        _numeric_or(trades["id"], -1, np.int64).tolist(),
+        is_open.tolist(),
+        _numeric_or(trades["quantity"], 0, np.int64).tolist(),
+        _numeric_or(trades["price"], 0.0, np.float64).tolist(),
+        _numeric_or(trades["fees"], 0.0, np.float64).tolist(),
+        _group_ids(trades).tolist(),
+    )
+    return [(key if ok else None, entry) for key, ok, entry in zip(keys, active, entries)]
+
+
+class PLState:
+    """
+    Persistent FIFO matcher state that absorbs single-trade changes.
+
+    Appending a trade at or after the last trade of its leg only touches the
+    lots it consumes. A back-dated insert, an edit or a delete replays just the
+    legs involved; every other leg keeps its lots and realized events.
+
+    Saving is incremental too: the changes since the last save are appended
+    to a delta file next to the snapshot, which is only rewritten every
+    MAX_DELTAS saves (see `save`).
+    """
+
+    def __init__(self) -> None:
+        self.legs: Dict[tuple, LegBook] = {}
+        self.trade_legs: Dict[int, Optional[tuple]] = {}
+        self.total_realized: float = 0.0
+        self.version: Any = None
+        self.format = STATE_FORMAT
+        self._result: Optional[PLResult] = None
+        # Identifies the snapshot on disk this state extends; its delta records carry it
+        self._token: Optional[str] = None
+        # Changes since the last save, or None when only a full snapshot will do
+        self._ops: Optional[List[tuple]] = None
+        self._saved_version: Any = None
+        self._deltas = 0
+
+    def __getstate__(self) -> Dict[str, Any]:
+        state = self.__dict__.copy()
+        for transient in ("_result", "_ops", "_saved_version", "_deltas"):
+            state.pop(transient, None)
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self._result = None
+        self._ops = None
+        self._saved_version = None
+        self._deltas = 0
+
+    @classmethod
+    def from_trades(cls, trades: pd.DataFrame) -> "PLState":
+        state = cls()
+        if not trades.empty:
+            state.apply_many(_sort_fills(trades))
+        return state
+
+    def __len__(self) -> int:
+        return len(self.trade_legs)
+
+    def _replay(self, key: tuple) -> None:
+        book = self.legs[key]
+        self.total_realized -= book.realized
+        if book.trades:
+            book.replay(key[-1])
+            self.total_realized += book.realized
+        else:
+            del self.legs[key]
+
+    def apply(self, row: Dict[str, Any]) -> None:
+        """Insert or replace one trade (matched on ``id``)."""
+        self._apply_entry(*_trade_entry(row))
+
+    def apply_many(self, trades: pd.DataFrame) -> None:
+        """`apply` for every row of a trades frame, in row order."""
+        if trades.empty:
+            return
+        for key, entry in _trade_entries(trades):
+            self._apply_entry(key, entry)
+
+    def _apply_entry(self, key: Optional[tuple], entry: TradeEntry) -> None:
+        if self._ops is not None:
+            self._ops.append(("put", key, entry))
+        trade_id = entry[1]
+        if trade_id in self.trade_legs:
+            self._remove(trade_id)
+        self.trade_legs[trade_id] = key
+        self._result = None
+        if key is None:
+            return
+        book = self.legs.get(key)
+        if book is None:
+            book = self.legs[key] = LegBook()
+        if not book.trades or _fill_key(entry[0], entry[1]) >= _fill_key(book.trades[-1][0], book.trades[-1][1]):
+            book.trades.append(entry)
+            before = book.realized
+            book.apply(key[-1], entry)
+            self.total_realized += book.realized - before
+        else:
+            insort(book.trades, entry, key=lambda e: _fill_key(e[0], e[1]))
+            self._replay(key)
+
+    def remove(self, trade_id: int) -> None:
+        if self._ops is not None:
+            self._ops.append(("remove", trade_id))
+        self._remove(trade_id)
+
+    def _remove(self, trade_id: int) -> None:
+        if trade_id not in self.trade_legs:
+            return
+        key = self.trade_legs.pop(trade_id)
+        self._result = None
+        if key is None:
+            return
+        book = self.legs[key]
+        book.trades = [entry for entry in book.trades if entry[1] != trade_id]
+        self._replay(key)
+
+    def frames(self) -> Tuple[pd.DataFrame, pd.DataFrame, float]:
+        """Same (realized_df, open_df, total_realized) shape as ``compute_pl``."""
+        return self.result().as_tuple()
+
+    def result(self) -> PLResult:
+        """Same as ``compute_pl_result``, built from the kept lots and events."""
+        if self._result is not None:
+            return self._result
+        if not self.trade_legs:
+            self._result = _empty_result()
+            return self._result
+        keys = list(self.legs)
+        # Keys are led by the account when the trades carried one
+        columns = LEG_COLUMNS if not keys or len(keys[0]) == len(LEG_COLUMNS) else ["account"] + LEG_COLUMNS
+        key_frame = pd.DataFrame(keys, columns=columns)
+        queues = [self.legs[key].lots for key in keys]
+        open_df = _open_frame(key_frame, queues)
+        open_lots = _open_lots_frame(key_frame, queues)
+        events = [event for key in keys for event in self.legs[key].events]
+        if not events:
+            self._result = PLResult(pd.DataFrame(), open_df, 0.0, open_lots)
+            return self._result
+        event_codes = [code for code, key in enumerate(keys) for _ in self.legs[key].events]
+        # Realized events come out in close order, like compute_pl's single pass
+        order = sorted(range(len(events)), key=lambda i: _fill_key(events[i][0], events[i][1]))
+        events = [events[i] for i in order]
+        realized_df = _realized_frame(
+            key_frame,
+            [event_codes[i] for i in order],
+            [event[4:] for event in events],
+            [event[2] for event in events],
+            [event[1] for event in events],
+            [event[3] for event in events],
+        )
+        self._result = PLResult(realized_df, open_df, float(realized_df["realized_pl"].sum()), open_lots)
+        return self._result
+
+    def save(self, path: str) -> None:
+        """
+        Persist the state at `path`. When it extends the snapshot there, only
+        the changes since the last save are appended to ``path + ".delta"``,
+        so a save costs the trades changed rather than the whole history. The
+        snapshot is rewritten (and the delta dropped) when there is none to
+        extend, every MAX_DELTAS saves, or when a batch changed more than a
+        quarter of the trades.
+        """
+        if (
+            self._ops is not None
+            and self._token is not None
+            and self._deltas < MAX_DELTAS
+            and len(self._ops) <= max(1, len(self.trade_legs) // 4)
+            and os.path.exists(path)
+        ):
+            with open(_delta_path(path), "ab") as fh:
+                pickle.dump((self._token, self._saved_version, self.version, self._ops), fh,
+                            protocol=pickle.HIGHEST_PROTOCOL)
+            self._deltas += 1
+        else:
+            self._snapshot(path)
+        self._ops = []
+        self._saved_version = self.version
+
+    def _snapshot(self, path: str) -> None:
+        self._token = uuid.uuid4().hex
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as fh:
+            pickle.dump(self, fh, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+        # Records left in an old delta carry the old token and are ignored by `load` anyway
+        try:
+            os.remove(_delta_path(path))
+        except FileNotFoundError:
+            pass
+        self._deltas = 0
+
+    def _replay_ops(self, ops: List[tuple]) -> None:
+        for op in ops:
+            if op[0] == "put":
+                self._apply_entry(op[1], op[2])
+            else:
+                self._remove(op[1])
+
+    @classmethod
+    def load(cls, path: str) -> Optional["PLState"]:
+        """
+        Previously saved state (the snapshot plus its delta records), or None
+        if missing, unreadable or from an older format.
+        """
+        try:
+            with open(path, "rb") as fh:
+                state = pickle.load(fh)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+            return None
+        if not isinstance(state, cls) or getattr(state, "format", None) != STATE_FORMAT:
+            return None
+        complete = True
+        try:
+            with open(_delta_path(path), "rb") as fh:
+                while True:
+                    try:
+                        token, base, version, ops = pickle.load(fh)
+                    except EOFError:
+                        break
+                    if token != state._token or base != state.version:
+                        # Written by a state that diverged from this chain; stop here
+                        complete = False
+                        break
+                    state._replay_ops(ops)
+                    state.version = version
+                    state._deltas += 1
+        except FileNotFoundError:
+            pass
+        except (OSError, pickle.UnpicklingError, ValueError, AttributeError, ImportError):
+            # A record cut short by a crash mid-append
+            complete = False
+        # A broken chain is not appended to; the next save rewrites the snapshot
+        state._ops = [] if complete else None
+        state._saved_version = state.version
+        return state
+
+
+def _delta_path(path: str) -> str:
+    return f"{path}.delta"
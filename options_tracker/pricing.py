@@ -0,0 +1,249 @@
+"""
+Black-Scholes pricing, Greeks and implied vol for open positions.
+
+Everything is evaluated as NumPy arrays across all legs at once; the implied
+vol solver runs a safeguarded Newton iteration on the whole batch. Options are
+priced as European with a continuous dividend yield, which is an
+approximation for early-exercise American equity options.
+"""
+import math
+from typing import Any, Dict, Optional, Sequence, Union
+
+import numpy as np
+import pandas as pd
+
+from pl import OPTIONS_MULTIPLIER, OpenBook
+
+try:
+    from scipy.special import ndtr as _ndtr
+except ImportError:  # scipy is optional
+    _ndtr = None
+
+DAYS_PER_YEAR = 365.0
+# Vol bracket for the implied vol solver
+MIN_VOL = 1e-4
+MAX_VOL = 5.0
+
+GREEK_COLUMNS = ["theo", "delta", "gamma", "theta", "vega"]
+POSITION_COLUMNS = ["market_value", "position_delta", "position_gamma", "position_theta", "position_vega"]
+
+ArrayLike = Union[float, np.ndarray]
+PerLeg = Union[float, Dict[str, float], pd.Series, np.ndarray]
+
+
+def _norm_pdf(x: np.ndarray) -> np.ndarray:
+    return np.exp(-0.5 * x * x) / math.sqrt(2.0 * math.pi)
+
+
+def _norm_cdf(x: np.ndarray) -> np.ndarray:
+    if _ndtr is not None:
+        return _ndtr(x)
+    # Zelen & Severo (A&S 26.2.17), |error| < 7.5e-8
+    t = 1.0 / (1.0 + 0.2316419 * np.abs(x))
+    poly = t * (0.319381530 + t * (-0.356563782 + t * (1.781477937 + t * (-1.821255978 + t * 1.330274429))))
+    tail = _norm_pdf(x) * poly
+    return np.where(x >= 0, 1.0 - tail, tail)
+
+
+def theoretical_value(
+    spot: ArrayLike,
+    strike: ArrayLike,
+    years: ArrayLike,
+    rate: ArrayLike,
+    vol: ArrayLike,
+    is_call: ArrayLike,
+    dividend_yield: ArrayLike = 0.0,
+) -> np.ndarray:
+    """Black-Scholes value only (intrinsic once expired); broadcasts its inputs."""
+    live = (np.asarray(years) > 0) & (np.asarray(vol) > 0)
+    t = np.where(live, years, 1.0)
+    sigma = np.where(live, vol, 1.0)
+    sign = np.where(is_call, 1.0, -1.0)
+    sig_t = sigma * np.sqrt(t)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        d1 = (np.log(spot / strike) + (rate - dividend_yield) * t) / sig_t + 0.5 * sig_t
+    value = sign * (spot * np.exp(-dividend_yield * t) * _norm_cdf(sign * d1)
+                    - strike * np.exp(-rate * t) * _norm_cdf(sign * (d1 - sig_t)))
+    return np.where(live, value, np.maximum(sign * (spot - strike), 0.0))
+
+
+def black_scholes(
+    spot: ArrayLike,
+    strike: ArrayLike,
+    years: ArrayLike,
+    rate: ArrayLike,
+    vol: ArrayLike,
+    is_call: ArrayLike,
+    dividend_yield: ArrayLike = 0.0,
+) -> Dict[str, np.ndarray]:
+    """
+    Per-option value and Greeks. Theta is per calendar day and vega per one
+    vol point (0.01). Expired legs (``years <= 0``) are worth intrinsic value.
+    """
+    spot, strike, years, rate, vol, is_call, q = np.broadcast_arrays(
+        *(np.asarray(a, dtype=np.float64) for a in (spot, strike, years, rate, vol, is_call, dividend_yield))
+    )
+    is_call = is_call.astype(bool)
+    live = (years > 0) & (vol > 0)
+    t = np.where(live, years, 1.0)
+    sigma = np.where(live, vol, 1.0)
+    sqrt_t = np.sqrt(t)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        d1 = (np.log(spot / strike) + (rate - q + 0.5 * sigma * sigma) * t) / (sigma * sqrt_t)
+    d2 = d1 - sigma * sqrt_t
+    disc_q = np.exp(-q * t)
+    disc_r = np.exp(-rate * t)
+    pdf = _norm_pdf(d1)
+    cdf_d1 = _norm_cdf(np.where(is_call, d1, -d1))
+    cdf_d2 = _norm_cdf(np.where(is_call, d2, -d2))
+    sign = np.where(is_call, 1.0, -1.0)
+
+    value = sign * (spot * disc_q * cdf_d1 - strike * disc_r * cdf_d2)
+    delta = sign * disc_q * cdf_d1
+    gamma = disc_q * pdf / (spot * sigma * sqrt_t)
+    theta = (
+        -spot * disc_q * pdf * sigma / (2.0 * sqrt_t)
+        + sign * (q * spot * disc_q * cdf_d1 - rate * strike * disc_r * cdf_d2)
+    ) / DAYS_PER_YEAR
+    vega = spot * disc_q * pdf * sqrt_t / 100.0
+
+    intrinsic = np.maximum(sign * (spot - strike), 0.0)
+    expired_delta = np.where(intrinsic > 0, sign, 0.0)
+    return {
+        "theo": np.where(live, value, intrinsic),
+        "delta": np.where(live, delta, expired_delta),
+        "gamma": np.where(live, gamma, 0.0),
+        "theta": np.where(live, theta, 0.0),
+        "vega": np.where(live, vega, 0.0),
+    }
+
+
+def implied_vol(
+    price: ArrayLike,
+    spot: ArrayLike,
+    strike: ArrayLike,
+    years: ArrayLike,
+    rate: ArrayLike,
+    is_call: ArrayLike,
+    dividend_yield: ArrayLike = 0.0,
+    tol: float = 1e-6,
+    max_iter: int = 60,
+) -> np.ndarray:
+    """
+    Implied vol for a batch of option prices.
+
+    Every leg takes a Newton step per iteration; a step that leaves the
+    current [lo, hi] bracket (or has no vega to work with) bisects instead,
+    so the batch converges even for deep ITM/OTM legs. Prices outside the
+    no-arbitrage bounds or beyond the values at MIN_VOL and MAX_VOL, and
+    expired legs, give NaN.
+    """
+    arrays = np.broadcast_arrays(
+        *(np.asarray(a, dtype=np.float64) for a in (price, spot, strike, years, rate, is_call, dividend_yield))
+    )
+    shape = arrays[0].shape
+    price, spot, strike, years, rate, is_call, q = (a.ravel() for a in arrays)
+    sign = np.where(is_call.astype(bool), 1.0, -1.0)
+    t = np.maximum(years, 0.0)
+    lower = np.maximum(sign * (spot * np.exp(-q * t) - strike * np.exp(-rate * t)), 0.0)
+    upper = np.where(sign > 0, spot * np.exp(-q * t), strike * np.exp(-rate * t))
+    solvable = (years > 0) & np.isfinite(price) & (price > lower) & (price < upper)
+    # Prices that need a vol outside [MIN_VOL, MAX_VOL] have no solution in the bracket
+    with np.errstate(invalid="ignore"):
+        solvable &= (price >= theoretical_value(spot, strike, t, rate, MIN_VOL, is_call, q) - tol) \
+            & (price <= theoretical_value(spot, strike, t, rate, MAX_VOL, is_call, q) + tol)
+
+    lo = np.full(price.shape, MIN_VOL)
+    hi = np.full(price.shape, MAX_VOL)
+    vol = np.full(price.shape, 0.3)
+    active = solvable.copy()
+    for _ in range(max_iter):
+        if not active.any():
+            break
+        idx = np.nonzero(active)[0]
+        greeks = black_scholes(spot[idx], strike[idx], t[idx], rate[idx], vol[idx], is_call[idx], q[idx])
+        diff = greeks["theo"] - price[idx]
+        done = np.abs(diff) < tol
+        # Value rises with vol, so the sign of the error tightens the bracket
+        lo[idx] = np.where(diff < 0, vol[idx], lo[idx])
+        hi[idx] = np.where(diff > 0, vol[idx], hi[idx])
+        vega = greeks["vega"] * 100.0
+        with np.errstate(divide="ignore", invalid="ignore"):
+            step = vol[idx] - diff / vega
+        bisect = ~np.isfinite(step) | (step <= lo[idx]) | (step >= hi[idx])
+        vol[idx] = np.where(done, vol[idx], np.where(bisect, 0.5 * (lo[idx] + hi[idx]), step))
+        active[idx] = ~done & (hi[idx] - lo[idx] > tol)
+    return np.where(solvable, vol, np.nan).reshape(shape)
+
+
+def _per_leg(value: PerLeg, symbols: pd.Series) -> np.ndarray:
+    """Scalar, per-symbol mapping or per-leg array -> one float per leg."""
+    if isinstance(value, (dict, pd.Series)):
+        return symbols.map(value).to_numpy(dtype=np.float64)
+    return np.broadcast_to(np.asarray(value, dtype=np.float64), (len(symbols),)).copy()
+
+
+def price_positions(
+    open_positions: pd.DataFrame,
+    spot: PerLeg,
+    rate: PerLeg = 0.0,
+    vol: Optional[PerLeg] = None,
+    marks: Optional[pd.DataFrame] = None,
+    valuation_date: Optional[Any] = None,
+    dividend_yield: PerLeg = 0.0,
+    book: Optional[OpenBook] = None,
+) -> pd.DataFrame:
+    """
+    Theoretical value and Greeks for every open leg.
+
+    `spot`, `rate`, `vol` and `dividend_yield` may be scalars, per-symbol
+    mappings or per-leg arrays. With `marks` (same layout as for
+    ``pl.mark_to_market``) each leg's implied vol is solved from its mark and
+    used where `vol` is not given. Per-option columns (``theo``, ``delta``,
+    ...) are joined by position columns scaled by side, quantity and the
+    contract multiplier.
+    """
+    book = book if book is not None else OpenBook.from_positions(open_positions)
+    legs = book.positions
+    if legs.empty:
+        return legs.assign(**{col: pd.Series(dtype=float) for col in
+                              ["spot", "years", "mark", "implied_vol", "vol"] + GREEK_COLUMNS + POSITION_COLUMNS})
+    symbols = legs["symbol"].astype(str)
+    valuation = pd.Timestamp(valuation_date) if valuation_date is not None else pd.Timestamp.now().normalize()
+    years = ((pd.to_datetime(legs["expiry"]) - valuation).dt.days.to_numpy() / DAYS_PER_YEAR)
+    s = _per_leg(spot, symbols)
+    r = _per_leg(rate, symbols)
+    q = _per_leg(dividend_yield, symbols)
+    strike = legs["strike"].to_numpy(dtype=np.float64)
+    is_call = legs["option_type"].astype(str).str.upper().to_numpy() == "C"
+
+    mark = np.full(len(legs), np.nan)
+    iv = np.full(len(legs), np.nan)
+    if marks is not None:
+        _, matrix = book.mark_matrix(marks)
+        mark = matrix[0]
+        iv = implied_vol(mark, s, strike, years, r, is_call, q)
+    sigma = iv if vol is None else _per_leg(vol, symbols)
+    if vol is not None:
+        # Explicit vols win, solved vols fill gaps
+        sigma = np.where(np.isnan(sigma), iv, sigma)
+
+    greeks = black_scholes(s, strike, years, r, sigma, is_call, q)
+    scale = book.sign * book.quantity * OPTIONS_MULTIPLIER
+    priced = legs.assign(spot=s, years=years, mark=mark, implied_vol=iv, vol=sigma, **greeks)
+    return priced.assign(
+        market_value=scale * np.where(np.isnan(mark), greeks["theo"], mark),
+        position_delta=scale * greeks["delta"],
+        position_gamma=scale * greeks["gamma"],
+        position_theta=scale * greeks["theta"],
+        position_vega=scale * greeks["vega"],
+    )
+
+
+def aggregate_greeks(priced: pd.DataFrame, by: Union[str, Sequence[str]] = "symbol") -> pd.DataFrame:
+    """Sum the position columns of `price_positions` by symbol, group_id or any leg columns."""
+    by = [by] if isinstance(by, str) else list(by)
+    missing = [col for col in by if col not in priced.columns]
+    if missing:
+        raise ValueError(f"Cannot aggregate by missing columns {missing}")
+    return priced.groupby(by, dropna=False)[POSITION_COLUMNS].sum().reset_index()
@@ -0,0 +1,175 @@
+"""
+Scenario (stress) grids over the open book.
+
+Every leg is revalued under each combination of underlying move, vol shift and
+days forward. A block of scenarios is one broadcasted (scenario x leg) array
+expression; P/L is rolled up to symbols or groups with a single matrix product.
+Grids are split along the scenario axis into blocks sized to a memory budget;
+large grids run the blocks on a process pool when there is more than one CPU.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Iterable, Optional, Sequence, Union
+
+import numpy as np
+import pandas as pd
+
+from pl import OPTIONS_MULTIPLIER, OpenBook, OpenPosition
+from pricing import DAYS_PER_YEAR, MIN_VOL, PerLeg, _per_leg, price_positions, theoretical_value
+
+# Peak bytes per scenario x leg cell while a block is evaluated (about 15
+# float64 temporaries in theoretical_value); blocks are sized so all blocks in
+# flight stay within MEMORY_BUDGET
+BYTES_PER_CELL = 128
+MEMORY_BUDGET = 512 * 2**20
+# Below this many cells (about a second of work) starting a pool costs more than it saves
+POOL_MIN_CELLS = 5_000_000
+
+DEFAULT_SPOT_MOVES = np.linspace(-0.20, 0.20, 41)
+DEFAULT_VOL_SHIFTS = np.linspace(-0.10, 0.10, 21)
+DEFAULT_DAYS_FORWARD = np.arange(10)
+
+
+@dataclass
+class ScenarioCube:
+    """P/L per (spot move, vol shift, days forward, group), relative to today's theoretical value."""
+    pnl: np.ndarray
+    spot_moves: np.ndarray
+    vol_shifts: np.ndarray
+    days_forward: np.ndarray
+    groups: pd.Index
+
+    @property
+    def total(self) -> np.ndarray:
+        """Book-wide P/L per (spot move, vol shift, days forward)."""
+        return self.pnl.sum(axis=-1)
+
+    def heatmap(self, days: int = 0, group: Optional[Any] = None) -> pd.DataFrame:
+        """Spot move x vol shift P/L for one days-forward slice; all groups summed unless `group` is given."""
+        d = int(np.searchsorted(self.days_forward, days))
+        d = min(d, len(self.days_forward) - 1)
+        grid = self.total[:, :, d] if group is None else self.pnl[:, :, d, self.groups.get_loc(group)]
+        return pd.DataFrame(
+            grid,
+            index=pd.Index(self.spot_moves, name="spot_move"),
+            columns=pd.Index(self.vol_shifts, name="vol_shift"),
+        )
+
+    def to_frame(self) -> pd.DataFrame:
+        """Long format: one row per scenario and group."""
+        index = pd.MultiIndex.from_product(
+            [self.spot_moves, self.vol_shifts, self.days_forward, self.groups],
+            names=["spot_move", "vol_shift", "days_forward", self.groups.name or "group"],
+        )
+        return pd.DataFrame({"pnl": self.pnl.ravel()}, index=index).reset_index()
+
+
+def _positions_frame(positions: Union[pd.DataFrame, Iterable[OpenPosition]]) -> pd.DataFrame:
+    if isinstance(positions, pd.DataFrame):
+        return positions
+    return pd.DataFrame([p.__dict__ for p in positions])
+
+
+def _block_pnl(
+    spot: np.ndarray,
+    strike: np.ndarray,
+    years: np.ndarray,
+    rate: np.ndarray,
+    vol: np.ndarray,
+    is_call: np.ndarray,
+    dividend_yield: np.ndarray,
+    base: np.ndarray,
+    scale: np.ndarray,
+    onehot: np.ndarray,
+    moves: np.ndarray,
+    shifts: np.ndarray,
+    days: np.ndarray,
+) -> np.ndarray:
+    """P/L per (scenario, group) for one block of flattened scenarios."""
+    shocked = theoretical_value(
+        spot * (1.0 + moves[:, None]),
+        strike,
+        years - days[:, None] / DAYS_PER_YEAR,
+        rate,
+        np.maximum(vol + shifts[:, None], MIN_VOL),
+        is_call,
+        dividend_yield,
+    )
+    return ((shocked - base) * scale) @ onehot
+
+
+def scenario_grid(
+    open_positions: Union[pd.DataFrame, Iterable[OpenPosition]],
+    spot: PerLeg,
+    vol: PerLeg,
+    rate: PerLeg = 0.0,
+    spot_moves: Sequence[float] = DEFAULT_SPOT_MOVES,
+    vol_shifts: Sequence[float] = DEFAULT_VOL_SHIFTS,
+    days_forward: Sequence[int] = DEFAULT_DAYS_FORWARD,
+    by: str = "symbol",
+    valuation_date: Optional[Any] = None,
+    dividend_yield: PerLeg = 0.0,
+    max_workers: Optional[int] = None,
+) -> ScenarioCube:
+    """
+    Revalue the book under every (spot move, vol shift, days forward) scenario.
+
+    Spot moves are relative (0.05 = +5%), vol shifts absolute (0.02 = +2 vol
+    points). `spot`, `vol`, `rate` and `dividend_yield` take the same forms as
+    in ``pricing.price_positions``. P/L is summed per `by` column (``symbol``,
+    or ``group_id`` for ``PLResult.open_lots``, whose lots keep their
+    opening group). The grid is evaluated in
+    blocks that keep the temporaries within MEMORY_BUDGET; with more than one
+    CPU (or `max_workers`) and at least POOL_MIN_CELLS scenario x leg cells,
+    blocks run on a process pool (``max_workers=1`` keeps everything
+    in-process).
+    """
+    open_positions = _positions_frame(open_positions)
+    moves = np.asarray(spot_moves, dtype=np.float64)
+    shifts = np.asarray(vol_shifts, dtype=np.float64)
+    days = np.asarray(days_forward)
+    if open_positions.empty:
+        return ScenarioCube(np.zeros((len(moves), len(shifts), len(days), 0)), moves, shifts, days, pd.Index([], name=by))
+    if by not in open_positions.columns:
+        raise ValueError(f"Cannot aggregate scenarios by missing column {by}")
+
+    book = OpenBook.from_positions(open_positions)
+    priced = price_positions(open_positions, spot, rate, vol=vol, valuation_date=valuation_date,
+                             dividend_yield=dividend_yield, book=book)
+    group_codes, groups = pd.factorize(priced[by], use_na_sentinel=False)
+    onehot = np.zeros((len(priced), len(groups)))
+    onehot[np.arange(len(priced)), group_codes] = 1.0
+    symbols = priced["symbol"].astype(str)
+    legs = dict(
+        spot=priced["spot"].to_numpy(),
+        strike=priced["strike"].to_numpy(dtype=np.float64),
+        years=priced["years"].to_numpy(),
+        rate=_per_leg(rate, symbols),
+        vol=priced["vol"].to_numpy(),
+        is_call=priced["option_type"].astype(str).str.upper().to_numpy() == "C",
+        dividend_yield=_per_leg(dividend_yield, symbols),
+        base=priced["theo"].to_numpy(),
+        scale=book.sign * book.quantity * OPTIONS_MULTIPLIER,
+        onehot=onehot,
+    )
+
+    # Flatten the grid so blocks can split it anywhere
+    grid_moves, grid_shifts, grid_days = (a.ravel() for a in np.meshgrid(moves, shifts, days, indexing="ij"))
+    cells = len(grid_moves) * len(priced)
+    workers = max_workers if max_workers is not None else (os.cpu_count() or 1)
+    if cells < POOL_MIN_CELLS:
+        workers = 1
+    # Every worker holds one block at a time
+    block = max(1, MEMORY_BUDGET // (BYTES_PER_CELL * workers * len(priced)))
+    starts = range(0, len(grid_moves), block)
+    blocks = [(grid_moves[i:i + block], grid_shifts[i:i + block], grid_days[i:i + block]) for i in starts]
+    workers = min(workers, len(blocks))
+    if workers <= 1:
+        parts = [_block_pnl(**legs, moves=m, shifts=s, days=d) for m, s, d in blocks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(_block_pnl, **legs, moves=m, shifts=s, days=d) for m, s, d in blocks]
+            parts = [future.result() for future in futures]
+    pnl = np.concatenate(parts).reshape(len(moves), len(shifts), len(days), len(groups))
+    return ScenarioCube(pnl, moves, shifts, days, pd.Index(groups, name=by))
@@ -0,0 +1,181 @@
+"""
+SQLite trade store for the storage layer.
+
+Dates are stored as ISO text (expiry as YYYY-MM-DD, trade_datetime as
+YYYY-MM-DD HH:MM:SS), which sorts and range-filters chronologically. The
+database runs in WAL mode so app sessions keep reading while one writes.
+A `meta.version` counter is bumped in the same transaction as every write
+and serves as the change stamp.
+"""
+import datetime as dt
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import pandas as pd
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS trades (
+    id INTEGER PRIMARY KEY,
+    group_id INTEGER,
+    symbol TEXT,
+    expiry TEXT,
+    strike REAL,
+    option_type TEXT,
+    action TEXT,
+    quantity INTEGER,
+    price REAL,
+    fees REAL,
+    trade_datetime TEXT,
+    note TEXT,
+    account TEXT
+);
+CREATE INDEX IF NOT EXISTS trades_leg ON trades (symbol, expiry, strike, option_type);
+CREATE INDEX IF NOT EXISTS trades_group ON trades (group_id);
+CREATE INDEX IF NOT EXISTS trades_datetime ON trades (trade_datetime);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL);
+INSERT OR IGNORE INTO meta (key, value) VALUES ('version', 0);
+"""
+# Columns added after the first schema; databases created before get them on open,
+# with existing rows filled (account: storage.DEFAULT_ACCOUNT)
+ADDED_COLUMNS = {"account": "TEXT DEFAULT 'default'"}
+ADDED_INDEXES = "CREATE INDEX IF NOT EXISTS trades_account ON trades (account, trade_datetime);"
+
+
+def _sql_value(value: Any) -> Any:
+    if value is None or value is pd.NA or value is pd.NaT:
+        return None
+    if isinstance(value, float) and value != value:
+        return None
+    if isinstance(value, dt.datetime):
+        return value.strftime("%Y-%m-%d %H:%M:%S")
+    if isinstance(value, dt.date):
+        return value.strftime("%Y-%m-%d")
+    if hasattr(value, "item"):
+        return value.item()
+    return value
+
+
+def _sql_column(series: pd.Series) -> List[Any]:
+    """`_sql_value` over a whole typed column."""
+    if pd.api.types.is_datetime64_any_dtype(series):
+        series = series.dt.strftime("%Y-%m-%d %H:%M:%S")
+    elif series.dtype == object:
+        present = series.dropna()
+        first = present.iloc[0] if len(present) else None
+        if isinstance(first, dt.date):
+            fmt = "%Y-%m-%d %H:%M:%S" if isinstance(first, dt.datetime) else "%Y-%m-%d"
+            series = pd.to_datetime(series).dt.strftime(fmt)
+    return series.astype(object).where(series.notna(), None).tolist()
+
+
+class SqliteStore:
+    def __init__(self, path: str, columns: Sequence[str]) -> None:
+        self.path = path
+        self.columns = list(columns)
+        # One connection per thread; Streamlit runs each session in its own thread
+        self._local = threading.local()
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, isolation_level=None, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(SCHEMA)
+            existing = {row[1] for row in conn.execute("PRAGMA table_info(trades)")}
+            for column, sql_type in ADDED_COLUMNS.items():
+                if column not in existing:
+                    conn.execute(f"ALTER TABLE trades ADD COLUMN {column} {sql_type}")
+            conn.executescript(ADDED_INDEXES)
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _write(self) -> Iterator[sqlite3.Connection]:
+        """Write transaction that also bumps the version counter."""
+        conn = self.conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+            conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'version'")
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def version(self) -> int:
+        return int(self.conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()[0])
+
+    def read(
+        self,
+        symbol: Optional[str] = None,
+        start: Optional[Any] = None,
+        end: Optional[Any] = None,
+        group_id: Optional[int] = None,
+        trade_id: Optional[int] = None,
+        account: Optional[str] = None,
+    ) -> pd.DataFrame:
+        """Raw rows ordered by trade time; every filter is served by an index."""
+        clauses: List[str] = []
+        params: List[Any] = []
+        if trade_id is not None:
+            clauses.append("id = ?")
+            params.append(int(trade_id))
+        if symbol is not None:
+            clauses.append("symbol = ?")
+            params.append(symbol)
+        if group_id is not None:
+            clauses.append("group_id = ?")
+            params.append(int(group_id))
+        if account is not None:
+            clauses.append("account = ?")
+            params.append(account)
+        if start is not None:
+            clauses.append("trade_datetime >= ?")
+            params.append(_sql_value(pd.Timestamp(start).to_pydatetime()))
+        if end is not None:
+            clauses.append("trade_datetime <= ?")
+            params.append(_sql_value(pd.Timestamp(end).to_pydatetime()))
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        sql = f"SELECT {', '.join(self.columns)} FROM trades{where} ORDER BY trade_datetime, id"
+        return pd.read_sql_query(sql, self.conn, params=params)
+
+    def max_id(self) -> int:
+        return int(self.conn.execute("SELECT COALESCE(MAX(id), 0) FROM trades").fetchone()[0])
+
+    def _rows(self, df: pd.DataFrame) -> List[Tuple]:
+        return list(zip(*(_sql_column(df[col]) for col in self.columns)))
+
+    def upsert(self, row: Dict[str, Any]) -> int:
+        """Insert or replace by id; a missing id gets MAX(id) + 1 inside the transaction."""
+        values = [_sql_value(row.get(col)) for col in self.columns]
+        placeholders = ", ".join("?" for _ in self.columns)
+        with self._write() as conn:
+            if not values[0]:
+                values[0] = self.max_id() + 1
+            conn.execute(f"INSERT OR REPLACE INTO trades ({', '.join(self.columns)}) VALUES ({placeholders})", values)
+        return int(values[0])
+
+    def insert_many(self, df: pd.DataFrame) -> List[int]:
+        """Append rows, assigning fresh ids after the current maximum."""
+        with self._write() as conn:
+            start_id = self.max_id() + 1
+            df = df.assign(id=range(start_id, start_id + len(df)))
+            placeholders = ", ".join("?" for _ in self.columns)
+            conn.executemany(f"INSERT INTO trades ({', '.join(self.columns)}) VALUES ({placeholders})", self._rows(df))
+        return list(range(start_id, start_id + len(df)))
+
+    def delete(self, trade_id: int) -> None:
+        with self._write() as conn:
+            conn.execute("DELETE FROM trades WHERE id = ?", (int(trade_id),))
+
+    def replace_all(self, df: pd.DataFrame) -> None:
+        placeholders = ", ".join("?" for _ in self.columns)
+        with self._write() as conn:
+            conn.execute("DELETE FROM trades")
+            conn.executemany(f"INSERT OR REPLACE INTO trades ({', '.join(self.columns)}) VALUES ({placeholders})", self._rows(df))
@@ -1,9 +1,38 @@
+import argparse
+import datetime as dt
 import os
-from typing import Optional
+import time
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterator, List, Optional, Tuple
+import numpy as np
 import pandas as pd
 from dateutil import parser
 
+import instrument
+
+if TYPE_CHECKING:
+    from columnar import ColumnarTable
+    from sqlite_store import SqliteStore
+    from trade_log import TradeLog
+
 TRADES_CSV_PATH = os.environ.get("OPTIONS_TRADES_CSV", "/workspace/options_tracker/trades.csv")
+# "csv" rewrites trades.csv on every change; "log" treats it as a snapshot and
+# appends changes to TRADES_LOG_PATH until the next compaction; "parquet" and
+# "arrow" keep a typed columnar table at TRADES_COLUMNAR_PATH instead of the CSV;
+# "sqlite" keeps an indexed WAL-mode database at TRADES_SQLITE_PATH.
+STORAGE_BACKEND = os.environ.get("OPTIONS_TRADES_BACKEND", "csv")
+# Backends (and journal extensions) stored by columnar.ColumnarTable
+COLUMNAR_FORMATS = ("parquet", "arrow")
+TRADES_LOG_PATH = os.environ.get("OPTIONS_TRADES_LOG", os.path.splitext(TRADES_CSV_PATH)[0] + ".log.jsonl")
+TRADES_COLUMNAR_PATH = os.environ.get(
+    "OPTIONS_TRADES_COLUMNAR",
+    os.path.splitext(TRADES_CSV_PATH)[0] + (".arrow" if STORAGE_BACKEND == "arrow" else ".parquet"),
+)
+TRADES_SQLITE_PATH = os.environ.get("OPTIONS_TRADES_SQLITE", os.path.splitext(TRADES_CSV_PATH)[0] + ".sqlite")
+# The active backend's file; derived state (P/L state, equity curve, marks, account cache) lives next to it
+TRADES_STORE_PATH = {
+    "sqlite": TRADES_SQLITE_PATH, "parquet": TRADES_COLUMNAR_PATH, "arrow": TRADES_COLUMNAR_PATH,
+}.get(STORAGE_BACKEND, TRADES_CSV_PATH)
 
 TRADE_COLUMNS = [
     "id",
@@ -18,50 +47,377 @@ TRADE_COLUMNS = [
     "fees",
     "trade_datetime",
     "note",
+    "account",
 ]
+# Trades without an account (journals from before accounts) belong to this one
+DEFAULT_ACCOUNT = "default"
 
 ACTION_VALUES = {"BTO", "STO", "BTC", "STC"}
 OPTION_TYPES = {"C", "P"}
 
+# pandas' default NA strings, passed explicitly to the pyarrow CSV parser
+CSV_NA_VALUES = [
+    "", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan", "1.#IND", "1.#QNAN",
+    "<NA>", "N/A", "NA", "NULL", "NaN", "None", "n/a", "nan", "null",
+]
+
+IMPORT_CHUNK_ROWS = 50_000
+MAX_REJECTED_KEPT = 1_000
+
+# Backend modules are imported on first use, so a process reading one journal loads only its backend
+_trade_log: Optional["TradeLog"] = None
+_columnar_table: Optional["ColumnarTable"] = None
+_sqlite_store: Optional["SqliteStore"] = None
+_upgraded_csvs: set = set()
+
+
+def _use_log() -> bool:
+    return STORAGE_BACKEND == "log"
+
+
+def _log() -> "TradeLog":
+    """The append-only log at TRADES_LOG_PATH (only written with the log backend)."""
+    global _trade_log
+    if _trade_log is None:
+        from trade_log import TradeLog
+        _trade_log = TradeLog(TRADES_LOG_PATH)
+    return _trade_log
+
+
+def _columnar() -> Optional["ColumnarTable"]:
+    """The columnar table when a Parquet/Arrow backend is selected, else None."""
+    global _columnar_table
+    if STORAGE_BACKEND not in COLUMNAR_FORMATS:
+        return None
+    if _columnar_table is None:
+        from columnar import ColumnarTable
+        _columnar_table = ColumnarTable(TRADES_COLUMNAR_PATH, STORAGE_BACKEND)
+    return _columnar_table
+
+
+def _sqlite() -> Optional["SqliteStore"]:
+    """The SQLite store when the sqlite backend is selected, else None."""
+    global _sqlite_store
+    if STORAGE_BACKEND != "sqlite":
+        return None
+    if _sqlite_store is None:
+        from sqlite_store import SqliteStore
+        _sqlite_store = SqliteStore(TRADES_SQLITE_PATH, TRADE_COLUMNS)
+    return _sqlite_store
+
+
+def _table_path() -> str:
+    if _sqlite() is not None:
+        return TRADES_SQLITE_PATH
+    return TRADES_COLUMNAR_PATH if _columnar() is not None else TRADES_CSV_PATH
+
+
+def _upgrade_csv(path: str) -> None:
+    """
+    Rewrite a CSV written before a column was added (``account``) with the
+    current columns, so rows appended to it line up with the header. Values
+    are copied as text; the new column is left empty.
+    """
+    if path in _upgraded_csvs:
+        return
+    with open(path) as f:
+        header = f.readline().strip()
+    if header and header.split(",") != TRADE_COLUMNS:
+        df = pd.read_csv(path, dtype=str, keep_default_na=False).reindex(columns=TRADE_COLUMNS, fill_value="")
+        tmp_path = f"{path}.tmp"
+        df.to_csv(tmp_path, index=False)
+        os.replace(tmp_path, path)
+    _upgraded_csvs.add(path)
+
 
 def ensure_storage() -> None:
-    os.makedirs(os.path.dirname(TRADES_CSV_PATH), exist_ok=True)
-    if not os.path.exists(TRADES_CSV_PATH):
+    store = _sqlite()
+    if store is not None:
+        store.conn  # creates the schema on first use
+        return
+    path = _table_path()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if not os.path.exists(path):
         df = pd.DataFrame(columns=TRADE_COLUMNS)
-        df.to_csv(TRADES_CSV_PATH, index=False)
+        table = _columnar()
+        if table is not None:
+            table.write(_coerce_types(df))
+        else:
+            df.to_csv(path, index=False)
+    elif _columnar() is None:
+        _upgrade_csv(path)
+
+
+def _distinct(series: pd.Series, convert: Callable[[pd.Series], Any]) -> np.ndarray:
+    """
+    `convert` applied to the distinct values only (``str`` means ``astype(str)``);
+    journals repeat a handful of symbols, expiries, codes and notes.
+    """
+    if series.dtype == object and series.isna().any():
+        # None and NaN factorize alike but convert to different strings
+        return np.asarray(series.astype(str) if convert is str else convert(series), dtype=object)
+    codes, uniques = pd.factorize(series, use_na_sentinel=False)
+    uniques = pd.Series(uniques, dtype=series.dtype)
+    converted = uniques.astype(str) if convert is str else convert(uniques)
+    return np.asarray(converted, dtype=object)[codes]
 
 
 def _coerce_types(df: pd.DataFrame) -> pd.DataFrame:
+    if "account" not in df.columns:
+        df["account"] = DEFAULT_ACCOUNT
     if df.empty:
         return df
     # Coerce dtypes
     df["id"] = pd.to_numeric(df["id"], errors="coerce").astype("Int64")
     df["group_id"] = pd.to_numeric(df["group_id"], errors="coerce").astype("Int64")
-    df["symbol"] = df["symbol"].astype(str)
+    df["symbol"] = _distinct(df["symbol"], str)
     # Expiry stored as date string YYYY-MM-DD
-    df["expiry"] = pd.to_datetime(df["expiry"], errors="coerce").dt.date
+    df["expiry"] = _distinct(df["expiry"], lambda uniques: pd.to_datetime(uniques, errors="coerce").dt.date)
     df["strike"] = pd.to_numeric(df["strike"], errors="coerce")
-    df["option_type"] = df["option_type"].astype(str).str.upper()
-    df["action"] = df["action"].astype(str).str.upper()
+    df["option_type"] = _distinct(df["option_type"], lambda uniques: uniques.astype(str).str.upper())
+    df["action"] = _distinct(df["action"], lambda uniques: uniques.astype(str).str.upper())
     df["quantity"] = pd.to_numeric(df["quantity"], errors="coerce").astype("Int64")
     df["price"] = pd.to_numeric(df["price"], errors="coerce")
     df["fees"] = pd.to_numeric(df["fees"], errors="coerce").fillna(0.0)
     df["trade_datetime"] = pd.to_datetime(df["trade_datetime"], errors="coerce")
-    df["note"] = df["note"].astype(str)
+    df["note"] = _distinct(df["note"], str)
+    account = df["account"]
+    df["account"] = _distinct(account.mask(account.isna() | (account == ""), DEFAULT_ACCOUNT), str)
+    return df
+
+
+def trades_version() -> Tuple:
+    """
+    Stamp that changes whenever the stored trades change: the table file's
+    (path, mtime_ns, size), plus the log size with the log backend. SQLite
+    uses its write counter instead of file stats, which WAL writes bypass.
+    """
+    store = _sqlite()
+    if store is not None:
+        return (TRADES_SQLITE_PATH, store.version())
+    ensure_storage()
+    path = _table_path()
+    st = os.stat(path)
+    if _use_log():
+        return (path, st.st_mtime_ns, st.st_size, _log().size())
+    return (path, st.st_mtime_ns, st.st_size)
+
+
+def _log_tail(old: Optional[Tuple], version: Tuple) -> Optional[Tuple[List[Dict[str, Any]], pd.DataFrame]]:
+    """
+    Log records appended between two log-backend versions with the same
+    snapshot, plus their put rows typed; None if `old` can't be caught up.
+    """
+    if not _use_log() or old is None or len(old) != 4 or old[:3] != version[:3] or old[3] > version[3]:
+        return None
+    records, _ = _log().read(old[3], version[3])
+    puts = _coerce_types(pd.DataFrame([r["row"] for r in records if r["op"] == "put"], columns=TRADE_COLUMNS))
+    return records, puts
+
+
+def _replay_log(snapshot: pd.DataFrame, records: List[Dict[str, Any]]) -> pd.DataFrame:
+    """Apply log records to the raw snapshot rows; the last record per id wins."""
+    if not records:
+        return snapshot
+    last: Dict[int, int] = {}
+    for i, record in enumerate(records):
+        last[int(record["row"]["id"]) if record["op"] == "put" else int(record["id"])] = i
+    puts = [records[i]["row"] for i in sorted(last.values()) if records[i]["op"] == "put"]
+    snapshot = snapshot[~pd.to_numeric(snapshot["id"], errors="coerce").isin(list(last))]
+    if not puts:
+        return snapshot.reset_index(drop=True)
+    puts = pd.DataFrame(puts, columns=TRADE_COLUMNS)
+    # Empty frames are left out of concat; pandas is changing how their dtypes count
+    return pd.concat([snapshot, puts], ignore_index=True) if not snapshot.empty else puts
+
+
+# Process-wide cache of the typed trades frame, keyed on trades_version()
+_trades_cache: Dict[str, Any] = {"version": None, "df": None}
+_cache_stats: Dict[str, float] = {"hits": 0, "misses": 0, "reload_seconds": 0.0, "last_reload_seconds": 0.0}
+
+
+def cache_stats() -> Dict[str, float]:
+    """Hit/miss counters and cumulative/last reload time of the load_trades cache."""
+    return dict(_cache_stats)
+
+
+def _cache_put(df: pd.DataFrame, version: Optional[Tuple]) -> None:
+    _trades_cache["df"] = df
+    _trades_cache["version"] = version
+
+
+def _cache_invalidate() -> None:
+    _cache_put(None, None)
+
+
+def _with_trades(df: pd.DataFrame, rows: pd.DataFrame) -> pd.DataFrame:
+    """Typed `df` with `rows` inserted, replacing rows with the same id."""
+    if rows.empty:
+        return df
+    rows = rows.assign(trade_datetime=rows["trade_datetime"].dt.floor("s"))
+    if not df.empty:
+        df = df[~df["id"].isin(rows["id"].dropna().tolist())]
+    df = pd.concat([df, rows], ignore_index=True) if not df.empty else rows.reset_index(drop=True)
+    return df.sort_values("trade_datetime", kind="stable").reset_index(drop=True)
+
+
+def _without_trade(df: pd.DataFrame, trade_id: int) -> pd.DataFrame:
+    return df if df.empty else df[df["id"] != trade_id].reset_index(drop=True)
+
+
+def _cache_after_write(previous: Tuple, change) -> None:
+    """
+    Apply a writer's change to the cached frame instead of re-reading, when
+    the cache was current before the write and nobody else wrote meanwhile.
+    """
+    version = trades_version()
+    cached = _trades_cache["df"]
+    store = _sqlite()
+    if cached is None or _trades_cache["version"] != previous or store is None or version[1] != previous[1] + 1:
+        _cache_invalidate()
+        return
+    _cache_put(change(cached), version)
+
+
+def _catch_up_cached_trades(version: Tuple) -> Optional[pd.DataFrame]:
+    """With the log backend, fold only newly appended records into the cached frame."""
+    cached = _trades_cache["df"]
+    tail = _log_tail(_trades_cache["version"], version) if cached is not None else None
+    if tail is None:
+        return None
+    records, puts = tail
+    df = cached
+    put_rows = iter(range(len(puts)))
+    for record in records:
+        if record["op"] == "put":
+            i = next(put_rows)
+            df = _with_trades(df, puts.iloc[i:i + 1])
+        else:
+            df = _without_trade(df, int(record["id"]))
     return df
 
 
 def load_trades() -> pd.DataFrame:
+    """
+    Current trades, typed and sorted by trade_datetime.
+
+    The frame is cached and shared process-wide until the stored trades change
+    (keyed on trades_version()): treat it as read-only and copy before mutating.
+    """
+    version = trades_version()
+    if _trades_cache["df"] is not None and _trades_cache["version"] == version:
+        _cache_stats["hits"] += 1
+        instrument.count("load_trades.cache_hit")
+        return _trades_cache["df"]
+    start = time.perf_counter()
+    with instrument.span("storage.load_trades") as span:
+        df = _catch_up_cached_trades(version)
+        if df is None:
+            df = _read_trades()
+        span.rows = len(df)
+    elapsed = time.perf_counter() - start
+    _cache_stats["misses"] += 1
+    instrument.count("load_trades.cache_miss")
+    _cache_stats["reload_seconds"] += elapsed
+    _cache_stats["last_reload_seconds"] = elapsed
+    _cache_put(df, version)
+    return df
+
+
+def _read_csv(path: str) -> pd.DataFrame:
+    """A trades CSV as raw columns; pyarrow's multithreaded parser when installed."""
+    try:
+        df = pd.read_csv(path, engine="pyarrow", na_values=CSV_NA_VALUES, keep_default_na=False)
+    except (ImportError, ValueError):
+        # No pyarrow, or a file its stricter parser rejects
+        return pd.read_csv(path)
+    if df.empty:
+        # A header-only file has no values to infer types from
+        return pd.read_csv(path)
+    # Match the C parser: NaN (not None) for missing text, nanosecond timestamps
+    for column in df.select_dtypes("object").columns:
+        if df[column].isna().any():
+            df[column] = df[column].fillna(np.nan)
+    for column in df.select_dtypes("datetime").columns:
+        df[column] = df[column].astype("datetime64[ns]")
+    return df
+
+
+def _with_account(df: pd.DataFrame) -> pd.DataFrame:
+    """A typed columnar frame with ``account`` filled (files from before accounts lack it)."""
+    if "account" not in df.columns:
+        df["account"] = DEFAULT_ACCOUNT
+    elif df["account"].isna().any():
+        df["account"] = df["account"].fillna(DEFAULT_ACCOUNT)
+    return df
+
+
+def read_journal(path: str) -> pd.DataFrame:
+    """
+    Typed, time-sorted trades of a journal file in any backend's format
+    (.csv, .parquet, .arrow or .sqlite by extension), regardless of the
+    configured backend and without touching any cache or state file.
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext in (".sqlite", ".db"):
+        from sqlite_store import SqliteStore
+        return _coerce_types(SqliteStore(path, TRADE_COLUMNS).read())
+    if ext[1:] in COLUMNAR_FORMATS:
+        from columnar import ColumnarTable
+        df = _with_account(ColumnarTable(path, ext[1:]).read())
+    else:
+        df = _coerce_types(_read_csv(path))
+    if not df.empty and not df["trade_datetime"].is_monotonic_increasing:
+        df = df.sort_values("trade_datetime", kind="stable").reset_index(drop=True)
+    return df
+
+
+def journal_version(path: str) -> Tuple:
+    """
+    Change stamp of a journal file, as trades_version is for the store: the
+    write counter for SQLite (WAL writes can leave the file's stats as they
+    are), else the file's (path, mtime_ns, size).
+    """
+    path = os.path.realpath(path)
+    st = os.stat(path)
+    if os.path.splitext(path)[1].lower() in (".sqlite", ".db"):
+        from sqlite_store import SqliteStore
+        # The inode tells a database copied over the path from one written in place
+        return (path, st.st_ino, SqliteStore(path, TRADE_COLUMNS).version())
+    return (path, st.st_mtime_ns, st.st_size)
+
+
+def _read_trades() -> pd.DataFrame:
     ensure_storage()
-    df = pd.read_csv(TRADES_CSV_PATH)
-    df = _coerce_types(df)
+    store = _sqlite()
+    if store is not None:
+        # Already ordered by the trade_datetime index
+        return _coerce_types(store.read())
+    table = _columnar()
+    if table is not None:
+        # Stored typed and time-sorted: no parsing, coercion or sort needed
+        with instrument.span("storage.read_columnar") as span:
+            df = _with_account(table.read())
+            span.rows = len(df)
+        if not df["trade_datetime"].is_monotonic_increasing:
+            df = df.sort_values("trade_datetime", kind="stable").reset_index(drop=True)
+        return df
+    with instrument.span("storage.read_csv") as span:
+        df = _read_csv(TRADES_CSV_PATH)
+        span.rows = len(df)
+    if _use_log():
+        with instrument.span("storage.replay_log"):
+            df = _replay_log(df, _log().read()[0])
+    with instrument.span("storage.coerce_types", rows=len(df)):
+        df = _coerce_types(df)
     # Ensure sorted by time
     if not df.empty:
-        df = df.sort_values("trade_datetime").reset_index(drop=True)
+        with instrument.span("storage.sort", rows=len(df)):
+            df = df.sort_values("trade_datetime", kind="stable").reset_index(drop=True)
     return df
 
 
-def save_trades(df: pd.DataFrame) -> None:
+def _write_snapshot(df: pd.DataFrame) -> None:
     ensure_storage()
     # Keep only known columns in order
     for col in TRADE_COLUMNS:
@@ -70,21 +426,114 @@ def save_trades(df: pd.DataFrame) -> None:
     df = df[TRADE_COLUMNS]
     # Normalize types for saving
     df = df.copy()
+    store = _sqlite()
+    if store is not None:
+        store.replace_all(_coerce_types(df))
+        return
+    table = _columnar()
+    if table is not None:
+        df = _coerce_types(df)
+        if not df.empty:
+            df = df.sort_values("trade_datetime", kind="stable").reset_index(drop=True)
+        table.write(df)
+        return
     df["expiry"] = pd.to_datetime(df["expiry"], errors="coerce").dt.strftime("%Y-%m-%d")
     df["trade_datetime"] = pd.to_datetime(df["trade_datetime"], errors="coerce").dt.strftime("%Y-%m-%d %H:%M:%S")
-    df.to_csv(TRADES_CSV_PATH, index=False)
+    # Write aside and rename so readers never see a half-written file
+    tmp_path = f"{TRADES_CSV_PATH}.tmp"
+    df.to_csv(tmp_path, index=False)
+    os.replace(tmp_path, TRADES_CSV_PATH)
+
+
+@instrument.timed("storage.save_trades")
+def save_trades(df: pd.DataFrame) -> None:
+    """Replace the whole trade table (with the log backend, also empties the log)."""
+    _cache_invalidate()
+    if not _use_log():
+        _write_snapshot(df)
+        return
+    with _log().locked():
+        _write_snapshot(df)
+        _log().truncate()
+
+
+def compact_trades() -> int:
+    """Fold the trade log into the CSV snapshot; returns the number of records folded."""
+    if not _use_log():
+        return 0
+    ensure_storage()
+    _cache_invalidate()
+    with _log().locked():
+        records, _ = _log().read()
+        if records:
+            df = _coerce_types(_replay_log(pd.read_csv(TRADES_CSV_PATH), records))
+            if not df.empty:
+                df = df.sort_values("trade_datetime", kind="stable").reset_index(drop=True)
+            _write_snapshot(df)
+        _log().truncate()
+    return len(records)
+
+
+_snapshot_max_id_cache: Tuple[Any, int] = (None, 0)
+
+
+def _snapshot_max_id() -> int:
+    """Highest id in the stored table, re-read only when the file changes."""
+    global _snapshot_max_id_cache
+    store = _sqlite()
+    if store is not None:
+        return store.max_id()
+    ensure_storage()
+    path = _table_path()
+    st = os.stat(path)
+    stamp = (path, st.st_mtime_ns, st.st_size)
+    if _snapshot_max_id_cache[0] != stamp:
+        table = _columnar()
+        ids = table.read(columns=["id"])["id"] if table is not None else pd.read_csv(path, usecols=["id"])["id"]
+        ids = pd.to_numeric(ids, errors="coerce")
+        _snapshot_max_id_cache = (stamp, 0 if ids.isna().all() else int(ids.max()))
+    return _snapshot_max_id_cache[1]
 
 
 def next_trade_id(df: Optional[pd.DataFrame] = None) -> int:
     if df is None:
-        df = load_trades()
+        log_max = _log().max_id() if _use_log() else None
+        return max(_snapshot_max_id(), log_max or 0) + 1
     if df.empty or df["id"].isna().all():
         return 1
     return int(df["id"].max()) + 1
 
 
-def upsert_trade(row: dict) -> pd.DataFrame:
-    df = load_trades()
+def _jsonable(value: Any) -> Any:
+    if value is None or value is pd.NA or value is pd.NaT:
+        return None
+    if isinstance(value, float) and np.isnan(value):
+        return None
+    if isinstance(value, dt.datetime):
+        return value.strftime("%Y-%m-%d %H:%M:%S")
+    if isinstance(value, dt.date):
+        return value.strftime("%Y-%m-%d")
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def _log_row(row: dict) -> dict:
+    return {col: _jsonable(row.get(col)) for col in TRADE_COLUMNS}
+
+
+def _typed_row(row: dict) -> dict:
+    return _coerce_types(pd.DataFrame([{col: row.get(col) for col in TRADE_COLUMNS}])).iloc[0].to_dict()
+
+
+@instrument.timed("storage.save_trade")
+def save_trade(row: dict) -> int:
+    """
+    Insert a trade, or replace the one with the same id; returns its id.
+
+    With the log backend this is a single fsync'd append, independent of
+    journal size.
+    """
     # Validate basics
     if row.get("action") not in ACTION_VALUES:
         raise ValueError(f"Invalid action {row.get('action')}")
@@ -98,26 +547,130 @@ def upsert_trade(row: dict) -> pd.DataFrame:
     if isinstance(row.get("trade_datetime"), str):
         row["trade_datetime"] = parser.parse(row["trade_datetime"])    
 
+    if _use_log():
+        return _log().put(_log_row(row), min_id=_snapshot_max_id() + 1)
+
+    import derived
+
+    store = _sqlite()
+    if store is not None:
+        state = derived.load_pl_state()
+        previous = state.version
+        row["id"] = store.upsert(row)
+        typed = _typed_row(row)
+        state.apply(typed)
+        _cache_after_write(previous, lambda df: _with_trades(df, _coerce_types(pd.DataFrame([typed], columns=TRADE_COLUMNS))))
+        derived._commit_pl_state(state, previous)
+        return int(row["id"])
+
+    df = load_trades()
     if not row.get("id"):
         row["id"] = next_trade_id(df)
 
+    state = derived.load_pl_state(df)
     # Convert to DataFrame row
-    new_df = pd.DataFrame([{col: row.get(col) for col in TRADE_COLUMNS}])
+    new_df = _coerce_types(pd.DataFrame([{col: row.get(col) for col in TRADE_COLUMNS}]))
+    # Stored timestamps keep whole seconds; match them so the cached frame equals a reload
+    new_df["trade_datetime"] = new_df["trade_datetime"].dt.floor("s")
     # Merge: replace if id exists, else append
     if (df["id"] == row["id"]).any():
         df = df[df["id"] != row["id"]]
-    df = pd.concat([df, new_df], ignore_index=True)
+    df = pd.concat([df, new_df], ignore_index=True) if not df.empty else new_df
     df = _coerce_types(df)
-    df = df.sort_values("trade_datetime").reset_index(drop=True)
+    df = df.sort_values("trade_datetime", kind="stable").reset_index(drop=True)
     save_trades(df)
-    return df
+    _cache_put(df, trades_version())
+    state.apply(new_df.iloc[0].to_dict())
+    derived._commit_pl_state(state)
+    return int(row["id"])
 
 
-def delete_trade(trade_id: int) -> pd.DataFrame:
+def upsert_trade(row: dict) -> pd.DataFrame:
+    save_trade(row)
+    return load_trades()
+
+
+def remove_trade(trade_id: int) -> None:
+    if _use_log():
+        _log().delete(trade_id)
+        return
+    import derived
+
+    store = _sqlite()
+    if store is not None:
+        state = derived.load_pl_state()
+        previous = state.version
+        store.delete(trade_id)
+        state.remove(trade_id)
+        _cache_after_write(previous, lambda df: _without_trade(df, trade_id))
+        derived._commit_pl_state(state, previous)
+        return
     df = load_trades()
+    state = derived.load_pl_state(df)
     df = df[df["id"] != trade_id].reset_index(drop=True)
     save_trades(df)
-    return df
+    _cache_put(df, trades_version())
+    state.remove(trade_id)
+    derived._commit_pl_state(state)
+
+
+def delete_trade(trade_id: int) -> pd.DataFrame:
+    remove_trade(trade_id)
+    return load_trades()
+
+
+def load_trades_filtered(
+    symbol: Optional[str] = None,
+    start: Optional[Any] = None,
+    end: Optional[Any] = None,
+    group_id: Optional[int] = None,
+    account: Optional[str] = None,
+) -> pd.DataFrame:
+    """
+    Trades matching every given filter (trade_datetime within [start, end]).
+
+    The sqlite backend answers from its indexes; other backends filter a full
+    load. An account, symbol or group subset is safe to pass to compute_pl
+    since legs never span them; a date window is not, as it drops the
+    opening lots.
+    """
+    store = _sqlite()
+    if store is not None:
+        return _coerce_types(store.read(symbol=symbol, start=start, end=end, group_id=group_id, account=account))
+    df = load_trades()
+    if df.empty:
+        return df
+    mask = pd.Series(True, index=df.index)
+    if symbol is not None:
+        mask &= df["symbol"] == symbol
+    if group_id is not None:
+        mask &= df["group_id"] == group_id
+    if account is not None:
+        mask &= df["account"] == account
+    if start is not None:
+        mask &= df["trade_datetime"] >= pd.Timestamp(start)
+    if end is not None:
+        mask &= df["trade_datetime"] <= pd.Timestamp(end)
+    return df[mask.fillna(False)].reset_index(drop=True)
+
+
+def get_trade(trade_id: int) -> Optional[dict]:
+    """One trade by id, or None."""
+    store = _sqlite()
+    df = _coerce_types(store.read(trade_id=trade_id)) if store is not None else load_trades()
+    if df.empty:
+        return None
+    match = df[df["id"] == trade_id]
+    return None if match.empty else match.iloc[0].to_dict()
+
+
+def migrate_csv(csv_path: Optional[str] = None) -> int:
+    """One-shot copy of a trades CSV into the selected Parquet/Arrow/SQLite store; returns rows written."""
+    if _columnar() is None and _sqlite() is None:
+        raise ValueError(f"Storage backend {STORAGE_BACKEND} already stores trades as CSV")
+    df = pd.read_csv(csv_path or TRADES_CSV_PATH)
+    _write_snapshot(df)
+    return len(df)
 
 
 def export_trades_csv(path: str) -> None:
@@ -125,18 +678,131 @@ def export_trades_csv(path: str) -> None:
     df.to_csv(path, index=False)
 
 
+@dataclass
+class ImportResult:
+    read: int = 0
+    imported: int = 0
+    rejected: int = 0
+    # First MAX_REJECTED_KEPT rejected rows with a "reason" column
+    rejected_rows: pd.DataFrame = field(default_factory=lambda: pd.DataFrame(columns=TRADE_COLUMNS + ["reason"]))
+
+
+def _validate_chunk(chunk: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Split a raw chunk into typed accepted rows and rejected rows with a reason."""
+    chunk = _coerce_types(chunk.reindex(columns=TRADE_COLUMNS).reset_index(drop=True))
+    if chunk.empty:
+        return chunk, chunk.assign(reason=pd.Series(dtype=object))
+    checks = [
+        (~chunk["action"].isin(ACTION_VALUES), "invalid action"),
+        (~chunk["option_type"].isin(OPTION_TYPES), "invalid option_type"),
+        (chunk["trade_datetime"].isna(), "missing trade_datetime"),
+        (chunk["expiry"].isna(), "missing expiry"),
+        (chunk["strike"].isna(), "missing strike"),
+        (chunk["quantity"].isna() | (chunk["quantity"] <= 0), "invalid quantity"),
+    ]
+    reason = pd.Series(None, index=chunk.index, dtype=object)
+    # Apply in reverse so each rejected row reports its first failing check
+    for mask, why in reversed(checks):
+        reason = reason.mask(mask.fillna(True).astype(bool), why)
+    bad = reason.notna()
+    return chunk[~bad].reset_index(drop=True), chunk[bad].assign(reason=reason[bad])
+
+
+def _csv_text(df: pd.DataFrame) -> pd.DataFrame:
+    df = df[TRADE_COLUMNS].copy()
+    df["expiry"] = pd.to_datetime(df["expiry"], errors="coerce").dt.strftime("%Y-%m-%d")
+    df["trade_datetime"] = pd.to_datetime(df["trade_datetime"], errors="coerce").dt.strftime("%Y-%m-%d %H:%M:%S")
+    return df
+
+
+def _append_chunks(chunks: Iterator[pd.DataFrame]) -> int:
+    """
+    Append typed chunks to the store without touching existing rows; returns
+    the number of writes. Log and SQLite assign ids themselves and write them
+    back into each chunk before the next one is drawn.
+    """
+    writes = 0
+    ensure_storage()
+    table = _columnar()
+    if table is not None:
+        table.append(chunks)
+        return 1
+    store = _sqlite()
+    for chunk in chunks:
+        if _use_log():
+            chunk["id"] = _log().put_many([_log_row(r) for r in chunk.assign(id=None).to_dict("records")], min_id=_snapshot_max_id() + 1)
+        elif store is not None:
+            chunk["id"] = store.insert_many(chunk)
+        else:
+            _csv_text(chunk).to_csv(TRADES_CSV_PATH, mode="a", header=False, index=False)
+        writes += 1
+    return writes
+
+
+def import_trades_stream(
+    source: Any,
+    chunksize: int = IMPORT_CHUNK_ROWS,
+    progress: Optional[Callable[[ImportResult], None]] = None,
+) -> ImportResult:
+    """
+    Stream a broker CSV (path or file object) into storage `chunksize` rows at a time.
+
+    Each chunk is typed and validated with vectorized checks, given fresh ids
+    in bulk (incoming ids are ignored) and appended without re-reading or
+    re-sorting existing trades, so memory is bounded by the chunk size.
+    `progress` is called after every chunk.
+    """
+    import derived
+
+    result = ImportResult()
+    rejected_parts: List[pd.DataFrame] = []
+    kept_rejected = 0
+    state = None if _use_log() else derived.load_pl_state()
+    previous = None if state is None else state.version
+    next_id = next_trade_id()
+
+    def accepted() -> Iterator[pd.DataFrame]:
+        nonlocal next_id, kept_rejected
+        for raw in pd.read_csv(source, chunksize=chunksize):
+            good, bad = _validate_chunk(raw)
+            result.read += len(raw)
+            result.rejected += len(bad)
+            if kept_rejected < MAX_REJECTED_KEPT and not bad.empty:
+                rejected_parts.append(bad.head(MAX_REJECTED_KEPT - kept_rejected))
+                kept_rejected += len(rejected_parts[-1])
+            if not good.empty:
+                good = good.sort_values("trade_datetime", kind="stable").reset_index(drop=True)
+                good["trade_datetime"] = good["trade_datetime"].dt.floor("s")
+                good["id"] = pd.array(range(next_id, next_id + len(good)), dtype="Int64")
+                next_id += len(good)
+                yield good
+                result.imported += len(good)
+                if state is not None:
+                    state.apply_many(good)
+            if progress is not None:
+                progress(result)
+
+    _cache_invalidate()
+    writes = _append_chunks(accepted())
+    _cache_invalidate()
+    if rejected_parts:
+        result.rejected_rows = pd.concat(rejected_parts, ignore_index=True)
+    if state is not None and result.imported:
+        derived._commit_pl_state(state, previous, writes)
+    return result
+
+
 def import_trades_csv(path: str) -> pd.DataFrame:
-    incoming = pd.read_csv(path)
-    incoming = _coerce_types(incoming)
-    # Simple append; avoid id collisions by reassigning ids
-    df = load_trades()
-    start_id = next_trade_id(df)
-    if not incoming.empty:
-        incoming = incoming.copy()
-        incoming = incoming.sort_values("trade_datetime")
-        incoming["id"] = list(range(start_id, start_id + len(incoming)))
-        df = pd.concat([df, incoming], ignore_index=True)
-        df = _coerce_types(df)
-        df = df.sort_values("trade_datetime").reset_index(drop=True)
-        save_trades(df)
-    return df
\ No newline at end of file
+    import_trades_stream(path)
+    return load_trades()
+
+
+if __name__ == "__main__":
+    cli = argparse.ArgumentParser(description="Options tracker storage maintenance")
+    cli.add_argument("command", choices=["compact", "migrate"])
+    cli.add_argument("--csv", help="CSV to migrate (default: OPTIONS_TRADES_CSV)")
+    args = cli.parse_args()
+    if args.command == "compact":
+        print(f"Folded {compact_trades()} log records into {TRADES_CSV_PATH}")
+    elif args.command == "migrate":
+        print(f"Migrated {migrate_csv(args.csv)} trades into {_table_path()}")
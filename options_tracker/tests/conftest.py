@@ -0,0 +1,37 @@
+import importlib
+import os
+import sys
+import tempfile
+
+import pytest
+
+# The tracker's modules import each other flat, as when app.py is run directly
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Keep storage's derived paths (state, curve, marks, metrics) out of the real journal's directory
+os.environ.setdefault("OPTIONS_TRADES_CSV", os.path.join(tempfile.mkdtemp(prefix="options_tracker_tests_"), "trades.csv"))
+
+STORE_ENV = ("OPTIONS_TRADES_LOG", "OPTIONS_TRADES_COLUMNAR", "OPTIONS_TRADES_SQLITE", "OPTIONS_PL_STATE",
+             "OPTIONS_EQUITY_CURVE")
+
+
+@pytest.fixture
+def store(request, tmp_path, monkeypatch):
+    """
+    `storage` (and `derived`) reloaded on a fresh journal under `tmp_path`;
+    the backend is the test's parameter (``indirect``) or csv. Their paths are
+    read at import time.
+    """
+    import derived
+    import storage
+
+    monkeypatch.setenv("OPTIONS_TRADES_CSV", str(tmp_path / "trades.csv"))
+    monkeypatch.setenv("OPTIONS_TRADES_BACKEND", getattr(request, "param", "csv"))
+    for name in STORE_ENV:
+        monkeypatch.delenv(name, raising=False)
+    importlib.reload(storage)
+    importlib.reload(derived)
+    storage.ensure_storage()
+    yield storage
+    monkeypatch.undo()
+    importlib.reload(storage)
+    importlib.reload(derived)
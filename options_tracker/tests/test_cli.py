@@ -0,0 +1,46 @@
+import importlib.util
+import os
+
+import pytest
+
+import storage
+from bench import make_trades
+from sqlite_store import SqliteStore
+
+
+@pytest.fixture
+def cli(tmp_path, monkeypatch):
+    path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "__main__.py")
+    spec = importlib.util.spec_from_file_location("options_tracker_cli", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    monkeypatch.setattr(module, "CLI_CACHE_DIR", str(tmp_path / "cache"))
+    return module
+
+
+def _trades(rows, seed, first_id=1):
+    trades = make_trades(rows, seed=seed)
+    trades["id"] = range(first_id, first_id + rows)
+    trades["account"] = storage.DEFAULT_ACCOUNT
+    return trades
+
+
+def test_sqlite_journal_cache_sees_wal_writes(cli, tmp_path):
+    path = str(tmp_path / "journal.sqlite")
+    # Like the app: one long-lived connection writing in WAL mode
+    writer = SqliteStore(path, storage.TRADE_COLUMNS)
+    writer.insert_many(_trades(300, seed=1))
+    assert cli.journal_result(path)[1] == 300
+    writer.insert_many(_trades(2, seed=2, first_id=1000))
+    assert cli.journal_result(path)[1] == 302
+
+
+def test_csv_journal_cache_hit_and_change(cli, tmp_path):
+    path = str(tmp_path / "journal.csv")
+    _trades(200, seed=3).to_csv(path, index=False)
+    result, count = cli.journal_result(path)
+    assert count == 200
+    cached, _ = cli.journal_result(path)
+    assert cached.total_realized == result.total_realized
+    _trades(250, seed=3).to_csv(path, index=False)
+    assert cli.journal_result(path)[1] == 250
@@ -0,0 +1,62 @@
+import datetime as dt
+
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip("pyarrow")
+
+from columnar import ColumnarTable  # noqa: E402
+
+
+def _typed():
+    return pd.DataFrame({
+        "id": pd.array([1, 2, 3], dtype="Int64"),
+        "group_id": pd.array([7, None, 7], dtype="Int64"),
+        "symbol": np.array(["SPY", "QQQ", "SPY"], dtype=object),
+        "expiry": np.array([dt.date(2030, 1, 17), dt.date(2030, 3, 15), dt.date(2030, 1, 17)], dtype=object),
+        "strike": [400.0, 350.5, 410.0],
+        "option_type": np.array(["C", "P", "C"], dtype=object),
+        "action": np.array(["BTO", "STO", "STC"], dtype=object),
+        "quantity": pd.array([1, 5, 1], dtype="Int64"),
+        "price": [2.5, np.nan, 3.25],
+        "fees": [0.65, np.nan, 0.0],
+        "trade_datetime": pd.DatetimeIndex([pd.Timestamp("2029-06-03 10:00:00"),
+                                            pd.Timestamp("2029-06-03 10:00:00.123456789"),
+                                            pd.Timestamp("2029-06-04 15:59:59")]),
+        "note": np.array(["", "roll", None], dtype=object),
+        "account": np.array(["default", "ira", "default"], dtype=object),
+    })
+
+
+@pytest.mark.parametrize("fmt", ["parquet", "arrow"])
+def test_round_trip_keeps_dtypes_and_missing_values(tmp_path, fmt):
+    table = ColumnarTable(str(tmp_path / f"trades.{fmt}"), fmt)
+    df = _typed()
+    table.write(df)
+    back = table.read()
+    pd.testing.assert_frame_equal(back, df)
+    assert back["fees"].isna().tolist() == [False, True, False]
+    assert table.read(columns=["id", "fees"]).dtypes.tolist() == [pd.Int64Dtype(), np.float64]
+
+
+@pytest.mark.parametrize("fmt", ["parquet", "arrow"])
+def test_append_streams_onto_the_existing_rows(tmp_path, fmt):
+    table = ColumnarTable(str(tmp_path / f"trades.{fmt}"), fmt)
+    df = _typed()
+    table.write(df.iloc[:1])
+    table.append([df.iloc[1:2], df.iloc[2:]])
+    pd.testing.assert_frame_equal(table.read(), df)
+
+
+@pytest.mark.parametrize("store", ["parquet", "arrow"], indirect=True)
+def test_saving_a_reload_gives_the_same_trades(store):
+    from bench import make_journal
+
+    store.save_trades(store._coerce_types(make_journal(300, seed=2, symbols=4)))
+    loaded = store.load_trades()
+    assert loaded["id"].dtype == pd.Int64Dtype() and loaded["trade_datetime"].dtype == "datetime64[ns]"
+    store.save_trades(loaded.copy())
+    pd.testing.assert_frame_equal(store.load_trades(), loaded)
+    # A fresh reader of the file agrees with the cached frame
+    pd.testing.assert_frame_equal(store.read_journal(store.TRADES_COLUMNAR_PATH), loaded)
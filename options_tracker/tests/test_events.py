@@ -0,0 +1,30 @@
+import pandas as pd
+
+from backtest.events import Costs, backtest_events
+from bench import make_prices
+from backtest.strategy import MACrossover
+from pl import compute_pl
+from storage import DEFAULT_ACCOUNT, TRADE_COLUMNS, _coerce_types
+
+
+def test_book_fills_are_tracker_trades():
+    book = backtest_events(MACrossover(20, 50), make_prices(600, 5), 1e6, Costs(commission=1.0, slippage=0.001))
+    assert not book.trades.empty
+    assert list(book.trades.columns) == TRADE_COLUMNS
+    assert (book.trades["account"] == DEFAULT_ACCOUNT).all()
+    typed = _coerce_types(book.trades.copy())
+    realized, open_df, total = compute_pl(typed)
+    assert len(realized) > 0
+    assert total == realized["realized_pl"].sum()
+
+
+def test_book_account():
+    book = backtest_events(MACrossover(20, 50), make_prices(300, 3), 1e6, account="sim")
+    assert set(book.trades["account"]) == {"sim"}
+
+
+def test_no_fills_keeps_schema():
+    prices = make_prices(30, 2)
+    book = backtest_events(MACrossover(20, 50), prices, 1e6)
+    assert list(book.trades.columns) == TRADE_COLUMNS
+    assert isinstance(book.trades, pd.DataFrame)
@@ -0,0 +1,77 @@
+import io
+
+import pandas as pd
+import pytest
+
+from storage import _validate_chunk
+
+HEADER = "id,symbol,expiry,strike,option_type,action,quantity,price,fees,trade_datetime,note\n"
+
+
+def _csv(rows):
+    return io.StringIO(HEADER + "".join(row + "\n" for row in rows))
+
+
+def _fill(i, action="BTO", when=None):
+    when = when or f"2029-06-03 10:{i % 60:02d}:00"
+    return f"{900 + i},T{i % 3},2030-01-17,{400 + i},C,{action},{1 + i % 4},2.5,0.65,{when},fill {i}"
+
+
+BAD = [
+    "1,SPY,2030-01-17,400,C,HOLD,1,2.5,0.65,2029-06-03 10:00:00,",
+    "2,SPY,2030-01-17,400,X,BTO,1,2.5,0.65,2029-06-03 10:00:00,",
+    "3,SPY,2030-01-17,400,C,BTO,1,2.5,0.65,not a time,",
+    "4,SPY,,400,C,BTO,1,2.5,0.65,2029-06-03 10:00:00,",
+    "5,SPY,2030-01-17,,C,BTO,1,2.5,0.65,2029-06-03 10:00:00,",
+    "6,SPY,2030-01-17,400,C,BTO,0,2.5,0.65,2029-06-03 10:00:00,",
+    "7,SPY,2030-01-17,400,C,BTO,,2.5,0.65,2029-06-03 10:00:00,",
+    # Fails every check; the first one is reported
+    "8,SPY,,,X,HOLD,-1,2.5,0.65,,",
+]
+REASONS = ["invalid action", "invalid option_type", "missing trade_datetime", "missing expiry", "missing strike",
+           "invalid quantity", "invalid quantity", "invalid action"]
+
+
+def test_validate_chunk_reports_the_first_failing_check():
+    raw = pd.read_csv(_csv(BAD + [_fill(1)]))
+    good, bad = _validate_chunk(raw)
+    assert good["id"].tolist() == [901]
+    assert bad["id"].tolist() == list(range(1, 9))
+    assert bad["reason"].tolist() == REASONS
+
+
+@pytest.mark.parametrize("chunksize", [1, 3, 100])
+def test_import_is_the_same_across_chunk_boundaries(store, chunksize):
+    rows = [_fill(i) for i in range(10)] + BAD
+    seen = []
+    result = store.import_trades_stream(_csv(rows[::-1]), chunksize=chunksize,
+                                        progress=lambda r: seen.append((r.read, r.imported, r.rejected)))
+    assert (result.read, result.imported, result.rejected) == (18, 10, 8)
+    assert sorted(result.rejected_rows["reason"]) == sorted(REASONS)
+    # progress runs once per chunk with running totals
+    assert len(seen) == -(-18 // chunksize) and seen[-1] == (18, 10, 8)
+    trades = store.load_trades()
+    assert sorted(trades["note"]) == sorted(f"fill {i}" for i in range(10))
+
+
+@pytest.mark.parametrize("store", ["csv", "log", "sqlite"], indirect=True)
+def test_import_assigns_fresh_ids_after_the_stored_ones(store):
+    first = store.save_trade({"symbol": "SPY", "expiry": "2030-01-17", "strike": 400.0, "option_type": "C",
+                              "action": "BTO", "quantity": 1, "price": 2.5, "fees": 0.65, "id": 40,
+                              "trade_datetime": "2029-06-03 09:00:00", "note": ""})
+    # Incoming ids (900+) are ignored; each chunk is numbered in time order
+    rows = [_fill(i, when=f"2029-06-03 11:{59 - i:02d}:00") for i in range(5)]
+    result = store.import_trades_stream(_csv(rows), chunksize=2)
+    assert result.imported == 5
+    trades = store.load_trades()
+    imported = trades[trades["id"] != first].sort_values("id")
+    assert imported["id"].tolist() == [41, 42, 43, 44, 45]
+    assert imported["note"].tolist() == ["fill 1", "fill 0", "fill 3", "fill 2", "fill 4"]
+    assert store.next_trade_id() == 46
+
+
+def test_rejected_rows_kept_are_capped(store, monkeypatch):
+    monkeypatch.setattr(store, "MAX_REJECTED_KEPT", 3)
+    result = store.import_trades_stream(_csv(BAD), chunksize=2)
+    assert result.rejected == len(BAD)
+    assert result.rejected_rows["reason"].tolist() == REASONS[:3]
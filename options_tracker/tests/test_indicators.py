@@ -0,0 +1,32 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from backtest.indicators import rolling_mean, rolling_means
+
+WINDOWS = (1, 2, 5, 20, 60, 61)
+
+
+def _prices(gaps):
+    rng = np.random.default_rng(6)
+    values = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, (60, 5)), axis=0))
+    values[:12, 1] = np.nan  # lists late
+    values[:, 2] = np.nan  # never lists
+    values[59:, 3] = np.nan  # lists on the last row
+    values[:59, 3] = np.nan
+    if gaps:
+        values[[20, 21, 35], 0] = np.nan
+        values[rng.random(60) < 0.2, 4] = np.nan
+    return values
+
+
+@pytest.mark.parametrize("gaps", [False, True], ids=["listing-only", "gaps"])
+def test_rolling_means_match_pandas(gaps):
+    values = _prices(gaps)
+    means = rolling_means(values, WINDOWS)
+    assert sorted(means) == sorted(WINDOWS)
+    for window in WINDOWS:
+        expected = pd.DataFrame(values).rolling(window).mean().to_numpy()
+        np.testing.assert_allclose(means[window], expected, rtol=1e-12, equal_nan=True, err_msg=f"window {window}")
+        np.testing.assert_array_equal(np.isnan(means[window]), np.isnan(expected))
+    np.testing.assert_array_equal(rolling_mean(values, 5), means[5])
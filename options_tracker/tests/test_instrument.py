@@ -0,0 +1,55 @@
+import os
+import threading
+from collections import deque
+
+import pytest
+
+import instrument
+
+
+@pytest.fixture
+def metrics_log(tmp_path, monkeypatch):
+    path = str(tmp_path / "metrics.jsonl")
+    monkeypatch.setattr(instrument, "METRICS_LOG_PATH", path)
+    monkeypatch.setattr(instrument, "_enabled", False)
+    monkeypatch.setattr(instrument, "_local", threading.local())
+    monkeypatch.setattr(instrument, "_recent", deque(maxlen=instrument.RECENT_RUNS))
+    return path
+
+
+@instrument.timed("test.work", rows=len)
+def _work(items):
+    with instrument.span("test.inner") as s:
+        s.rows = 2
+    instrument.count("test.hit")
+    return sum(items)
+
+
+def test_disabled_records_nothing(metrics_log):
+    assert _work([1, 2, 3]) == 6
+    assert instrument.span("test.span") is instrument._IDLE
+    instrument.begin_run("ignored")
+    assert instrument.end_run() is None
+    assert getattr(instrument._local, "run", None) is None
+    assert instrument.recent_runs() == []
+    assert not os.path.exists(metrics_log)
+
+
+def test_enabled_records_calls_and_writes_the_log(metrics_log):
+    instrument.enable()
+    instrument.begin_run("rerun")
+    assert _work([1, 2, 3]) == 6
+    assert _work([4]) == 4
+    run = instrument.end_run()
+
+    assert [(s.name, s.rows, s.depth) for s in run.ordered()] == [
+        ("test.work", 3, 0), ("test.inner", 2, 1), ("test.work", 1, 0), ("test.inner", 2, 1)]
+    assert run.counters == {"test.hit": 2}
+    assert run.totals()["test.work"] >= run.totals()["test.inner"]
+    assert instrument.recent_runs() == [run]
+
+    logged, = instrument.read_log(metrics_log)
+    assert logged["label"] == "rerun"
+    assert logged["counters"] == {"test.hit": 2}
+    assert [s["name"] for s in logged["spans"]] == [s.name for s in run.spans]
+    assert logged["seconds"] == pytest.approx(run.seconds)
@@ -0,0 +1,85 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from marks import MarkStore
+from pl import MARK_KEY_COLUMNS
+
+DAYS = pd.date_range("2024-03-01 16:00", periods=5, freq="D")
+
+
+@pytest.fixture
+def contracts():
+    rng = np.random.default_rng(8)
+    return pd.DataFrame({
+        "symbol": rng.choice(["SPY", "QQQ", "AAPL"], 40),
+        "expiry": pd.Timestamp("2024-06-21") + pd.to_timedelta(rng.integers(0, 8, 40) * 7, unit="D"),
+        "strike": rng.integers(80, 120, 40) * 5.0,
+        "option_type": rng.choice(["C", "P"], 40),
+    }).drop_duplicates(MARK_KEY_COLUMNS).reset_index(drop=True)
+
+
+def _snapshot(contracts, day, seed):
+    """Marks for a random half of the contracts on `day`."""
+    rng = np.random.default_rng(seed)
+    picked = contracts[rng.random(len(contracts)) < 0.5]
+    return picked.assign(mark=rng.uniform(0.05, 30.0, len(picked)).round(2), as_of=day)
+
+
+def _newest(marks, as_of=None):
+    """Newest mark per contract at or before `as_of`, with plain pandas."""
+    if as_of is not None:
+        marks = marks[marks["as_of"] <= as_of]
+    newest = marks.sort_values("as_of", kind="stable").drop_duplicates(MARK_KEY_COLUMNS, keep="last")
+    return newest.sort_values(MARK_KEY_COLUMNS).reset_index(drop=True)[MARK_KEY_COLUMNS + ["mark", "as_of"]]
+
+
+def _stored(frame):
+    return frame.sort_values(MARK_KEY_COLUMNS).reset_index(drop=True)[MARK_KEY_COLUMNS + ["mark", "as_of"]]
+
+
+def test_snapshot_files_load_in_bulk(tmp_path, contracts):
+    store = MarkStore(str(tmp_path / "marks.sqlite"))
+    first = _snapshot(contracts, DAYS[0], seed=1)
+    csv_path = tmp_path / "first.csv"
+    first.assign(expiry=first["expiry"].dt.strftime("%Y-%m-%d")).to_csv(csv_path, index=False)
+    # JSON lines without as_of take the given time; one row has no mark
+    second = _snapshot(contracts, DAYS[1], seed=2)
+    jsonl_path = tmp_path / "second.jsonl"
+    rows = second.drop(columns="as_of").assign(expiry=second["expiry"].dt.strftime("%Y-%m-%d"))
+    rows.loc[rows.index[0], "mark"] = None
+    rows.to_json(jsonl_path, orient="records", lines=True)
+
+    loaded = store.load_snapshot(str(csv_path))
+    assert (loaded.read, loaded.imported, loaded.rejected) == (len(first), len(first), 0)
+    loaded = store.load_snapshot(str(jsonl_path), as_of=DAYS[1])
+    assert (loaded.read, loaded.imported, loaded.rejected) == (len(second), len(second) - 1, 1)
+    assert loaded.rejected_rows["reason"].tolist() == ["invalid mark"]
+
+    history = store.history()
+    assert len(history) == len(first) + len(second) - 1
+    assert set(history["source"]) == {"first.csv", "second.jsonl"}
+    expected = pd.concat([first, second.iloc[1:]], ignore_index=True)
+    pd.testing.assert_frame_equal(_stored(store.latest()), _newest(expected), check_dtype=False)
+    # Loading a snapshot again replaces its marks instead of adding rows
+    version = store.version()
+    store.load_snapshot(str(csv_path))
+    assert len(store.history()) == len(history)
+    assert store.version() == version + 1
+
+
+def test_latest_mark_as_of_a_date(tmp_path, contracts):
+    store = MarkStore(str(tmp_path / "marks.sqlite"))
+    snapshots = [_snapshot(contracts, day, seed=10 + i) for i, day in enumerate(DAYS)]
+    # Loaded out of order: an older snapshot must not replace newer latest marks
+    for i in (0, 3, 1, 4, 2):
+        store.ingest(snapshots[i], source=f"day{i}")
+    everything = pd.concat(snapshots, ignore_index=True)
+
+    pd.testing.assert_frame_equal(_stored(store.latest()), _newest(everything), check_dtype=False)
+    for day in DAYS:
+        as_of = _newest(store.history(end=day))
+        pd.testing.assert_frame_equal(as_of, _newest(everything, day), check_dtype=False)
+    window = store.history(start=DAYS[1], end=DAYS[2])
+    assert set(window["as_of"]) == {DAYS[1], DAYS[2]}
+    assert len(window) == len(snapshots[1]) + len(snapshots[2])
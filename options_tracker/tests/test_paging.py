@@ -0,0 +1,84 @@
+import datetime as dt
+from dataclasses import replace
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import paging
+from bench import make_journal
+from paging import TableQuery, format_rows, trades_filtered, trades_page
+from storage import _coerce_types
+
+
+@pytest.fixture(scope="module")
+def trades():
+    journal = make_journal(800, seed=4, symbols=8)
+    rng = np.random.default_rng(4)
+    journal["account"] = np.where(rng.random(len(journal)) < 0.3, "ira", "default")
+    return _coerce_types(journal)
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache():
+    paging.clear_cache()
+    yield
+    paging.clear_cache()
+
+
+def _expected(trades, query):
+    """`query` applied to `trades` with plain pandas."""
+    rows = trades
+    if query.symbol:
+        rows = rows[rows["symbol"] == query.symbol]
+    if query.account:
+        rows = rows[rows["account"] == query.account]
+    if query.actions:
+        rows = rows[rows["action"].isin(query.actions)]
+    if query.start is not None:
+        rows = rows[rows["trade_datetime"].dt.date >= query.start]
+    if query.end is not None:
+        rows = rows[rows["trade_datetime"].dt.date <= query.end]
+    if query.sort_by is not None:
+        rows = rows.sort_values(query.sort_by, ascending=query.ascending, kind="stable", na_position="last")
+    return rows.reset_index(drop=True)
+
+
+QUERIES = [
+    TableQuery(),
+    TableQuery(symbol="T003", sort_by="price", ascending=False),
+    TableQuery(account="ira", actions=("STO", "BTC"), sort_by="symbol"),
+    TableQuery(start=dt.date(2020, 6, 1), end=dt.date(2021, 3, 31), sort_by="strike", ascending=False),
+    TableQuery(symbol="T001", account="default", start=dt.date(2021, 1, 1), sort_by="expiry"),
+]
+
+
+@pytest.mark.parametrize("query", QUERIES)
+def test_filters_and_sort_match_pandas(trades, query):
+    expected = _expected(trades, query)
+    pd.testing.assert_frame_equal(trades_filtered(trades, query, version=1), expected)
+    size = 50
+    for page in range(-(-len(expected) // size)):
+        got = trades_page(trades, replace(query, page=page, page_size=size), version=1)
+        assert (got.total, got.page, got.first_row) == (len(expected), page, page * size)
+        pd.testing.assert_frame_equal(got.rows, format_rows(expected.iloc[page * size:(page + 1) * size]
+                                                            .reset_index(drop=True)))
+
+
+def test_page_bounds(trades):
+    query = TableQuery(symbol="T002", page_size=40)
+    total = len(trades_filtered(trades, query, version=1))
+    pages = -(-total // 40)
+    last = trades_page(trades, TableQuery(symbol="T002", page_size=40, page=pages + 5), version=1)
+    assert (last.page, last.pages, last.first_row, last.last_row) == (pages - 1, pages, (pages - 1) * 40, total)
+    first = trades_page(trades, TableQuery(symbol="T002", page_size=40, page=-3), version=1)
+    assert (first.page, first.first_row, first.last_row) == (0, 0, 40)
+    empty = trades_page(trades, TableQuery(symbol="NONE", page=2), version=1)
+    assert (empty.total, empty.page, empty.pages, len(empty.rows)) == (0, 0, 1, 0)
+
+
+@pytest.mark.parametrize("ascending", [True, False])
+def test_ties_keep_the_journal_order(trades, ascending):
+    rows = trades_filtered(trades, TableQuery(sort_by="symbol", ascending=ascending), version=1)
+    assert rows["symbol"].is_monotonic_increasing if ascending else rows["symbol"].is_monotonic_decreasing
+    assert rows.groupby("symbol", sort=False)["id"].apply(lambda ids: ids.is_monotonic_increasing).all()
@@ -0,0 +1,150 @@
+import datetime as dt
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from bench import make_journal, make_trades, reference_compute_pl
+from pl import compute_pl, summarize_by_group
+from pl_state import PLState
+
+
+def assert_matches_reference(trades: pd.DataFrame) -> None:
+    realized, open_df, total = compute_pl(trades)
+    ref_realized, ref_open, ref_total = reference_compute_pl(trades)
+    pd.testing.assert_frame_equal(realized[list(ref_realized.columns)], ref_realized)
+    pd.testing.assert_frame_equal(open_df, ref_open)
+    assert total == ref_total
+
+
+def _trades(*fills) -> pd.DataFrame:
+    """Trades from (action, quantity, price, minute) fills on one SPY call unless a fill overrides a column."""
+    rows = []
+    for i, fill in enumerate(fills, start=1):
+        row = {"id": i, "group_id": 1, "symbol": "SPY", "expiry": "2030-01-18", "strike": 500.0,
+               "option_type": "C", "fees": 0.65, "note": ""}
+        if isinstance(fill, dict):
+            row.update(fill)
+        else:
+            action, quantity, price, minute = fill
+            row.update(action=action, quantity=quantity, price=price)
+            row["trade_datetime"] = pd.Timestamp("2029-06-03 10:00") + pd.Timedelta(minutes=minute)
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+@pytest.mark.parametrize("seed", [0, 1])
+def test_synthetic_journals(seed):
+    assert_matches_reference(make_trades(3_000, legs=40, seed=seed))
+    assert_matches_reference(make_journal(2_000, seed=seed, symbols=5))
+
+
+def test_nan_quantity_and_price():
+    trades = _trades(("BTO", 3, 2.0, 0), ("BTO", np.nan, 2.5, 1), ("STC", 2, np.nan, 2), ("STC", 2, 3.0, 3))
+    trades.loc[1, "fees"] = np.nan
+    assert_matches_reference(trades)
+    realized, open_df, _ = compute_pl(trades)
+    # A missing price closes at zero; a missing quantity opens an empty lot that
+    # the next close passes through with a zero-quantity event
+    assert realized["close_price"].tolist() == [0.0, 3.0, 3.0]
+    assert realized["quantity"].tolist() == [2, 1, 0]
+    assert open_df.empty
+
+
+def test_lowercase_actions_and_types():
+    trades = _trades(("sto", 2, 4.0, 0), ("btc", 1, 1.0, 1), ("Sto", 1, 3.0, 2))
+    trades["option_type"] = ["p", "P", "p"]
+    assert_matches_reference(trades)
+    realized, open_df, _ = compute_pl(trades)
+    assert realized["side"].tolist() == ["SHORT"]
+    assert open_df["open_quantity"].tolist() == [2]
+
+
+def test_close_beyond_open_quantity_is_ignored():
+    trades = _trades(("BTO", 2, 1.0, 0), ("STC", 5, 2.0, 1), ("BTO", 1, 1.5, 2))
+    assert_matches_reference(trades)
+    realized, open_df, total = compute_pl(trades)
+    # The close's fees are allocated over its full quantity, matched or not
+    assert realized["quantity"].tolist() == [2]
+    assert total == pytest.approx(200.0 - 0.65 - 0.65 * 2 / 5)
+    assert open_df["open_quantity"].tolist() == [1]
+
+
+def test_same_timestamp_fills():
+    trades = _trades(("BTO", 1, 1.0, 0), ("BTO", 1, 2.0, 0), ("STC", 1, 3.0, 0), ("BTO", 1, 4.0, 1),
+                     ("STC", 2, 5.0, 1))
+    assert_matches_reference(trades)
+    # Fills at the same time match in id order
+    realized, _, _ = compute_pl(trades)
+    assert realized["open_ids"].tolist() == [[1], [2], [4]]
+
+
+def test_same_timestamp_fills_match_in_id_order_not_row_order():
+    trades = _trades(*[("BTO", 1, float(i), 0) for i in range(1, 41)], ("STC", 40, 50.0, 0), ("STC", 1, 60.0, 1))
+    trades["id"] = np.random.default_rng(3).permutation(len(trades)) + 1
+    trades.loc[trades["action"] == "STC", "id"] = [1_000, 1_001]
+    shuffled = trades.sample(frac=1.0, random_state=4)
+    assert_matches_reference(shuffled)
+    realized, _, _ = compute_pl(shuffled)
+    opens = trades[trades["action"] == "BTO"].sort_values("id")
+    assert [ids[0] for ids in realized["open_ids"]] == opens["id"].tolist()
+    state = PLState.from_trades(shuffled)
+    pd.testing.assert_frame_equal(state.result().realized, realized)
+
+
+def test_close_only():
+    trades = _trades(("STC", 1, 2.0, 0), ("BTC", 2, 1.0, 1))
+    assert_matches_reference(trades)
+    realized, open_df, total = compute_pl(trades)
+    assert realized.empty and open_df.empty and total == 0.0
+
+
+def test_no_matches():
+    trades = _trades(("BTO", 1, 2.0, 0), ("STO", 2, 1.0, 1), {"action": "XYZ", "quantity": 1, "price": 1.0,
+                                                              "trade_datetime": pd.Timestamp("2029-06-03 11:00")})
+    assert_matches_reference(trades)
+    realized, open_df, total = compute_pl(trades)
+    assert realized.empty and total == 0.0
+    assert open_df["side"].tolist() == ["LONG", "SHORT"]
+
+
+def test_date_and_string_expiry_are_one_leg():
+    trades = _trades(("BTO", 2, 1.0, 0), ("STC", 1, 2.0, 1), ("STC", 1, 3.0, 2))
+    trades["expiry"] = pd.Series([dt.date(2030, 1, 18), "2030-01-18", pd.Timestamp("2030-01-18")], dtype=object)
+    assert_matches_reference(trades)
+    realized, open_df, _ = compute_pl(trades)
+    assert realized["quantity"].tolist() == [1, 1]
+    assert open_df.empty
+
+
+def test_empty():
+    assert_matches_reference(_trades())
+
+
+def test_lots_match_within_their_account():
+    # The same leg opened in one account and closed in another must not match
+    trades = _trades(("BTO", 2, 2.0, 0), ("STC", 1, 3.0, 1), ("STC", 1, 3.5, 2)).assign(account=["A", "B", "A"])
+    realized, open_df, total = compute_pl(trades)
+    assert realized["account"].tolist() == ["A"] and total == pytest.approx(150 - 0.325 - 0.65)
+    assert open_df["account"].tolist() == ["A"] and open_df["open_quantity"].tolist() == [1]
+    state = PLState.from_trades(trades).result()
+    assert state.realized["account"].tolist() == ["A"] and state.total_realized == pytest.approx(total)
+    pd.testing.assert_frame_equal(state.open_positions, open_df, check_dtype=False)
+
+
+def test_groups_get_the_pl_of_the_lots_they_opened():
+    def fill(action, quantity, price, minute, group):
+        return {"action": action, "quantity": quantity, "price": price, "group_id": group,
+                "trade_datetime": pd.Timestamp("2029-06-03 10:00") + pd.Timedelta(minutes=minute)}
+
+    # Group 1 opens 3 lots; group 2 closes 2 of them and opens one of its own
+    trades = _trades(fill("BTO", 3, 2.0, 0, 1), fill("STC", 2, 3.0, 1, 2), fill("BTO", 1, 1.0, 2, 2))
+    for source in (trades, PLState.from_trades(trades).result()):
+        summary = summarize_by_group(source).set_index("group_id")
+        assert summary.index.tolist() == [1, 2]
+        assert summary["realized_pl"].tolist() == pytest.approx([200 - 0.65 * 2 / 3 - 0.65, 0.0])
+        assert summary["open_quantity"].tolist() == [1, 1]
+        assert summary["cost_basis"].tolist() == pytest.approx([200.0, 100.0])
+        # The closing fee goes with the realized P/L to the opening group; an open lot
+        # reports its opening trade's fee as total_fees, as compute_pl's open positions do
+        assert summary["fees"].tolist() == pytest.approx([0.65 * 2 / 3 + 0.65 + 0.65, 0.65])
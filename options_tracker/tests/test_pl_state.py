@@ -0,0 +1,128 @@
+import os
+
+import pandas as pd
+import pytest
+
+import pl_state
+from bench import make_journal
+from pl import LEG_COLUMNS, compute_pl_result
+from pl_state import PLState
+from storage import _coerce_types
+
+
+@pytest.fixture
+def trades():
+    return _coerce_types(make_journal(600, seed=7, symbols=8))
+
+
+def _assert_same(state, trades):
+    expected = compute_pl_result(trades)
+    got = state.result()
+    assert got.total_realized == pytest.approx(expected.total_realized)
+    # Legs come out in the order the state first saw them; compare as sets of legs
+    ordered = [frame.sort_values(LEG_COLUMNS, kind="stable").reset_index(drop=True)
+               for frame in (got.open_positions, expected.open_positions)]
+    pd.testing.assert_frame_equal(*ordered, check_dtype=False)
+    assert len(got.realized) == len(expected.realized)
+
+
+def _later(trades, i, new_id):
+    row = trades.iloc[i].to_dict()
+    row["id"] = new_id
+    row["trade_datetime"] = trades["trade_datetime"].max() + pd.Timedelta(minutes=i + 1)
+    return row
+
+
+def test_saves_append_deltas_that_load_replays(tmp_path, trades):
+    path = str(tmp_path / "state.pkl")
+    head, tail = trades.iloc[:500], trades.iloc[500:]
+    state = PLState.from_trades(head)
+    state.version = 0
+    state.save(path)
+    snapshot = os.path.getmtime(path), os.path.getsize(path)
+    for i, (_, row) in enumerate(tail.iterrows(), start=1):
+        state.apply(row.to_dict())
+        if i % 10 == 0:
+            state.remove(int(head["id"].iloc[i]))
+        state.version = i
+        state.save(path)
+    # Only the delta grew
+    assert (os.path.getmtime(path), os.path.getsize(path)) == snapshot
+    assert os.path.exists(path + ".delta")
+
+    loaded = PLState.load(path)
+    assert loaded.version == len(tail)
+    removed = set(head["id"].iloc[[i for i in range(1, len(tail) + 1) if i % 10 == 0]])
+    _assert_same(loaded, trades[~trades["id"].isin(removed)])
+
+
+def test_snapshot_rewritten_after_max_deltas(tmp_path, trades, monkeypatch):
+    monkeypatch.setattr(pl_state, "MAX_DELTAS", 3)
+    path = str(tmp_path / "state.pkl")
+    state = PLState.from_trades(trades)
+    state.version = 0
+    state.save(path)
+    for i in range(1, 5):
+        state.apply(_later(trades, i, 10_000 + i))
+        state.version = i
+        state.save(path)
+    # Three appends, then the fourth save compacted into a new snapshot
+    assert not os.path.exists(path + ".delta")
+    assert PLState.load(path).version == 4
+    assert len(PLState.load(path)) == len(trades) + 4
+
+
+def test_diverged_writer_does_not_extend_the_chain(tmp_path, trades):
+    path = str(tmp_path / "state.pkl")
+    state = PLState.from_trades(trades)
+    state.version = 0
+    state.save(path)
+    stale = PLState.load(path)
+    state.apply(_later(trades, 1, 10_001))
+    state.version = 1
+    state.save(path)
+    # A second process still at version 0 appends on the same snapshot
+    stale.apply(_later(trades, 2, 10_002))
+    stale.version = 2
+    stale.save(path)
+
+    loaded = PLState.load(path)
+    assert loaded.version == 1
+    assert 10_002 not in loaded.trade_legs
+    # The next save starts a fresh snapshot instead of appending after the broken record
+    loaded.version = 3
+    loaded.save(path)
+    assert not os.path.exists(path + ".delta")
+    assert PLState.load(path).version == 3
+
+
+def test_truncated_delta_record(tmp_path, trades):
+    path = str(tmp_path / "state.pkl")
+    state = PLState.from_trades(trades)
+    state.version = 0
+    state.save(path)
+    state.apply(_later(trades, 1, 10_001))
+    state.version = 1
+    state.save(path)
+    state.apply(_later(trades, 2, 10_002))
+    state.version = 2
+    state.save(path)
+    with open(path + ".delta", "r+b") as fh:
+        fh.truncate(os.path.getsize(path + ".delta") - 5)
+    loaded = PLState.load(path)
+    assert loaded.version == 1
+    assert 10_001 in loaded.trade_legs and 10_002 not in loaded.trade_legs
+
+
+def test_undated_fills_sort_last(trades):
+    # compute_pl matches fills without a trade_datetime after every dated one, so this close finds the open
+    leg = {"symbol": "ZZZ", "quantity": 1, "group_id": 999}
+    undated = {**_later(trades, 3, 20_001), **leg, "action": "STC", "trade_datetime": pd.NaT}
+    dated = {**_later(trades, 3, 20_002), **leg, "action": "BTO"}
+    also_undated = {**_later(trades, 5, 20_003), "trade_datetime": None}
+    state = PLState.from_trades(trades)
+    for row in (undated, dated, also_undated):
+        state.apply(row)
+    added = pd.DataFrame([undated, dated, also_undated]).astype({"trade_datetime": "datetime64[ns]"})
+    _assert_same(state, pd.concat([trades, added], ignore_index=True))
+    assert 20_001 in state.result().realized["close_id"].tolist()
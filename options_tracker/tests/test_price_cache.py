@@ -0,0 +1,79 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip("pyarrow")
+
+from backtest import data  # noqa: E402
+from backtest.data import PRICE_FIELDS, FrameSource, PriceCache  # noqa: E402
+
+
+def _bars(seed):
+    index = pd.bdate_range("2021-01-04", "2021-12-31", name="Date")
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, len(index))))
+    return pd.DataFrame({"Open": close, "High": close * 1.01, "Low": close * 0.99, "Close": close,
+                         "Adj Close": close * 0.98, "Volume": rng.integers(1e5, 1e6, len(index)).astype(float)},
+                        index=index)[PRICE_FIELDS]
+
+
+@pytest.fixture
+def source():
+    return FrameSource({"AAA": _bars(1), "BBB": _bars(2)})
+
+
+def _expected(source, symbol, start, end):
+    frame = source.frames[symbol]
+    return frame[(frame.index >= start) & (frame.index < end)]
+
+
+def _assert_bars(got, expected):
+    # Index freqs are whatever pandas inferred on each side
+    pd.testing.assert_frame_equal(got, expected, check_freq=False)
+
+
+@pytest.mark.parametrize("fmt", ["arrow", "parquet"])
+def test_only_the_missing_span_is_fetched(tmp_path, source, fmt):
+    cache = PriceCache(str(tmp_path), source, offline=False, fmt=fmt)
+    day = pd.Timestamp
+    first = cache.history("AAA", "2021-03-01", "2021-04-01")
+    _assert_bars(first, _expected(source, "AAA", day("2021-03-01"), day("2021-04-01")))
+    assert source.calls == [("AAA", day("2021-03-01"), day("2021-04-01"))]
+
+    # Widening on both sides fetches just the two edges
+    source.calls.clear()
+    wide = cache.history("AAA", "2021-02-01", "2021-05-01")
+    assert source.calls == [("AAA", day("2021-02-01"), day("2021-03-01")),
+                            ("AAA", day("2021-04-01"), day("2021-05-01"))]
+    _assert_bars(wide, _expected(source, "AAA", day("2021-02-01"), day("2021-05-01")))
+
+    # Anything inside the covered range, weekends included, is served from the file
+    source.calls.clear()
+    inside = PriceCache(str(tmp_path), source, offline=False, fmt=fmt).history("AAA", "2021-02-06", "2021-04-18")
+    assert source.calls == []
+    _assert_bars(inside, _expected(source, "AAA", day("2021-02-06"), day("2021-04-18")))
+
+
+def test_offline_reads_only_the_cache(tmp_path, source, monkeypatch):
+    PriceCache(str(tmp_path), source, offline=False).history("AAA", "2021-03-01", "2021-04-01")
+    source.calls.clear()
+    monkeypatch.setattr(data, "PRICES_OFFLINE", True)
+    offline = PriceCache(str(tmp_path), source)
+    # A wider request returns what is cached instead of fetching the rest
+    got = offline.history("AAA", "2021-01-01", "2021-06-01")
+    _assert_bars(got, _expected(source, "AAA", pd.Timestamp("2021-03-01"),
+                                                 pd.Timestamp("2021-04-01")))
+    with pytest.raises(LookupError):
+        offline.history("BBB", "2021-03-01", "2021-04-01")
+    assert source.calls == []
+
+
+def test_download_matches_yfinance_layout(tmp_path, source):
+    cache = PriceCache(str(tmp_path), source, offline=False)
+    wide = cache.download(["AAA", "BBB"], "2021-06-01", "2021-07-01")
+    assert wide.columns.names == ["Price", "Ticker"]
+    pd.testing.assert_series_equal(wide[("Close", "BBB")], _expected(source, "BBB", pd.Timestamp("2021-06-01"),
+                                                                     pd.Timestamp("2021-07-01"))["Close"],
+                                   check_names=False, check_freq=False)
+    prices = cache.prices(["AAA", "BBB"], "2021-06-01", "2021-07-01")
+    assert list(prices.columns) == ["AAA", "BBB"] and prices.notna().all().all()
@@ -0,0 +1,106 @@
+import math
+
+import numpy as np
+import pytest
+
+from pricing import DAYS_PER_YEAR, black_scholes, implied_vol, theoretical_value
+
+
+def _n(x):
+    return 0.5 * (1.0 + math.erf(x / math.sqrt(2.0)))
+
+
+def _closed_form(spot, strike, years, rate, vol, is_call, q=0.0):
+    """Textbook Black-Scholes-Merton value and Greeks, one option at a time."""
+    d1 = (math.log(spot / strike) + (rate - q + 0.5 * vol * vol) * years) / (vol * math.sqrt(years))
+    d2 = d1 - vol * math.sqrt(years)
+    pdf = math.exp(-0.5 * d1 * d1) / math.sqrt(2.0 * math.pi)
+    disc_q, disc_r = math.exp(-q * years), math.exp(-rate * years)
+    if is_call:
+        value = spot * disc_q * _n(d1) - strike * disc_r * _n(d2)
+        delta = disc_q * _n(d1)
+        theta = -spot * disc_q * pdf * vol / (2 * math.sqrt(years)) + q * spot * disc_q * _n(d1) \
+            - rate * strike * disc_r * _n(d2)
+    else:
+        value = strike * disc_r * _n(-d2) - spot * disc_q * _n(-d1)
+        delta = -disc_q * _n(-d1)
+        theta = -spot * disc_q * pdf * vol / (2 * math.sqrt(years)) - q * spot * disc_q * _n(-d1) \
+            + rate * strike * disc_r * _n(-d2)
+    return {"theo": value, "delta": delta, "gamma": disc_q * pdf / (spot * vol * math.sqrt(years)),
+            "theta": theta / DAYS_PER_YEAR, "vega": spot * disc_q * pdf * math.sqrt(years) / 100.0}
+
+
+CASES = [
+    # spot, strike, years, rate, vol, q
+    (42.0, 40.0, 0.5, 0.10, 0.20, 0.0),
+    (100.0, 120.0, 0.1, 0.03, 0.45, 0.02),
+    (250.0, 180.0, 2.0, 0.05, 0.15, 0.01),
+    (10.0, 10.0, 1 / 365, 0.0, 0.80, 0.0),
+]
+
+
+def test_textbook_example():
+    # Hull, Options, Futures and Other Derivatives, example 15.6
+    greeks = black_scholes([42.0, 42.0], 40.0, 0.5, 0.1, 0.2, [True, False])
+    assert greeks["theo"] == pytest.approx([4.76, 0.81], abs=5e-3)
+
+
+@pytest.mark.parametrize("is_call", [True, False])
+def test_values_and_greeks_match_closed_form(is_call):
+    spot, strike, years, rate, vol, q = map(np.array, zip(*CASES))
+    greeks = black_scholes(spot, strike, years, rate, vol, is_call, q)
+    np.testing.assert_allclose(theoretical_value(spot, strike, years, rate, vol, is_call, q), greeks["theo"],
+                               rtol=1e-12)
+    for i, case in enumerate(CASES):
+        expected = _closed_form(*case[:5], is_call, case[5])
+        for name, value in expected.items():
+            # The fallback normal CDF is accurate to about 1e-7
+            assert greeks[name][i] == pytest.approx(value, rel=1e-5, abs=1e-5), (case, name)
+
+
+def test_put_call_parity():
+    rng = np.random.default_rng(4)
+    spot = rng.uniform(20, 200, 200)
+    strike = spot * rng.uniform(0.6, 1.4, 200)
+    years, rate, vol, q = rng.uniform(0.01, 2, 200), rng.uniform(0, 0.08, 200), rng.uniform(0.05, 1.2, 200), \
+        rng.uniform(0, 0.04, 200)
+    call = black_scholes(spot, strike, years, rate, vol, True, q)
+    put = black_scholes(spot, strike, years, rate, vol, False, q)
+    forward = spot * np.exp(-q * years) - strike * np.exp(-rate * years)
+    np.testing.assert_allclose(call["theo"] - put["theo"], forward, atol=1e-5 * spot.max())
+    np.testing.assert_allclose(call["delta"] - put["delta"], np.exp(-q * years), atol=1e-6)
+    np.testing.assert_allclose(call["gamma"], put["gamma"], rtol=1e-12)
+    np.testing.assert_allclose(call["vega"], put["vega"], rtol=1e-12)
+
+
+def test_expired_legs_are_worth_intrinsic():
+    greeks = black_scholes([110.0, 90.0, 110.0], 100.0, [0.0, -0.1, 0.0], 0.05, 0.3, [True, True, False])
+    assert greeks["theo"].tolist() == [10.0, 0.0, 0.0]
+    assert greeks["delta"].tolist() == [1.0, 0.0, 0.0]
+    assert not greeks["gamma"].any() and not greeks["vega"].any()
+
+
+def test_implied_vol_round_trip():
+    rng = np.random.default_rng(9)
+    n = 300
+    spot = rng.uniform(20, 200, n)
+    strike = spot * rng.uniform(0.7, 1.3, n)
+    years, rate, q = rng.uniform(0.02, 1.5, n), rng.uniform(0, 0.06, n), rng.uniform(0, 0.03, n)
+    vol = rng.uniform(0.08, 1.5, n)
+    is_call = rng.random(n) < 0.5
+    price = theoretical_value(spot, strike, years, rate, vol, is_call, q)
+    # Far out-of-the-money prices carry too little vega to pin the vol down
+    usable = black_scholes(spot, strike, years, rate, vol, is_call, q)["vega"] > 1e-3
+    solved = implied_vol(price, spot, strike, years, rate, is_call, q, tol=1e-9)
+    np.testing.assert_allclose(solved[usable], vol[usable], atol=1e-5)
+    np.testing.assert_allclose(theoretical_value(spot, strike, years, rate, solved, is_call, q), price, atol=1e-6)
+
+
+def test_implied_vol_without_a_solution_is_nan():
+    # Below intrinsic; above the spot; between the value at MAX_VOL and the spot (call, put); missing; expired
+    price = [4.0, 106.0, 101.0, 99.0, np.nan, 3.0]
+    is_call = [True, True, True, False, True, True]
+    solved = implied_vol(price, 105.0, 100.0, [0.5, 0.5, 0.5, 0.5, 0.5, 0.0], 0.0, is_call)
+    assert np.isnan(solved).all()
+    vol = implied_vol(8.0, 105.0, 100.0, 0.5, 0.0, True)
+    assert _closed_form(105.0, 100.0, 0.5, 0.0, float(vol), True)["theo"] == pytest.approx(8.0, abs=1e-5)
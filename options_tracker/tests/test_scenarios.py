@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+
+import scenarios
+from bench import make_open_positions, make_trades
+from scenarios import scenario_grid
+
+
+@pytest.fixture
+def open_df():
+    return make_open_positions(300, seed=1)
+
+
+def _grid(open_df, **kwargs):
+    spot = {symbol: 300.0 for symbol in open_df["symbol"].unique()}
+    return scenario_grid(open_df, spot, 0.3, 0.04, valuation_date="2024-01-02", **kwargs)
+
+
+def test_small_grid_stays_in_process(open_df, monkeypatch):
+    def no_pool(*args, **kwargs):
+        raise AssertionError("pool started for a small grid")
+    monkeypatch.setattr(scenarios, "ProcessPoolExecutor", no_pool)
+    assert 8_610 * len(open_df) < scenarios.POOL_MIN_CELLS
+    assert _grid(open_df, max_workers=4).pnl.shape == (41, 21, 10, open_df["symbol"].nunique())
+
+
+def test_blocks_within_budget_match_one_block(open_df, monkeypatch):
+    whole = _grid(open_df)
+    # About ten scenarios per block
+    monkeypatch.setattr(scenarios, "MEMORY_BUDGET", scenarios.BYTES_PER_CELL * len(open_df) * 10)
+    np.testing.assert_allclose(_grid(open_df).pnl, whole.pnl)
+
+
+def test_group_cube_from_open_lots():
+    from pl import compute_pl_result
+
+    result = compute_pl_result(make_trades(2_000, legs=40, seed=2))
+    by_symbol = _grid(result.open_positions)
+    by_group = _grid(result.open_lots, by="group_id")
+    assert set(by_group.groups) == set(result.open_lots["group_id"])
+    np.testing.assert_allclose(by_group.total, by_symbol.total)
@@ -0,0 +1,99 @@
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+TRACKER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCRIPT = """
+import derived
+import storage
+storage.ensure_storage()
+storage.upsert_trade({
+    "symbol": "SPY", "expiry": "2030-01-17", "strike": 400.0, "option_type": "C", "action": "BTO",
+    "quantity": 1, "price": 2.5, "fees": 0.65, "trade_datetime": "2029-06-03 10:00:00", "note": "",
+})
+derived.load_equity_curve()
+print(derived.PL_STATE_PATH)
+print(derived.EQUITY_CURVE_PATH)
+"""
+
+
+def test_sqlite_store_in_its_own_directory(tmp_path):
+    # The CSV's directory does not exist; only the database path is configured
+    env = dict(os.environ,
+               OPTIONS_TRADES_CSV=str(tmp_path / "missing" / "trades.csv"),
+               OPTIONS_TRADES_BACKEND="sqlite",
+               OPTIONS_TRADES_SQLITE=str(tmp_path / "db" / "journal.sqlite"),
+               OPTIONS_METRICS_LOG=str(tmp_path / "metrics.jsonl"))
+    for name in ("OPTIONS_PL_STATE", "OPTIONS_EQUITY_CURVE", "OPTIONS_MARKS", "OPTIONS_ACCOUNT_RESULTS"):
+        env.pop(name, None)
+    out = subprocess.run([sys.executable, "-c", SCRIPT], cwd=TRACKER_DIR, env=env,
+                         capture_output=True, text=True, check=True).stdout.split()
+    assert out == [str(tmp_path / "db" / "journal.plstate.pkl"), str(tmp_path / "db" / "journal.equity.pkl")]
+    assert os.path.exists(out[0]) and os.path.exists(out[1])
+    assert not os.path.exists(tmp_path / "missing")
+
+
+def test_state_files_create_their_directory(tmp_path):
+    from pl_state import PLState
+    from timeline import EquityCurve
+
+    state_path = str(tmp_path / "a" / "state.pkl")
+    PLState().save(state_path)
+    assert PLState.load(state_path) is not None
+    curve_path = str(tmp_path / "b" / "curve.pkl")
+    EquityCurve().save(curve_path)
+    assert EquityCurve.load(curve_path) is not None
+
+
+@pytest.fixture
+def journal():
+    from bench import make_journal
+
+    trades = make_journal(400, seed=3, symbols=6)
+    return trades.assign(account=np.where(trades["group_id"] % 3 == 0, "ira", "default"))
+
+
+def _by_id(frame):
+    # Fills at the same time may come back in either order
+    return frame.sort_values("id", kind="stable").reset_index(drop=True)
+
+
+@pytest.mark.parametrize("store", ["csv", "sqlite"], indirect=True)
+def test_filters_match_filtering_the_full_frame(store, journal):
+    store.save_trades(journal)
+    full = store.load_trades()
+    when = full["trade_datetime"]
+    # Bounds on existing fill times, which both ends include
+    start, end = when.iloc[100], when.iloc[250]
+    group = int(full["group_id"].iloc[7])
+    cases = [
+        ({"symbol": "T002"}, full["symbol"] == "T002"),
+        ({"account": "ira"}, full["account"] == "ira"),
+        ({"group_id": group}, full["group_id"] == group),
+        ({"start": start, "end": end}, when.between(start, end)),
+        ({"end": start}, when <= start),
+        ({"symbol": "T001", "account": "default", "start": start},
+         (full["symbol"] == "T001") & (full["account"] == "default") & (when >= start)),
+        ({"symbol": "nope"}, full["symbol"] == "nope"),
+    ]
+    for filters, mask in cases:
+        got = store.load_trades_filtered(**filters)
+        assert len(got) == mask.sum(), filters
+        if len(got):
+            pd.testing.assert_frame_equal(_by_id(got), _by_id(full[mask]), obj=str(filters))
+
+
+@pytest.mark.parametrize("store", ["csv", "sqlite"], indirect=True)
+def test_get_trade_matches_the_full_frame(store, journal):
+    store.save_trades(journal)
+    full = store.load_trades()
+    for i in (0, 57, len(full) - 1):
+        expected = full.iloc[i]
+        got = store.get_trade(int(expected["id"]))
+        pd.testing.assert_series_equal(pd.Series(got, name=expected.name), expected)
+    assert store.get_trade(int(full["id"].max()) + 1) is None
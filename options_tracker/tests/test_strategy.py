@@ -0,0 +1,64 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from backtest.strategy import EMAWick, MACrossover
+
+
+@pytest.fixture
+def prices():
+    rng = np.random.default_rng(11)
+    index = pd.bdate_range("2022-01-03", periods=60)
+    walk = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, (60, 3)), axis=0))
+    frame = pd.DataFrame(walk, index=index, columns=["AAA", "BBB", "QQQ"])
+    # BBB lists on the ninth day and misses one in the middle
+    frame.iloc[:8, 1] = np.nan
+    frame.iloc[30, 1] = np.nan
+    return frame
+
+
+def test_ma_crossover_matches_pandas(prices):
+    strategy = MACrossover(fast=3, slow=7)
+    fast = prices.rolling(3).mean()
+    slow = prices.rolling(7).mean()
+    expected = pd.DataFrame(np.select([fast > slow, fast <= slow], [1, -1], 0), index=prices.index,
+                            columns=prices.columns)
+    signals = strategy.signals(prices)
+    pd.testing.assert_frame_equal(signals.astype(np.int64), expected)
+    pd.testing.assert_frame_equal(strategy.positions(signals), (expected == 1).astype(np.float64))
+    # No signal before the slow window fills; listed symbols have one right after
+    assert strategy.warmup() == 6
+    assert (signals.iloc[:6] == 0).all().all()
+    assert (signals.iloc[6:, [0, 2]] != 0).all().all()
+    # BBB waits for seven valid prices after listing, and again after its gap
+    assert (signals["BBB"].iloc[:14] == 0).all() and signals["BBB"].iloc[14] != 0
+    assert (signals["BBB"].iloc[30:37] == 0).all()
+
+
+def _pandas_wick(prices, strategy):
+    symbols = prices.columns.drop(strategy.benchmark)
+    ratio = prices[symbols].div(prices[strategy.benchmark], axis=0)
+    candles = {s: ratio[s].resample(strategy.bar).ohlc() for s in symbols}
+    low = pd.DataFrame({s: c["low"] for s, c in candles.items()})
+    close = pd.DataFrame({s: c["close"] for s, c in candles.items()})
+    keep = close.notna().any(axis=1)
+    low, close = low[keep], close[keep]
+    touch = low <= close.ewm(span=strategy.span, adjust=False).mean()
+    if strategy.entry == "edge":
+        touch &= ~touch.shift(fill_value=False)
+    elif strategy.entry == "first":
+        touch &= touch.cumsum() == 1
+    return touch.astype(np.int64)
+
+
+@pytest.mark.parametrize("entry", ["edge", "every", "first"])
+def test_ema_wick_matches_pandas(prices, entry):
+    strategy = EMAWick(benchmark="QQQ", span=4, bar="3B", entry=entry)
+    expected = _pandas_wick(prices, strategy)
+    signals = strategy.signals(prices)
+    pd.testing.assert_frame_equal(signals, expected, check_freq=False)
+    assert signals.to_numpy().sum() > 0
+    pd.testing.assert_frame_equal(strategy.positions(signals), expected.cumsum().astype(np.float64),
+                                  check_freq=False)
+    closes = prices[["AAA", "BBB"]].resample("3B").last().reindex(signals.index)
+    pd.testing.assert_frame_equal(strategy.prices(prices, signals), closes, check_freq=False)
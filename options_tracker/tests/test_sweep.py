@@ -0,0 +1,50 @@
+import os
+
+import pandas as pd
+import pytest
+
+from backtest import sweep
+from bench import make_prices
+
+
+@pytest.fixture(scope="module")
+def prices():
+    return make_prices(400, 10, seed=3)
+
+
+@pytest.mark.parametrize("kind", ["ma", "ema"])
+def test_interrupted_sweep_resumes_to_the_serial_result(tmp_path, monkeypatch, prices, kind):
+    name = "_ma_chunk" if kind == "ma" else "_ema_chunk"
+    run = {"ma": lambda **kw: sweep.ma_sweep(prices, fast=(5, 10), slow=(20, 40), cost=0.001, chunk=3, **kw),
+           "ema": lambda **kw: sweep.ema_wick_sweep(prices, spans=(5, 10), bars=("21B", "42B"), chunk=3, **kw)}[kind]
+    serial = run(max_workers=1)
+
+    chunk_func = getattr(sweep, name)
+    calls = []
+
+    def interrupted(*args):
+        if len(calls) == 2:
+            raise KeyboardInterrupt
+        calls.append(args[3])
+        return chunk_func(*args)
+
+    checkpoint = str(tmp_path / "parts")
+    monkeypatch.setattr(sweep, name, interrupted)
+    with pytest.raises(KeyboardInterrupt):
+        run(max_workers=1, checkpoint=checkpoint)
+    saved = {path: os.stat(os.path.join(checkpoint, path)).st_mtime_ns for path in os.listdir(checkpoint)}
+    assert len(saved) == 2
+
+    # The rerun only computes the chunks the interrupted one did not finish
+    calls.clear()
+    monkeypatch.setattr(sweep, name, lambda *args: calls.append(args[3]) or chunk_func(*args))
+    resumed = run(max_workers=1, checkpoint=checkpoint)
+    assert len(calls) == len(os.listdir(checkpoint)) - 2
+    assert all(os.stat(os.path.join(checkpoint, path)).st_mtime_ns == mtime for path, mtime in saved.items())
+    pd.testing.assert_frame_equal(resumed, serial)
+
+    # Resuming on the pool (over shared memory) gives the same result
+    for path in sorted(os.listdir(checkpoint))[:2]:
+        os.remove(os.path.join(checkpoint, path))
+    monkeypatch.setattr(sweep, name, chunk_func)
+    pd.testing.assert_frame_equal(run(max_workers=2, checkpoint=checkpoint), serial)
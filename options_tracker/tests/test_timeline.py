@@ -0,0 +1,115 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from pl import MARK_KEY_COLUMNS, compute_pl_result, mark_to_market
+from storage import _coerce_types
+from timeline import build_equity_curve
+
+
+def _journal(positions: int, seed: int) -> pd.DataFrame:
+    """One-leg positions opened as their own group over a year; most are closed weeks later, some in two fills."""
+    rng = np.random.default_rng(seed)
+    opened = pd.Timestamp("2023-01-03 09:30") + pd.to_timedelta(np.sort(rng.uniform(0, 365, positions)), unit="D")
+    quantity = rng.integers(2, 11, positions)
+    fills = []
+    for i in range(positions):
+        leg = {"group_id": i + 1, "symbol": f"T{rng.integers(0, 6)}", "expiry": (opened[i] + pd.Timedelta(days=60)).date(),
+               "strike": float(rng.integers(10, 40) * 5), "option_type": "CP"[rng.integers(0, 2)]}
+        short = rng.random() < 0.4
+        fills.append({**leg, "action": "STO" if short else "BTO", "quantity": quantity[i], "when": opened[i]})
+        closes = rng.integers(0, 3)
+        for step, qty in enumerate(np.array_split(np.ones(quantity[i], dtype=int), closes) if closes else []):
+            fills.append({**leg, "action": "BTC" if short else "STC", "quantity": int(qty.sum()),
+                          "when": opened[i] + pd.Timedelta(days=float(rng.uniform(5, 25)) * (step + 1))})
+    journal = pd.DataFrame(fills).sort_values("when", kind="stable").reset_index(drop=True)
+    journal["price"] = np.round(rng.uniform(0.2, 12.0, len(journal)), 2)
+    journal["fees"] = np.round(0.65 * journal["quantity"], 2)
+    journal = journal.rename(columns={"when": "trade_datetime"}).assign(note="")
+    journal.insert(0, "id", np.arange(1, len(journal) + 1))
+    return journal
+
+
+@pytest.fixture(scope="module")
+def trades():
+    return _coerce_types(_journal(200, seed=5))
+
+
+@pytest.fixture(scope="module")
+def marks(trades):
+    rng = np.random.default_rng(2)
+    legs = trades[MARK_KEY_COLUMNS].drop_duplicates().reset_index(drop=True)
+    days = pd.to_datetime(trades["trade_datetime"]).dt.normalize().drop_duplicates().sort_values().iloc[::15]
+    return pd.concat([legs.assign(as_of=day, mark=rng.uniform(0.1, 20.0, len(legs)).round(2)) for day in days],
+                     ignore_index=True)
+
+
+def _prefix(trades, day):
+    return trades[pd.to_datetime(trades["trade_datetime"]) < day + pd.Timedelta(days=1)]
+
+
+def _unrealized_on(trades, marks, day):
+    """Unrealized P/L of the lots open at the end of `day`, at the last mark of each contract."""
+    open_df = compute_pl_result(_prefix(trades, day)).open_positions
+    known = marks[pd.to_datetime(marks["as_of"]).dt.normalize() <= day]
+    if open_df.empty or known.empty:
+        return 0.0
+    latest = known.sort_values("as_of", kind="stable").drop_duplicates(MARK_KEY_COLUMNS, keep="last")
+    per_leg, _ = mark_to_market(open_df, latest)
+    # Legs without a mark yet carry no unrealized P/L on the curve
+    keys = [per_leg[MARK_KEY_COLUMNS].assign(expiry=pd.to_datetime(per_leg["expiry"])),
+            latest[MARK_KEY_COLUMNS].assign(expiry=pd.to_datetime(latest["expiry"]))]
+    marked = pd.MultiIndex.from_frame(keys[0]).isin(pd.MultiIndex.from_frame(keys[1]))
+    return float(per_leg.loc[marked, "unrealized_pl"].sum())
+
+
+def test_account_curve_matches_prefix_matching(trades, marks):
+    curve = build_equity_curve(trades, compute_pl_result(trades), marks)
+    days = curve.account.index
+    for day in days[:: max(1, len(days) // 25)]:
+        row = curve.account.loc[day]
+        assert row["realized_pl"] == pytest.approx(compute_pl_result(_prefix(trades, day)).total_realized, abs=1e-6)
+        assert row["unrealized_pl"] == pytest.approx(_unrealized_on(trades, marks, day), abs=1e-6)
+
+
+def test_group_rows_are_sparse(trades, marks):
+    curve = build_equity_curve(trades, compute_pl_result(trades), marks)
+    groups = curve.groups["group_id"].nunique()
+    assert len(curve.groups) < len(curve.account) * groups / 4
+
+
+def test_group_curves_sum_to_account(trades, marks):
+    curve = build_equity_curve(trades, compute_pl_result(trades), marks)
+    total = pd.DataFrame(0.0, index=curve.account.index, columns=["realized_pl", "unrealized_pl"])
+    for group in curve.groups["group_id"].dropna().unique():
+        daily = curve.group(group, "default")
+        total = total.add(daily[["realized_pl", "unrealized_pl"]], fill_value=0.0)
+    np.testing.assert_allclose(total.to_numpy(), curve.account[["realized_pl", "unrealized_pl"]].to_numpy(), atol=1e-6)
+
+
+def test_extended_curve_matches_rebuild(trades, marks):
+    cut = trades["trade_datetime"].iloc[int(len(trades) * 0.7)]
+    head = trades[trades["trade_datetime"] < cut]
+    previous = build_equity_curve(head, compute_pl_result(head), marks)
+    result = compute_pl_result(trades)
+    extended = build_equity_curve(trades, result, marks, previous=previous)
+    rebuilt = build_equity_curve(trades, result, marks)
+    pd.testing.assert_frame_equal(extended.account, rebuilt.account, atol=1e-6)
+    for group in rebuilt.groups["group_id"].dropna().unique()[:20]:
+        pd.testing.assert_frame_equal(extended.group(group), rebuilt.group(group), atol=1e-6)
+
+
+def test_groups_are_kept_apart_per_account(trades):
+    from accounts import match_accounts
+
+    # The same group ids in a second account, on the same days with different prices
+    other = trades.assign(account="other", id=trades["id"] + 100_000, price=trades["price"] * 1.5)
+    both = pd.concat([trades, other], ignore_index=True)
+    curve = build_equity_curve(both, match_accounts(both, workers=1).firm())
+    alone = {name: build_equity_curve(frame, compute_pl_result(frame)) for name, frame in
+             (("default", trades), ("other", other))}
+    for group in trades["group_id"].unique()[:20]:
+        for account, expected in alone.items():
+            pd.testing.assert_frame_equal(curve.group(group, account), expected.group(group), atol=1e-6)
+    with pytest.raises(ValueError):
+        curve.group(trades["group_id"].iloc[0])
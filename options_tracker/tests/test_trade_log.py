@@ -0,0 +1,57 @@
+import pandas as pd
+import pytest
+
+from trade_log import TradeLog
+
+
+def _row(**fields):
+    row = {"symbol": "SPY", "expiry": "2030-01-17", "strike": 400.0, "option_type": "C", "action": "BTO",
+           "quantity": 1, "price": 2.5, "fees": 0.65, "trade_datetime": "2029-06-03 10:00:00", "note": ""}
+    return {**row, **fields}
+
+
+def test_appends_assign_ids_after_the_highest(tmp_path):
+    log = TradeLog(str(tmp_path / "trades.log.jsonl"))
+    assert log.max_id() is None
+    assert log.put(_row()) == 1
+    assert log.put_many([_row(), _row(id=10), _row()]) == [2, 10, 11]
+    assert log.put(_row(), min_id=50) == 50
+    log.delete(2)
+    assert log.max_id() == 50
+    records, offset = log.read()
+    assert [r["op"] for r in records] == ["put"] * 5 + ["del"]
+    assert [r["row"]["id"] for r in records[:5]] == [1, 2, 10, 11, 50] and records[5]["id"] == 2
+    assert offset == log.size() and log.read(offset) == ([], offset)
+    # Another writer's appends are picked up by the next id
+    TradeLog(log.path).put(_row(id=70))
+    assert log.max_id() == 70 and log.put(_row()) == 71
+
+
+def test_torn_last_line_is_skipped_and_terminated(tmp_path):
+    log = TradeLog(str(tmp_path / "trades.log.jsonl"))
+    log.put_many([_row(), _row()])
+    complete = log.size()
+    with open(log.path, "ab") as fh:
+        fh.write(b'{"op": "put", "row": {"id": 99, "sym')
+    records, offset = log.read()
+    assert [r["row"]["id"] for r in records] == [1, 2] and offset == complete
+    assert log.max_id() == 2
+    # The next append starts on a line of its own and is read back
+    assert log.put(_row()) == 3
+    assert [r["row"]["id"] for r in log.read()[0]] == [1, 2, 3]
+
+
+@pytest.mark.parametrize("store", ["log"], indirect=True)
+def test_compaction_folds_the_log_into_the_snapshot(store):
+    ids = [store.save_trade(_row(trade_datetime=f"2029-06-03 10:0{i}:00", price=2.0 + i, note=f"fill {i}")) for i in range(4)]
+    store.save_trade({**store.get_trade(ids[1]), "price": 9.0})
+    store.remove_trade(ids[2])
+    before = store.load_trades()
+    assert store.compact_trades() == 6
+    assert store._log().size() == 0
+    after = store.load_trades()
+    pd.testing.assert_frame_equal(after, before)
+    assert after["id"].tolist() == [ids[0], ids[1], ids[3]] and after["price"].tolist() == [2.0, 9.0, 5.0]
+    # Ids keep counting from the snapshot once the log is empty
+    assert store.next_trade_id() == ids[3] + 1
+    assert store.save_trade(_row()) == ids[3] + 1
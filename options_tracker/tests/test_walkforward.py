@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+
+from backtest.strategy import MACrossover
+from backtest.walkforward import Fold, RollingStats, make_folds, walk_forward
+from bench import make_prices
+
+
+def _direct(returns, start, end, periods):
+    """Window statistics from the rows themselves, one candidate and symbol at a time."""
+    out = {name: np.full(returns.shape[::2], np.nan) for name in ("sharpe", "cagr", "total_return")}
+    for c in range(returns.shape[0]):
+        for s in range(returns.shape[2]):
+            rows = returns[c, start:end, s]
+            rows = rows[~np.isnan(rows)]
+            if len(rows) == 0:
+                continue
+            growth = np.prod(1.0 + rows)
+            out["total_return"][c, s] = growth - 1.0
+            out["cagr"][c, s] = growth ** (periods / len(rows)) - 1.0
+            if len(rows) > 1 and rows.std(ddof=1) > 0:
+                out["sharpe"][c, s] = rows.mean() * periods / (rows.std(ddof=1) * np.sqrt(periods))
+    return out
+
+
+def test_rolling_window_matches_direct_computation():
+    rng = np.random.default_rng(5)
+    returns = rng.normal(0.0005, 0.02, (3, 120, 4))
+    returns[:, :30, 1] = np.nan  # listed late
+    returns[rng.random(returns.shape) < 0.05] = np.nan  # gaps
+    returns[2, :, 3] = 0.0  # flat: no Sharpe
+    stats = RollingStats.from_returns(returns)
+    for start, end in [(0, 120), (0, 30), (10, 11), (25, 60), (90, 120), (40, 40)]:
+        got = stats.window(start, end, periods=252)
+        expected = _direct(returns, start, end, 252)
+        for name, values in expected.items():
+            np.testing.assert_allclose(got[name], values, rtol=1e-9, atol=1e-12, err_msg=f"{name} [{start}, {end})")
+
+
+def test_make_folds_anchored_and_overlapping():
+    assert make_folds(20, train=8, test=4, anchored=True) == [
+        Fold(0, 8, 8, 12), Fold(0, 12, 12, 16), Fold(0, 16, 16, 20)]
+    # step < test: test windows overlap, the last is cut at the end of the data
+    folds = make_folds(20, train=8, test=4, step=2)
+    assert [(f.train_start, f.train_end) for f in folds] == [(0, 8), (2, 10), (4, 12), (6, 14), (8, 16), (10, 18)]
+    assert [(f.test_start, f.test_end) for f in folds] == [(8, 12), (10, 14), (12, 16), (14, 18), (16, 20), (18, 20)]
+    assert make_folds(8, train=8, test=4) == []
+
+
+@pytest.mark.parametrize("step, anchored", [(None, False), (7, False), (7, True), (40, False)])
+def test_stitched_returns_cover_each_test_date_once(step, anchored):
+    prices = make_prices(260, 3, seed=8)
+    candidates = [MACrossover(5, 20), MACrossover(10, 40)]
+    result = walk_forward(prices, candidates, train=120, test=20, step=step, anchored=anchored, max_workers=1)
+    index = result.returns.index
+    assert index.is_unique and index.is_monotonic_increasing
+    # Overlapping test windows are cut where the next one starts; gaps between them stay out
+    folds = result.folds.drop_duplicates("fold")
+    expected = prices.index[:0]
+    for start, end in zip(folds["test_start"], folds["test_end"]):
+        expected = expected.union(prices.loc[start:end].index)
+    assert index.equals(expected)
@@ -0,0 +1,379 @@
+"""
+Daily equity curve: realized, unrealized and total P/L per day, for the
+whole book and per strategy group. Group ids are only unique within an
+account, so groups are keyed by (account, group_id).
+
+The FIFO pass that already produced the realized events and lots (a
+`PLResult`) is turned into per-day changes of each (leg, account, group) position:
+opening fills add quantity and cost, matched closes remove them at the lot's
+price and book realized P/L. Cumulative sums of those changes give every
+day's open quantity, cost and realized P/L without re-matching date
+prefixes. Optional historical marks value the open quantity each day.
+
+The account curve is dense (one row per day). Per-group rows are sparse: a
+group only has rows on days it had a fill or close and, with marks, on days
+the value of its open legs moved (a new mark). `EquityCurve.group` fills in the days
+between for one group on demand, so the saved curve grows with the trades
+rather than with days x groups.
+
+A saved curve is extended rather than rebuilt: days before its last day are
+kept as long as the trades and marks dated before that day are unchanged,
+and only the tail is recomputed from the carried position totals.
+"""
+import os
+import pickle
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from metrics import TRADING_DAYS, max_drawdown, sharpe_ratio
+from pl import LEG_COLUMNS, OPTIONS_MULTIPLIER, OpenBook, PLResult, _group_ids, _int_groups, _leg_frame
+
+# Bump when the pickled layout changes so stale curves get rebuilt
+CURVE_FORMAT = 3
+
+GROUP_COLUMNS = ["account", "group_id"]
+CURVE_COLUMNS = ["date"] + GROUP_COLUMNS + ["realized_pl", "unrealized_pl", "equity"]
+DAILY_COLUMNS = ["realized_pl", "unrealized_pl", "equity"]
+# Days x keys cells valued per block when marks are given
+MAX_BLOCK_CELLS = 2_000_000
+
+
+def _empty_daily() -> pd.DataFrame:
+    return pd.DataFrame(columns=DAILY_COLUMNS, index=pd.DatetimeIndex([], name="date"), dtype=np.float64)
+
+
+@dataclass
+class EquityCurve:
+    """Daily account curve, sparse per-group rows, and the position totals needed to extend them."""
+    daily: pd.DataFrame = field(default_factory=_empty_daily)
+    groups: pd.DataFrame = field(default_factory=lambda: pd.DataFrame(columns=CURVE_COLUMNS))
+    # Open quantity and cost per (leg, account, group), and realized P/L per group, up to the day before last_day
+    carry: pd.DataFrame = field(default_factory=pd.DataFrame)
+    last_day: Optional[pd.Timestamp] = None
+    digest: Optional[int] = None
+    format: int = CURVE_FORMAT
+
+    @property
+    def account(self) -> pd.DataFrame:
+        """Account-wide daily realized, unrealized and equity."""
+        return self.daily
+
+    def group(self, group_id, account: Optional[str] = None) -> pd.DataFrame:
+        """
+        Daily realized, unrealized and equity of one group, from its first fill
+        to the curve's end. `account` may be left out when the curve has one account.
+        """
+        rows = self.groups
+        if account is not None:
+            rows = rows[(rows["account"] == account).to_numpy()]
+        elif rows["account"].nunique(dropna=False) > 1:
+            raise ValueError("Group ids repeat across accounts; pass the group's account")
+        ids = rows["group_id"]
+        rows = rows[(ids == group_id).fillna(False) if pd.notna(group_id) else ids.isna()]
+        if rows.empty:
+            return _empty_daily()
+        rows = rows.set_index("date")[DAILY_COLUMNS]
+        out = rows.reindex(self.daily.index[self.daily.index >= rows.index[0]])
+        # Both hold between rows: a group has a row whenever either changes
+        out[["realized_pl", "unrealized_pl"]] = out[["realized_pl", "unrealized_pl"]].ffill()
+        out["equity"] = out["realized_pl"] + out["unrealized_pl"]
+        return out
+
+    def save(self, path: str) -> None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as fh:
+            pickle.dump(self, fh, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> Optional["EquityCurve"]:
+        try:
+            with open(path, "rb") as fh:
+                curve = pickle.load(fh)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+            return None
+        if not isinstance(curve, cls) or getattr(curve, "format", None) != CURVE_FORMAT:
+            return None
+        return curve
+
+
+def equity_stats(account: pd.DataFrame, capital: Optional[float] = None) -> Dict[str, float]:
+    """
+    Drawdown and Sharpe of the account curve. With `capital`, equity is read
+    as growth of that capital (as in the backtest notebook); without it the
+    drawdown is in dollars and Sharpe uses daily P/L changes.
+    """
+    equity = account["equity"].astype(float)
+    changes = equity.diff().fillna(equity)
+    if capital:
+        cumulative = 1.0 + equity / capital
+        return {
+            "total_pl": float(equity.iloc[-1]) if len(equity) else 0.0,
+            "max_drawdown": max_drawdown(cumulative),
+            "sharpe": sharpe_ratio(changes / capital, TRADING_DAYS),
+        }
+    dollar_drawdown = equity - equity.expanding().max()
+    return {
+        "total_pl": float(equity.iloc[-1]) if len(equity) else 0.0,
+        "max_drawdown": float(dollar_drawdown.min()) if len(equity) else 0.0,
+        "sharpe": sharpe_ratio(changes, TRADING_DAYS),
+    }
+
+
+def _digest(frame: pd.DataFrame) -> int:
+    if frame.empty:
+        return 0
+    return int(pd.util.hash_pandas_object(frame, index=False).sum())
+
+
+def _prefix_digest(trades: pd.DataFrame, marks: Optional[pd.DataFrame], day: pd.Timestamp) -> int:
+    """Fingerprint of every trade and mark dated before `day`."""
+    # Row hashes are summed, so the load order of the rows doesn't matter
+    digest = _digest(trades[pd.to_datetime(trades["trade_datetime"]) < day])
+    if marks is not None and not marks.empty:
+        digest ^= _digest(marks[pd.to_datetime(marks["as_of"]) < day])
+    return digest
+
+
+def _position_changes(trades: pd.DataFrame, result: PLResult) -> pd.DataFrame:
+    """
+    One row per opening fill and per matched close: the day, the leg, the
+    lot's account and group and the change in open quantity, open cost and
+    realized P/L.
+    """
+    legs = _leg_frame(trades)
+    opening = legs["action"].isin(["BTO", "STO"]).to_numpy()
+    quantity = pd.to_numeric(trades["quantity"], errors="coerce").fillna(0).to_numpy(dtype=np.float64)
+    price = pd.to_numeric(trades["price"], errors="coerce").fillna(0.0).to_numpy(dtype=np.float64)
+    days = pd.to_datetime(trades["trade_datetime"]).dt.normalize()
+    accounts = trades["account"].to_numpy(dtype=object) if "account" in trades.columns else np.full(len(trades), None)
+    opens = legs.loc[opening, LEG_COLUMNS].assign(
+        date=days[opening].to_numpy(),
+        account=accounts[opening],
+        group_id=_group_ids(trades)[opening],
+        quantity=quantity[opening],
+        cost=quantity[opening] * price[opening],
+        realized_pl=0.0,
+    )
+    realized = result.realized
+    if realized.empty:
+        return opens.reset_index(drop=True)
+    by_id = pd.DataFrame({"date": days.to_numpy(), "account": accounts},
+                         index=pd.to_numeric(trades["id"], errors="coerce").to_numpy())
+    by_id = by_id[~by_id.index.duplicated(keep="last")].reindex(realized["close_id"].to_numpy())
+    matched = realized["quantity"].to_numpy(dtype=np.float64)
+    # Lots only match within an account, so a close books to its closing trade's account
+    closes = realized[LEG_COLUMNS].assign(
+        date=by_id["date"].to_numpy(),
+        account=realized["account"].to_numpy(dtype=object) if "account" in realized.columns else by_id["account"].to_numpy(),
+        group_id=realized["open_group_id"].astype("Float64").to_numpy(dtype=np.float64, na_value=np.nan),
+        quantity=-matched,
+        cost=-matched * realized["open_price"].to_numpy(dtype=np.float64),
+        realized_pl=realized["realized_pl"].to_numpy(dtype=np.float64),
+    )
+    changes = pd.concat([opens, closes], ignore_index=True)
+    changes["expiry"] = pd.to_datetime(changes["expiry"])
+    return changes
+
+
+def _day_range(start: pd.Timestamp, end: pd.Timestamp, event_days: np.ndarray) -> pd.DatetimeIndex:
+    # Business days plus any day that actually had a fill
+    days = pd.bdate_range(start, end).union(pd.DatetimeIndex(event_days))
+    return days[(days >= start) & (days <= end)]
+
+
+def _carry_frame(changes: pd.DataFrame) -> pd.DataFrame:
+    """Summed changes per (leg, account, group)."""
+    if changes.empty:
+        return pd.DataFrame(columns=LEG_COLUMNS + GROUP_COLUMNS + ["quantity", "cost", "realized_pl"])
+    return (
+        changes.groupby(LEG_COLUMNS + GROUP_COLUMNS, dropna=False, sort=False)[["quantity", "cost", "realized_pl"]]
+        .sum()
+        .reset_index()
+    )
+
+
+def _curve_rows(
+    changes: pd.DataFrame,
+    carry: pd.DataFrame,
+    days: pd.DatetimeIndex,
+    marks: Optional[pd.DataFrame],
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Daily account rows and sparse group rows over `days`, starting from the `carry` totals."""
+    # Carried totals enter as changes on the first day; they seed the sums but add no group rows
+    window = pd.concat([carry.assign(date=days[0]), changes], ignore_index=True) if not carry.empty else changes
+    changed = np.arange(len(window)) >= len(carry)
+    keys = window.groupby(LEG_COLUMNS + GROUP_COLUMNS, dropna=False, sort=False).ngroup().to_numpy()
+    group_codes = window.groupby(GROUP_COLUMNS, dropna=False, sort=False).ngroup().to_numpy()
+    groups = window[GROUP_COLUMNS].iloc[np.unique(group_codes, return_index=True)[1]]
+    rows = days.get_indexer(pd.to_datetime(window["date"]))
+    realized_change = window["realized_pl"].to_numpy(dtype=np.float64)
+
+    realized = np.bincount(rows, weights=realized_change, minlength=len(days)).cumsum()
+    unrealized = np.zeros(len(days))
+    parts = [pd.DataFrame({
+        "row": rows, "code": group_codes, "realized_pl": realized_change, "unrealized_pl": 0.0, "emit": changed,
+    })]
+    if marks is not None and not marks.empty:
+        unrealized, marked = _unrealized_by_group(window, keys, rows, group_codes, days, marks)
+        parts.append(marked.assign(realized_pl=0.0, emit=True))
+
+    # One row per (group, day) with a fill, close or revaluation; P/L is the group's running sum of changes
+    cells = (
+        pd.concat(parts, ignore_index=True)
+        .groupby(["code", "row"], sort=True)
+        .agg(realized_pl=("realized_pl", "sum"), unrealized_pl=("unrealized_pl", "sum"), emit=("emit", "any"))
+        .reset_index()
+    )
+    cells[["realized_pl", "unrealized_pl"]] = cells.groupby("code")[["realized_pl", "unrealized_pl"]].cumsum()
+    cells = cells[cells["emit"].to_numpy()].sort_values(["row", "code"], kind="stable")
+    codes = cells["code"].to_numpy()
+    frame = pd.DataFrame({
+        "date": days[cells["row"].to_numpy()],
+        "account": groups["account"].to_numpy(dtype=object)[codes],
+        "group_id": _int_groups(groups["group_id"].to_numpy(dtype=np.float64)[codes]),
+        "realized_pl": cells["realized_pl"].to_numpy(),
+        "unrealized_pl": cells["unrealized_pl"].to_numpy(),
+    })
+    frame["equity"] = frame["realized_pl"] + frame["unrealized_pl"]
+    daily = pd.DataFrame({"realized_pl": realized, "unrealized_pl": unrealized}, index=days.rename("date"))
+    daily["equity"] = daily["realized_pl"] + daily["unrealized_pl"]
+    return daily, frame[CURVE_COLUMNS]
+
+
+def _unrealized_by_group(
+    window: pd.DataFrame,
+    keys: np.ndarray,
+    rows: np.ndarray,
+    group_codes: np.ndarray,
+    days: pd.DatetimeIndex,
+    marks: pd.DataFrame,
+) -> Tuple[np.ndarray, pd.DataFrame]:
+    """
+    Daily unrealized P/L from open quantity/cost per key and carried-forward
+    marks: the account total per day, and (row, code, unrealized_pl) changes
+    of each leg's value, on the days it moves.
+    """
+    n_keys = int(keys.max()) + 1
+    firsts = np.unique(keys, return_index=True)[1]
+    key_legs = window.iloc[firsts][LEG_COLUMNS].reset_index(drop=True)
+    key_groups = group_codes[firsts]
+    book = OpenBook.from_positions(key_legs.assign(open_quantity=0, average_cost=0.0, total_fees=0.0))
+    sign = book.sign * OPTIONS_MULTIPLIER
+
+    # Mark per day and key: row 0 holds the last mark before the window, then carried forward
+    marks = marks.sort_values("as_of", kind="stable")
+    mark_days = pd.to_datetime(marks["as_of"]).dt.normalize()
+    keep = (mark_days <= days[-1]).to_numpy()
+    marks, mark_days = marks[keep], mark_days[keep]
+    # A mark applies from its own day, or the next day on the calendar
+    mark_rows = np.where(mark_days < days[0], 0, np.searchsorted(days.to_numpy(), mark_days.to_numpy()) + 1)
+    pos, leg_pos, n_mark_keys = book.mark_lookup(marks)
+    values = pd.to_numeric(marks["mark"], errors="coerce").to_numpy(dtype=np.float64)
+    found = (pos >= 0) & ~np.isnan(values)
+    pos, mark_rows, values = pos[found], mark_rows[found], values[found]
+
+    # Only keys that ever get a mark can have unrealized P/L
+    has_mark = np.zeros(n_mark_keys, dtype=bool)
+    has_mark[pos] = True
+    marked = np.nonzero(has_mark[leg_pos])[0]
+    unrealized = np.zeros(len(days))
+    cells = {"row": [np.zeros(0, dtype=np.int64)], "code": [np.zeros(0, dtype=np.int64)], "unrealized_pl": [np.zeros(0)]}
+    in_marked = np.isin(keys, marked)
+    quantity = window["quantity"].to_numpy(dtype=np.float64)
+    cost = window["cost"].to_numpy(dtype=np.float64)
+    block = max(1, MAX_BLOCK_CELLS // len(days))
+    for start in range(0, len(marked), block):
+        chunk = marked[start:start + block]
+        col = np.full(n_keys, -1)
+        col[chunk] = np.arange(len(chunk))
+        sel = in_marked & (col[keys] >= 0)
+        open_qty = np.zeros((len(days), len(chunk)))
+        open_cost = np.zeros((len(days), len(chunk)))
+        np.add.at(open_qty, (rows[sel], col[keys[sel]]), quantity[sel])
+        np.add.at(open_cost, (rows[sel], col[keys[sel]]), cost[sel])
+        open_qty = open_qty.cumsum(axis=0)
+        open_cost = open_cost.cumsum(axis=0)
+        # Marks of this chunk's legs only, so memory stays within the block size
+        legs, leg_of_key = np.unique(leg_pos[chunk], return_inverse=True)
+        mark_col = np.full(n_mark_keys, -1)
+        mark_col[legs] = np.arange(len(legs))
+        mine = mark_col[pos] >= 0
+        mark = np.full((len(days) + 1, len(legs)), np.nan)
+        mark[mark_rows[mine], mark_col[pos[mine]]] = values[mine]
+        mark = pd.DataFrame(mark).ffill().to_numpy()[1:, leg_of_key]
+        held = (open_qty != 0) & ~np.isnan(mark)
+        value = np.where(held, sign[chunk] * (np.nan_to_num(mark) * open_qty - open_cost), 0.0)
+        unrealized += value.sum(axis=1)
+        moved = np.diff(value, axis=0, prepend=0.0)
+        day, column = np.nonzero(moved)
+        cells["row"].append(day)
+        cells["code"].append(key_groups[chunk][column])
+        cells["unrealized_pl"].append(moved[day, column])
+    return unrealized, pd.DataFrame({name: np.concatenate(parts) for name, parts in cells.items()})
+
+
+def build_equity_curve(
+    trades: pd.DataFrame,
+    result: PLResult,
+    marks: Optional[pd.DataFrame] = None,
+    end: Optional[pd.Timestamp] = None,
+    previous: Optional[EquityCurve] = None,
+) -> EquityCurve:
+    """
+    Daily equity curve for `trades`, using the FIFO `result` already computed
+    for them (``compute_pl_result`` or ``PLState.result()``).
+
+    `marks` is long-format with an ``as_of`` column (see
+    ``pl.unrealized_timeseries``); without marks, open positions are valued
+    at cost. The curve runs through `end` (default: the last fill or mark).
+    A `previous` curve whose history before its last day still matches is
+    extended from that day instead of rebuilt.
+    """
+    if trades.empty:
+        return EquityCurve()
+    changes = _position_changes(trades, result)
+    last_event = changes["date"].max()
+    if marks is not None and not marks.empty:
+        last_event = max(last_event, pd.to_datetime(marks["as_of"]).max().normalize())
+    end = pd.Timestamp(end).normalize() if end is not None else last_event
+
+    start = changes["date"].min()
+    carry = _carry_frame(changes.iloc[:0])
+    kept = pd.DataFrame(columns=CURVE_COLUMNS)
+    kept_daily = _empty_daily()
+    if (
+        previous is not None
+        and previous.last_day is not None
+        and start < previous.last_day <= end
+        and previous.digest == _prefix_digest(trades, marks, previous.last_day)
+    ):
+        start = previous.last_day
+        carry = previous.carry
+        kept = previous.groups[previous.groups["date"] < start]
+        kept_daily = previous.daily[previous.daily.index < start]
+        changes = changes[changes["date"] >= start]
+
+    days = _day_range(start, end, changes["date"].unique())
+    if len(days) == 0:
+        return EquityCurve()
+    changes = changes[changes["date"] <= end]
+    daily, tail = _curve_rows(changes, carry, days, marks)
+    groups = pd.concat([kept, tail], ignore_index=True) if not kept.empty else tail
+    daily = pd.concat([kept_daily, daily]) if not kept_daily.empty else daily
+
+    # Totals up to the day before the new last day, for the next extension
+    last_day = days[-1]
+    before_last = changes[changes["date"] < last_day]
+    next_carry = _carry_frame(pd.concat([carry, before_last], ignore_index=True)) if not carry.empty else _carry_frame(before_last)
+    return EquityCurve(
+        daily=daily,
+        groups=groups,
+        carry=next_carry,
+        last_day=last_day,
+        digest=_prefix_digest(trades, marks, last_day),
+    )
@@ -0,0 +1,125 @@
+"""
+Append-only trade log.
+
+Each line is one JSON record: ``{"op": "put", "row": {...}}`` inserts or
+replaces a trade by id, ``{"op": "del", "id": n}`` is a delete tombstone.
+Records are appended with a single write under an exclusive lock and fsync'd,
+so concurrent writers never interleave and a crash can at worst leave a torn
+last line, which readers skip and the next append terminates.
+"""
+import json
+import os
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - non-POSIX
+    fcntl = None
+
+
+class TradeLog:
+    def __init__(self, path: str) -> None:
+        self.path = path
+        # Highest trade id seen in the log, valid for bytes [0, _scanned)
+        self._scanned = 0
+        self._max_id: Optional[int] = None
+
+    @contextmanager
+    def locked(self) -> Iterator[int]:
+        """Exclusive lock on the log; yields an O_APPEND file descriptor."""
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+            yield fd
+        finally:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+
+    def size(self) -> int:
+        try:
+            return os.path.getsize(self.path)
+        except FileNotFoundError:
+            return 0
+
+    def read(self, start: int = 0, end: Optional[int] = None) -> Tuple[List[Dict[str, Any]], int]:
+        """Records between byte offsets; returns (records, offset after last complete line)."""
+        try:
+            with open(self.path, "rb") as fh:
+                fh.seek(start)
+                data = fh.read() if end is None else fh.read(max(0, end - start))
+        except FileNotFoundError:
+            return [], start
+        records = []
+        complete = data.rfind(b"\n") + 1
+        for line in data[:complete].splitlines():
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                continue
+        return records, start + complete
+
+    def max_id(self) -> Optional[int]:
+        """Highest trade id put in the log, or None when it has none."""
+        # Only the bytes appended since the last call are parsed
+        records, self._scanned = self.read(self._scanned) if self.size() >= self._scanned else self.read(0)
+        for record in records:
+            if record.get("op") == "put" and record["row"].get("id") is not None:
+                self._max_id = max(self._max_id or 0, int(record["row"]["id"]))
+        return self._max_id
+
+    def _torn(self) -> bool:
+        try:
+            with open(self.path, "rb") as fh:
+                fh.seek(-1, os.SEEK_END)
+                return fh.read(1) != b"\n"
+        except OSError:
+            # Missing or empty
+            return False
+
+    def put(self, row: Dict[str, Any], min_id: int = 1) -> int:
+        """
+        Append an insert/replace record. A row without an id gets
+        max(`min_id`, highest id in the log + 1), assigned under the lock.
+        """
+        return self.put_many([row], min_id=min_id)[0]
+
+    def put_many(self, rows: List[Dict[str, Any]], min_id: int = 1) -> List[int]:
+        """Append several records with one write and one fsync; returns their ids."""
+        with self.locked() as fd:
+            next_id = max(min_id, (self.max_id() or 0) + 1)
+            ids = []
+            lines = []
+            for row in rows:
+                row = dict(row)
+                if not row.get("id"):
+                    row["id"] = next_id
+                next_id = max(next_id, int(row["id"]) + 1)
+                ids.append(int(row["id"]))
+                lines.append(json.dumps({"op": "put", "row": row}, default=str))
+            self._write(fd, lines)
+        return ids
+
+    def delete(self, trade_id: int) -> None:
+        with self.locked() as fd:
+            self._write(fd, [json.dumps({"op": "del", "id": int(trade_id)})])
+
+    def truncate(self) -> None:
+        """Drop every record; callers hold `locked()` after folding them into a snapshot."""
+        with open(self.path, "wb") as fh:
+            fh.flush()
+            os.fsync(fh.fileno())
+        self._scanned = 0
+        self._max_id = None
+
+    def _write(self, fd: int, lines: List[str]) -> None:
+        data = "".join(line + "\n" for line in lines).encode("utf-8")
+        if self._torn():
+            # End a crashed writer's partial line so it doesn't swallow this record
+            data = b"\n" + data
+        while data:
+            data = data[os.write(fd, data):]
+        os.fsync(fd)